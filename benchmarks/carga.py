@@ -0,0 +1,349 @@
+"""
+Load test of the API: starts ``server:app`` under uvicorn against a throwaway
+database seeded with synthetic data, drives the main endpoints with a fixed
+number of concurrent clients and prints throughput and latency percentiles
+per endpoint as JSON.
+
+    python -m benchmarks.carga --concorrencia 32 --duracao 20 --saida base.json
+    python -m benchmarks.carga --database-url postgresql://postgres@localhost/postgres
+"""
+
+import argparse
+import asyncio
+import datetime
+import glob
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+import httpx
+import numpy as np
+
+from crypto import Database
+from crypto.imagens import gerar_variantes
+
+from .postgres import RAIZ, banco_temporario
+
+PALAVRAS = (
+    "bitcoin ethereum solana mercado regulação investidores alta queda preço "
+    "blockchain mineração carteira exchange volume liquidez halving contrato "
+    "token stablecoin banco central inflação juros fundo etf custódia rede"
+).split()
+
+
+def semear(
+    url: str, criptomoedas: int, cotacoes: int, noticias: int, ordens: int, semente: int
+) -> List[int]:
+    """Fill the database with synthetic data; returns the criptomoeda ids."""
+    rng = random.Random(semente)
+    db = Database(url)
+    try:
+        ids = [
+            db.inserir_criptomoeda(f"Moeda {i}", f"M{i}", "Sintética", "Bench")
+            for i in range(criptomoedas)
+        ]
+        for i in range(10):
+            db.inserir_usuario(f"Usuário {i}", f"usuario{i}@bench.local", "x")
+
+        agora = datetime.datetime.now().replace(microsecond=0)
+        linhas = []
+        for id_cripto in ids:
+            preco = rng.uniform(1, 50_000)
+            for j in range(cotacoes):
+                preco *= 1 + rng.gauss(0, 0.002)
+                linhas.append(
+                    (
+                        id_cripto,
+                        agora - datetime.timedelta(minutes=cotacoes - j),
+                        round(preco, 8),
+                        round(rng.uniform(1e3, 1e6), 2),
+                        round(preco * 1e6, 2),
+                        round(rng.uniform(-5, 5), 2),
+                    )
+                )
+        db.inserir_cotacoes(linhas)
+
+        for i in range(noticias):
+            db.insert_noticia(
+                rng.choice(ids),
+                (agora - datetime.timedelta(hours=i)).date(),
+                rng.choice(PALAVRAS),
+                " ".join(rng.choices(PALAVRAS, k=80)),
+                "Bench",
+            )
+
+        for id_cripto in ids:
+            for _ in range(ordens):
+                # Compras abaixo de 100 e vendas acima: o livro começa sem cruzar.
+                if rng.random() < 0.5:
+                    db.inserir_ordem(id_cripto, "Compra", 1, rng.randint(90, 99))
+                else:
+                    db.inserir_ordem(id_cripto, "Venda", 1, rng.randint(101, 110))
+
+        logos = sorted(glob.glob(os.path.join(RAIZ, "imagens", "*.png")))
+        for i, id_cripto in enumerate(ids):
+            with open(logos[i % len(logos)], "rb") as file:
+                conteudo = file.read()
+            id_imagem = db.inserir_imagem_criptomoeda(
+                id_cripto, "logo", conteudo, agora
+            )
+            db.inserir_variantes_imagem(id_imagem, gerar_variantes(conteudo))
+        return ids
+    finally:
+        db.close()
+
+
+def porta_livre() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def iniciar_servidor(url: str, porta: int, workers: int) -> subprocess.Popen:
+    env = dict(os.environ, DB_URL=url, TENDENCIAS_INTERVALO="0")
+    return subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "server:app",
+            "--port",
+            str(porta),
+            "--workers",
+            str(workers),
+            "--log-level",
+            "warning",
+        ],
+        cwd=RAIZ,
+        env=env,
+    )
+
+
+async def aguardar_servidor(base: str, processo: subprocess.Popen, limite: float = 30):
+    fim = time.monotonic() + limite
+    async with httpx.AsyncClient(base_url=base) as client:
+        while time.monotonic() < fim:
+            if processo.poll() is not None:
+                raise RuntimeError("uvicorn exited during startup.")
+            try:
+                if (await client.get("/pool/stats")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError("uvicorn did not start in time.")
+
+
+Requisicao = Callable[[random.Random], Tuple[str, str, dict]]
+
+
+def cenarios(ids: List[int]) -> Dict[str, Requisicao]:
+    """
+    Endpoint name -> function building a (method, path, httpx kwargs) request.
+    """
+    return {
+        "GET /cotacoes/criptomoeda/{id}": lambda rng: (
+            "GET",
+            f"/cotacoes/criptomoeda/{rng.choice(ids)}",
+            {"params": {"limit": 100}},
+        ),
+        "GET /cotacoes/criptomoeda/{id}/candles": lambda rng: (
+            "GET",
+            f"/cotacoes/criptomoeda/{rng.choice(ids)}/candles",
+            {"params": {"interval": "1h"}},
+        ),
+        "GET /noticias/": lambda rng: ("GET", "/noticias/", {"params": {"limit": 50}}),
+        "GET /noticias/search": lambda rng: (
+            "GET",
+            "/noticias/search",
+            {"params": {"q": rng.choice(PALAVRAS)}},
+        ),
+        "GET /criptomoedas/": lambda rng: ("GET", "/criptomoedas/", {}),
+        "GET /ordens/criptomoeda/{id}": lambda rng: (
+            "GET",
+            f"/ordens/criptomoeda/{rng.choice(ids)}",
+            {},
+        ),
+        "GET /ordens/criptomoeda/{id}/depth": lambda rng: (
+            "GET",
+            f"/ordens/criptomoeda/{rng.choice(ids)}/depth",
+            {},
+        ),
+        "POST /ordens/": lambda rng: (
+            "POST",
+            "/ordens/",
+            {
+                "json": {
+                    "id_cripto": rng.choice(ids),
+                    "tipo": rng.choice(["Compra", "Venda"]),
+                    "quantidade": 1,
+                    "preco_limite": rng.randint(95, 105),
+                }
+            },
+        ),
+        "GET /imagens/criptomoedas/{id}": lambda rng: (
+            "GET",
+            f"/imagens/criptomoedas/{rng.choice(ids)}",
+            {"params": {"size": 64}, "headers": {"Accept": "image/webp"}},
+        ),
+    }
+
+
+async def cliente(
+    client: httpx.AsyncClient,
+    cenario: Requisicao,
+    fim: float,
+    rng: random.Random,
+    latencias: List[float],
+    erros: List[int],
+):
+    while time.monotonic() < fim:
+        metodo, caminho, kwargs = cenario(rng)
+        inicio = time.perf_counter()
+        try:
+            resposta = await client.request(metodo, caminho, **kwargs)
+            ok = resposta.status_code < 400
+        except httpx.HTTPError:
+            ok = False
+        latencias.append(time.perf_counter() - inicio)
+        if not ok:
+            erros.append(1)
+
+
+async def medir(
+    base: str, cenario: Requisicao, concorrencia: int, duracao: float, semente: int
+) -> dict:
+    latencias: List[float] = []
+    erros: List[int] = []
+    limites = httpx.Limits(max_connections=concorrencia)
+    async with httpx.AsyncClient(base_url=base, limits=limites, timeout=30) as client:
+        # Aquecimento: conexões abertas e caches preenchidos antes de medir.
+        await asyncio.gather(
+            *(
+                cliente(
+                    client,
+                    cenario,
+                    time.monotonic() + 1,
+                    random.Random(semente + i),
+                    [],
+                    [],
+                )
+                for i in range(concorrencia)
+            )
+        )
+        inicio = time.monotonic()
+        await asyncio.gather(
+            *(
+                cliente(
+                    client,
+                    cenario,
+                    inicio + duracao,
+                    random.Random(semente + i),
+                    latencias,
+                    erros,
+                )
+                for i in range(concorrencia)
+            )
+        )
+        decorrido = time.monotonic() - inicio
+    ms = np.array(latencias) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99]) if len(ms) else (0, 0, 0)
+    return {
+        "requisicoes": len(latencias),
+        "erros": len(erros),
+        "throughput_rps": round(len(latencias) / decorrido, 1),
+        "latencia_ms": {
+            "media": round(float(ms.mean()), 3) if len(ms) else 0,
+            "p50": round(float(p50), 3),
+            "p95": round(float(p95), 3),
+            "p99": round(float(p99), 3),
+            "max": round(float(ms.max()), 3) if len(ms) else 0,
+        },
+    }
+
+
+async def executar(args: argparse.Namespace, url: str, ids: List[int]) -> dict:
+    porta = porta_livre()
+    base = f"http://127.0.0.1:{porta}"
+    processo = iniciar_servidor(url, porta, args.workers)
+    try:
+        await aguardar_servidor(base, processo)
+        resultados = {}
+        for nome, cenario in cenarios(ids).items():
+            if args.endpoints and not any(filtro in nome for filtro in args.endpoints):
+                continue
+            resultados[nome] = await medir(
+                base, cenario, args.concorrencia, args.duracao, args.semente
+            )
+            print(
+                f"{nome}: {resultados[nome]['throughput_rps']} req/s", file=sys.stderr
+            )
+        return resultados
+    finally:
+        processo.terminate()
+        processo.wait(10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API load test.")
+    parser.add_argument(
+        "--concorrencia", type=int, default=16, help="Concurrent clients."
+    )
+    parser.add_argument(
+        "--duracao", type=float, default=10, help="Seconds per endpoint."
+    )
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers.")
+    parser.add_argument("--criptomoedas", type=int, default=20)
+    parser.add_argument("--cotacoes", type=int, default=5000, help="Per criptomoeda.")
+    parser.add_argument("--noticias", type=int, default=2000)
+    parser.add_argument("--ordens", type=int, default=200, help="Per criptomoeda.")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument(
+        "--endpoints",
+        nargs="*",
+        help="Only run endpoints whose name contains one of these.",
+    )
+    parser.add_argument(
+        "--database-url",
+        help="Existing server to create the throwaway database in, instead of "
+        "starting a temporary cluster (needs initdb and pg_ctl).",
+    )
+    parser.add_argument("--saida", help="Also write the JSON report to this file.")
+    args = parser.parse_args()
+
+    with banco_temporario(args.database_url) as url:
+        inicio = time.monotonic()
+        ids = semear(
+            url,
+            args.criptomoedas,
+            args.cotacoes,
+            args.noticias,
+            args.ordens,
+            args.semente,
+        )
+        print(f"Seeded in {time.monotonic() - inicio:.1f}s", file=sys.stderr)
+        resultados = asyncio.run(executar(args, url, ids))
+
+    relatorio = {
+        "data_hora": datetime.datetime.now().isoformat(timespec="seconds"),
+        "parametros": {
+            chave: valor
+            for chave, valor in vars(args).items()
+            if chave not in ("database_url", "saida")
+        },
+        "endpoints": resultados,
+    }
+    texto = json.dumps(relatorio, indent=2, ensure_ascii=False)
+    print(texto)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as file:
+            file.write(texto + "\n")
+
+
+if __name__ == "__main__":
+    main()
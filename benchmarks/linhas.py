@@ -0,0 +1,170 @@
+"""
+Rows per second through the ``listar_cotacoes`` result path, from the fetched
+tuples to the response body, comparing the previous path (tuples unpacked
+into hand-built dicts, then FastAPI's jsonable_encoder and json.dumps) with
+the current one (dict row factory, then orjson).
+
+    python -m benchmarks.linhas --linhas 100000
+    python -m benchmarks.linhas --database-url postgresql://postgres@localhost/postgres
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import random
+import time
+from typing import Callable, List
+
+from fastapi.encoders import jsonable_encoder
+
+from crypto import AsyncDatabase, Database
+from crypto.exportacao import json_
+from crypto.paginacao import Pagina
+
+from .postgres import banco_temporario
+
+
+def semear(url: str, linhas: int, semente: int) -> int:
+    rng = random.Random(semente)
+    db = Database(url)
+    try:
+        id_cripto = db.inserir_criptomoeda("Moeda", "M", "Sintética", "Bench")
+        agora = datetime.datetime.now().replace(microsecond=0)
+        preco = 30_000.0
+        cotacoes = []
+        for i in range(linhas):
+            preco *= 1 + rng.gauss(0, 0.002)
+            cotacoes.append(
+                (
+                    id_cripto,
+                    agora - datetime.timedelta(seconds=linhas - i),
+                    round(preco, 8),
+                    round(rng.uniform(1e3, 1e6), 2),
+                    round(preco * 1e6, 2),
+                    round(rng.uniform(-5, 5), 2),
+                )
+            )
+        db.inserir_cotacoes(cotacoes)
+        return id_cripto
+    finally:
+        db.close()
+
+
+def dicts_manuais(result: List[tuple]) -> List[dict]:
+    # Como listar_cotacoes montava cada linha antes.
+    cotacoes = []
+    for row in result:
+        id_cotacao, data_hora, preco, volume, market_cap, variacao = row
+        cotacoes.append(
+            {
+                "id_cotacao": id_cotacao,
+                "data_hora": data_hora,
+                "preco": preco,
+                "volume": volume,
+                "market_cap": market_cap,
+                "variacao": variacao,
+            }
+        )
+    return cotacoes
+
+
+def json_fastapi(cotacoes: List[dict]) -> bytes:
+    # O que o FastAPI fazia com o retorno do endpoint: jsonable_encoder e
+    # depois o JSONResponse padrão.
+    return json.dumps(
+        jsonable_encoder(cotacoes),
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def melhor(funcao: Callable[[], object], repeticoes: int) -> float:
+    """Best wall time of ``repeticoes`` runs, in seconds."""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos)
+
+
+async def medir_consultas(
+    db: AsyncDatabase, id_cripto: int, linhas: int, repeticoes: int
+) -> dict:
+    query = """
+        SELECT id_cotacao, data_hora, preco, volume, market_cap, variacao
+        FROM Cotações WHERE id_cripto = %s
+        ORDER BY data_hora DESC, id_cotacao DESC LIMIT %s;
+    """
+    tempos = {"tuplas": [], "dicts": []}
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        result = await db.query(query, (id_cripto, linhas))
+        dicts_manuais(result)
+        tempos["tuplas"].append(time.perf_counter() - inicio)
+        inicio = time.perf_counter()
+        await db.listar_cotacoes(id_cripto, Pagina(limite=linhas))
+        tempos["dicts"].append(time.perf_counter() - inicio)
+    return {chave: min(valores) for chave, valores in tempos.items()}
+
+
+def por_segundo(linhas: int, segundos: float) -> int:
+    return round(linhas / segundos)
+
+
+async def executar(url: str, id_cripto: int, linhas: int, repeticoes: int) -> dict:
+    db = await AsyncDatabase.load(url)
+    try:
+        cotacoes = await db.listar_cotacoes(id_cripto, Pagina(limite=linhas))
+        consultas = await medir_consultas(db, id_cripto, linhas, repeticoes)
+    finally:
+        await db.close()
+    antes = {
+        "serializacao": melhor(lambda: json_fastapi(cotacoes), repeticoes),
+        "consulta_e_decodificacao": consultas["tuplas"],
+    }
+    depois = {
+        "serializacao": melhor(lambda: json_(cotacoes), repeticoes),
+        "consulta_e_decodificacao": consultas["dicts"],
+    }
+    resultado = {"linhas": len(cotacoes)}
+    for nome, tempos in (("antes", antes), ("depois", depois)):
+        resultado[nome] = {
+            f"{etapa}_linhas_por_segundo": por_segundo(len(cotacoes), segundos)
+            for etapa, segundos in tempos.items()
+        }
+        resultado[nome]["total_linhas_por_segundo"] = por_segundo(
+            len(cotacoes),
+            tempos["consulta_e_decodificacao"] + tempos["serializacao"],
+        )
+    resultado["ganho_total"] = round(
+        resultado["depois"]["total_linhas_por_segundo"]
+        / resultado["antes"]["total_linhas_por_segundo"],
+        2,
+    )
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="listar_cotacoes rows/s benchmark.")
+    parser.add_argument("--linhas", type=int, default=100_000)
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument(
+        "--database-url",
+        help="Existing server to create the throwaway database in, instead of "
+        "starting a temporary cluster (needs initdb and pg_ctl).",
+    )
+    args = parser.parse_args()
+
+    with banco_temporario(args.database_url) as url:
+        id_cripto = semear(url, args.linhas, args.semente)
+        resultado = asyncio.run(executar(url, id_cripto, args.linhas, args.repeticoes))
+    print(json.dumps(resultado, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Microbenchmark of the in-memory order book: orders matched per second,
+without the database round trips.
+
+    python -m benchmarks.livro_ofertas --ordens 200000
+"""
+
+import argparse
+import random
+import time
+from decimal import Decimal
+
+from crypto.livro_ofertas import COMPRA, VENDA, LivroOfertas, Ordem
+
+
+def gerar_ordens(quantidade: int, semente: int = 42) -> list:
+    rng = random.Random(semente)
+    ordens = []
+    for id_ordem in range(1, quantidade + 1):
+        tipo = COMPRA if rng.random() < 0.5 else VENDA
+        # Preços em torno de 100 com tick de 0.01 geram alguns milhares de níveis.
+        preco = Decimal(rng.randint(9000, 11000)) / 100
+        ordens.append(Ordem(id_ordem, tipo, Decimal(rng.randint(1, 100)), preco))
+    return ordens
+
+
+def executar(ordens: list, cancelamentos: float) -> dict:
+    livro = LivroOfertas()
+    rng = random.Random(7)
+    execucoes = 0
+    inicio = time.perf_counter()
+    for ordem in ordens:
+        resultado = livro.simular(ordem)
+        livro.aplicar(ordem, resultado)
+        execucoes += len(resultado)
+        if livro.ordens and rng.random() < cancelamentos:
+            livro.cancelar(next(iter(livro.ordens)))
+    duracao = time.perf_counter() - inicio
+    return {
+        "ordens": len(ordens),
+        "execucoes": execucoes,
+        "ordens_abertas": len(livro.ordens),
+        "segundos": round(duracao, 3),
+        "ordens_por_segundo": round(len(ordens) / duracao),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Order book microbenchmark.")
+    parser.add_argument("--ordens", type=int, default=100_000)
+    parser.add_argument(
+        "--cancelamentos",
+        type=float,
+        default=0.1,
+        help="Probability of cancelling the oldest resting order after each one.",
+    )
+    args = parser.parse_args()
+    print(executar(gerar_ordens(args.ordens), args.cancelamentos))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Throwaway Postgres databases for the benchmarks, created from the same
+scripts and migrations as a real deployment.
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+import uuid
+from contextlib import contextmanager
+from typing import Iterator, Optional
+from urllib.parse import urlsplit, urlunsplit
+
+import psycopg2
+
+from crypto import migrations
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS = ["create.sql", "view.sql", "procedure.sql"]
+
+
+def _binario(nome: str) -> str:
+    pasta = os.environ.get("PG_BIN")
+    caminho = os.path.join(pasta, nome) if pasta else shutil.which(nome)
+    if not caminho or not os.path.exists(caminho):
+        raise RuntimeError(
+            f"{nome} not found: put the Postgres binaries on PATH, set PG_BIN "
+            "or pass --database-url."
+        )
+    return caminho
+
+
+@contextmanager
+def cluster_temporario() -> Iterator[str]:
+    """
+    Start a Postgres cluster in a temporary directory, listening only on a
+    unix socket there, and yield the URL of its ``postgres`` database. The
+    cluster runs with fsync off: its data is discarded anyway.
+    """
+    pasta = tempfile.mkdtemp(prefix="crypto-bench-")
+    dados = os.path.join(pasta, "dados")
+    try:
+        subprocess.run(
+            [
+                _binario("initdb"),
+                "-D",
+                dados,
+                "-U",
+                "postgres",
+                "--auth=trust",
+                "--encoding=UTF8",
+                "--no-sync",
+            ],
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+        opcoes = (
+            f"-k {pasta} -c listen_addresses='' -c fsync=off -c max_connections=200"
+        )
+        subprocess.run(
+            [
+                _binario("pg_ctl"),
+                "-D",
+                dados,
+                "-o",
+                opcoes,
+                "-l",
+                os.path.join(pasta, "postgres.log"),
+                "-w",
+                "start",
+            ],
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+        try:
+            yield f"postgresql://postgres@/postgres?host={pasta}"
+        finally:
+            subprocess.run(
+                [_binario("pg_ctl"), "-D", dados, "-m", "immediate", "stop"],
+                stdout=subprocess.DEVNULL,
+            )
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+
+
+def _trocar_banco(url: str, banco: str) -> str:
+    partes = urlsplit(url)
+    return urlunsplit(partes._replace(path="/" + banco))
+
+
+@contextmanager
+def banco_temporario(url_servidor: Optional[str] = None) -> Iterator[str]:
+    """
+    Create a uniquely named database with the full schema and yield its URL;
+    it is dropped on exit. Without ``url_servidor`` a throwaway cluster is
+    started for it.
+    """
+    if url_servidor is None:
+        with cluster_temporario() as url:
+            with banco_temporario(url) as banco:
+                yield banco
+        return
+
+    nome = f"crypto_bench_{uuid.uuid4().hex[:8]}"
+    admin = psycopg2.connect(url_servidor)
+    admin.autocommit = True
+    try:
+        with admin.cursor() as cursor:
+            cursor.execute(f"CREATE DATABASE {nome};")
+        url = _trocar_banco(url_servidor, nome)
+        conn = psycopg2.connect(url)
+        try:
+            with conn.cursor() as cursor:
+                for script in SCRIPTS:
+                    with open(
+                        os.path.join(RAIZ, "sql", script), encoding="utf-8"
+                    ) as file:
+                        cursor.execute(file.read())
+            conn.commit()
+            migrations.aplicar(conn, log=lambda mensagem: None)
+        finally:
+            conn.close()
+        yield url
+    finally:
+        with admin.cursor() as cursor:
+            cursor.execute(f"DROP DATABASE IF EXISTS {nome} WITH (FORCE);")
+        admin.close()
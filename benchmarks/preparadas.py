@@ -0,0 +1,143 @@
+"""
+Per-call cost of the hot Database paths with and without server-side
+prepared statements, for Database (psycopg2) and AsyncDatabase (psycopg 3).
+Results are small, so the difference is the parse and plan work Postgres
+skips when the statement is already prepared.
+
+    python -m benchmarks.preparadas --chamadas 5000
+    python -m benchmarks.preparadas --database-url postgresql://postgres@localhost/postgres
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import random
+import time
+from typing import Callable, Dict
+
+from psycopg_pool import AsyncConnectionPool
+
+from crypto import AsyncDatabase, Database
+from crypto.paginacao import Pagina
+
+from .postgres import banco_temporario
+
+
+def semear(url: str, cotacoes: int, semente: int) -> Dict[str, int]:
+    rng = random.Random(semente)
+    db = Database(url)
+    try:
+        id_cripto = db.inserir_criptomoeda("Moeda", "M", "Sintética", "Bench")
+        id_usuario = db.inserir_usuario("Usuário", "usuario@bench.local", "x")
+        agora = datetime.datetime.now().replace(microsecond=0)
+        db.inserir_cotacoes(
+            (
+                id_cripto,
+                agora - datetime.timedelta(minutes=cotacoes - i),
+                round(rng.uniform(1, 50_000), 8),
+                1,
+                1,
+                0,
+            )
+            for i in range(cotacoes)
+        )
+        id_noticia = db.insert_noticia(
+            id_cripto, agora.date(), "tema", "texto", "Bench"
+        )
+        for _ in range(5):
+            db.inserir_sentimento(id_noticia, id_usuario, "Neutro", 0)
+        id_ordem = db.inserir_ordem(id_cripto, "Compra", 1, 100)
+        return {"id_cripto": id_cripto, "id_noticia": id_noticia, "id_ordem": id_ordem}
+    finally:
+        db.close()
+
+
+def operacoes(ids: Dict[str, int]) -> Dict[str, Callable]:
+    """Name -> call taking a Database or AsyncDatabase."""
+    agora = datetime.datetime.now()
+    return {
+        "listar_cotacoes": lambda db: db.listar_cotacoes(
+            ids["id_cripto"], Pagina(limite=10)
+        ),
+        "listar_sentimentos_por_noticia": lambda db: db.listar_sentimentos_por_noticia(
+            ids["id_noticia"]
+        ),
+        "ler_ordem": lambda db: db.ler_ordem(ids["id_ordem"]),
+        "inserir_cotacao": lambda db: db.inserir_cotacao(
+            ids["id_cripto"], agora, 1, 1, 1, 0
+        ),
+    }
+
+
+def medir_sync(url: str, ids: Dict[str, int], chamadas: int) -> dict:
+    resultado = {}
+    for nome, operacao in operacoes(ids).items():
+        resultado[nome] = {}
+        for preparar in (False, True):
+            db = Database(url, preparar=preparar)
+            try:
+                for _ in range(10):
+                    operacao(db)
+                inicio = time.perf_counter()
+                for _ in range(chamadas):
+                    operacao(db)
+                duracao = time.perf_counter() - inicio
+            finally:
+                db.close()
+            chave = "preparado_us" if preparar else "sem_preparo_us"
+            resultado[nome][chave] = round(duracao / chamadas * 1e6, 1)
+    return resultado
+
+
+async def medir_async(url: str, ids: Dict[str, int], chamadas: int) -> dict:
+    resultado = {}
+    # Uma conexão só, como no Database, para não misturar a espera do pool.
+    async with AsyncConnectionPool(url, min_size=1, max_size=1) as pool:
+        for nome, operacao in operacoes(ids).items():
+            resultado[nome] = {}
+            for preparar in (False, True):
+                db = AsyncDatabase(pool, preparar=preparar)
+                for _ in range(10):
+                    await operacao(db)
+                inicio = time.perf_counter()
+                for _ in range(chamadas):
+                    await operacao(db)
+                duracao = time.perf_counter() - inicio
+                chave = "preparado_us" if preparar else "sem_preparo_us"
+                resultado[nome][chave] = round(duracao / chamadas * 1e6, 1)
+    return resultado
+
+
+def com_ganho(resultado: dict) -> dict:
+    for tempos in resultado.values():
+        tempos["ganho"] = round(tempos["sem_preparo_us"] / tempos["preparado_us"], 2)
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prepared statements benchmark.")
+    parser.add_argument("--chamadas", type=int, default=2000, help="Per operation.")
+    parser.add_argument("--cotacoes", type=int, default=100_000)
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument(
+        "--database-url",
+        help="Existing server to create the throwaway database in, instead of "
+        "starting a temporary cluster (needs initdb and pg_ctl).",
+    )
+    args = parser.parse_args()
+
+    with banco_temporario(args.database_url) as url:
+        ids = semear(url, args.cotacoes, args.semente)
+        resultado = {
+            "chamadas": args.chamadas,
+            "Database": com_ganho(medir_sync(url, ids, args.chamadas)),
+            "AsyncDatabase": com_ganho(
+                asyncio.run(medir_async(url, ids, args.chamadas))
+            ),
+        }
+    print(json.dumps(resultado, indent=2))
+
+
+if __name__ == "__main__":
+    main()
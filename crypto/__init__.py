@@ -1 +1,2 @@
-from .database import Database
\ No newline at end of file
+from .database import Database
+from .async_database import AsyncDatabase
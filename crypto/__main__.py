@@ -0,0 +1,208 @@
+import argparse
+import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+from crypto import Database
+from crypto.imagens import gerar_variantes
+from crypto.portfolio import MotorPortfolio
+from crypto.tendencias import LIMIAR_ESTAVEL, MotorTendencias
+
+
+def sentimentos(db: Database, args: argparse.Namespace):
+    if args.acao == "reclassificar":
+        if args.positivo is not None or args.negativo is not None:
+            limiares = db.ler_limiares_sentimento()
+            db.definir_limiares_sentimento(
+                limiares["positivo"] if args.positivo is None else args.positivo,
+                limiares["negativo"] if args.negativo is None else args.negativo,
+            )
+        print(f"{db.reclassificar_sentimentos(args.lote)} sentiments reclassified.")
+        return
+
+    divergencias = db.verificar_sentimentos_agregados()
+    for divergencia in divergencias:
+        print(
+            f"id_noticia {divergencia['id_noticia']}: "
+            f"{divergencia['quantidade']} scores summing {divergencia['soma_score']}, "
+            f"aggregate has {divergencia['quantidade_agregada']} "
+            f"summing {divergencia['soma_agregada']}"
+        )
+    if args.acao == "verificar":
+        print(f"{len(divergencias)} inconsistent aggregates.")
+        if divergencias:
+            raise SystemExit(1)
+    else:
+        db.reconstruir_sentimentos_agregados()
+        print(f"Aggregates rebuilt ({len(divergencias)} were inconsistent).")
+
+
+def imagens(db: Database, args: argparse.Namespace):
+    pendentes = db.listar_imagens_sem_variantes()
+    with ProcessPoolExecutor(args.workers) as executor:
+        conteudos = (db.ler_imagem(id_imagem) for id_imagem in pendentes)
+        for id_imagem, variantes in zip(
+            pendentes, executor.map(gerar_variantes, conteudos)
+        ):
+            db.inserir_variantes_imagem(id_imagem, variantes)
+            print(f"id_imagem {id_imagem}: {len(variantes)} renditions")
+    print(f"Generated renditions for {len(pendentes)} images.")
+
+
+def tendencias(db: Database, args: argparse.Namespace):
+    motor = MotorTendencias(limiar=args.limiar)
+    escritas = motor.executar(db, completo=args.completo)
+    print(f"{escritas} trends written.")
+
+
+def particoes(db: Database, args: argparse.Namespace):
+    for nome in db.criar_particoes(args.meses_futuros):
+        print(f"Created partition {nome}.")
+    if args.retencao is not None:
+        acao = "Detached" if args.desanexar else "Dropped"
+        for nome in db.remover_particoes(args.retencao, args.desanexar):
+            print(f"{acao} partition {nome}.")
+
+
+def arquivo(db: Database, args: argparse.Namespace):
+    if args.antes is not None:
+        antes = args.antes
+    else:
+        hoje = datetime.date.today()
+        meses = hoje.year * 12 + hoje.month - 1 - (args.meses - 1)
+        antes = datetime.date(meses // 12, meses % 12 + 1, 1)
+    arquivados = db.arquivo.arquivar(db, antes)
+    for item in arquivados:
+        print(
+            f"id_cripto {item['id_cripto']}: {item['mes']:%Y-%m}, "
+            f"{item['linhas']} cotações archived"
+        )
+    print(f"Archived {len(arquivados)} months before {antes:%Y-%m}.")
+
+
+def portfolio(db: Database, args: argparse.Namespace):
+    if args.acao == "reconstruir":
+        db.reconstruir_portfolio()
+    aplicadas = MotorPortfolio(args.lote).executar(db)
+    print(f"{aplicadas} transactions applied to the portfolio.")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m crypto", description="Maintenance commands."
+    )
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    sentimentos_parser = subparsers.add_parser(
+        "sentimentos",
+        help="Check or rebuild the per-notícia sentiment aggregates, or "
+        "reclassify sentiments after changing the thresholds.",
+    )
+    sentimentos_parser.add_argument(
+        "acao", choices=["verificar", "reconstruir", "reclassificar"]
+    )
+    sentimentos_parser.add_argument(
+        "--positivo", type=float, help="Score above which a sentiment is Positivo."
+    )
+    sentimentos_parser.add_argument(
+        "--negativo", type=float, help="Score below which a sentiment is Negativo."
+    )
+    sentimentos_parser.add_argument(
+        "--lote", type=int, default=5000, help="Rows updated per transaction."
+    )
+    sentimentos_parser.set_defaults(executar=sentimentos)
+
+    imagens_parser = subparsers.add_parser(
+        "imagens", help="Generate the resized renditions of older images."
+    )
+    imagens_parser.add_argument("acao", choices=["variantes"])
+    imagens_parser.add_argument("--workers", type=int, default=None)
+    imagens_parser.set_defaults(executar=imagens)
+
+    tendencias_parser = subparsers.add_parser(
+        "tendencias", help="Compute Tendências_Preço from the quotes."
+    )
+    tendencias_parser.add_argument(
+        "--completo",
+        action="store_true",
+        help="Recompute every criptomoeda, not only those with new quotes.",
+    )
+    tendencias_parser.add_argument(
+        "--limiar",
+        type=float,
+        default=LIMIAR_ESTAVEL,
+        help="Absolute percent variation under which a trend is 'Estável'.",
+    )
+    tendencias_parser.set_defaults(executar=tendencias)
+
+    particoes_parser = subparsers.add_parser(
+        "particoes",
+        help="Create the upcoming monthly partitions of Cotações and "
+        "Transações_Mercado and drop the ones past the retention.",
+    )
+    particoes_parser.add_argument("acao", choices=["manter"])
+    particoes_parser.add_argument(
+        "--meses-futuros",
+        type=int,
+        default=3,
+        help="Months after the current one to create partitions for.",
+    )
+    particoes_parser.add_argument(
+        "--retencao",
+        type=int,
+        help="Months of history to keep, counting the current one. Older "
+        "partitions are dropped; without it nothing is removed.",
+    )
+    particoes_parser.add_argument(
+        "--desanexar",
+        action="store_true",
+        help="Detach old partitions instead of dropping them, keeping them as "
+        "standalone tables.",
+    )
+    particoes_parser.set_defaults(executar=particoes)
+
+    arquivo_parser = subparsers.add_parser(
+        "arquivo",
+        help="Move the cotações of old months to Parquet files in ARQUIVO_DIR.",
+    )
+    arquivo_parser.add_argument("acao", choices=["cotacoes"])
+    limite = arquivo_parser.add_mutually_exclusive_group()
+    limite.add_argument(
+        "--meses",
+        type=int,
+        default=12,
+        choices=range(2, 1201),
+        metavar="MESES",
+        help="Months to keep in Postgres, counting the current one (at least "
+        "2, as the trends read the last 30 days).",
+    )
+    limite.add_argument(
+        "--antes",
+        type=datetime.date.fromisoformat,
+        help="Archive the months that end by this date (YYYY-MM-DD) instead.",
+    )
+    arquivo_parser.set_defaults(executar=arquivo)
+
+    portfolio_parser = subparsers.add_parser(
+        "portfolio",
+        help="Apply the queued market transactions to the portfolio, or "
+        "rebuild it from the whole history.",
+    )
+    portfolio_parser.add_argument("acao", choices=["atualizar", "reconstruir"])
+    portfolio_parser.add_argument(
+        "--lote",
+        type=int,
+        default=10_000,
+        help="Market transactions applied per database transaction.",
+    )
+    portfolio_parser.set_defaults(executar=portfolio)
+
+    args = parser.parse_args()
+    db = Database.load()
+    try:
+        args.executar(db, args)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
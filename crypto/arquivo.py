@@ -0,0 +1,342 @@
+"""
+Cold tier of Cotações: whole months of a criptomoeda moved out of Postgres
+into one Parquet file each, read back to complete the listings and exports
+whose window reaches them.
+"""
+
+import asyncio
+import datetime
+import heapq
+import itertools
+import os
+import uuid
+from typing import AsyncIterator, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from .paginacao import Instante, Pagina, decode_cursor
+
+# Mesmos tipos das colunas de Cotações, para as linhas lidas do arquivo serem
+# iguais às do banco (Decimal, datetime sem fuso).
+ESQUEMA = pa.schema(
+    [
+        ("id_cotacao", pa.int32()),
+        ("data_hora", pa.timestamp("us")),
+        ("preco", pa.decimal128(18, 8)),
+        ("volume", pa.decimal128(18, 2)),
+        ("market_cap", pa.decimal128(18, 2)),
+        ("variacao", pa.decimal128(5, 2)),
+    ]
+)
+COLUNAS = tuple(ESQUEMA.names)
+MAIS_RECENTES = [("data_hora", "descending"), ("id_cotacao", "descending")]
+
+# Mês arquivado de uma criptomoeda: (primeiro dia, caminho relativo).
+Mes = Tuple[datetime.date, str]
+
+
+def inicio_do_mes(mes: datetime.date) -> datetime.datetime:
+    return datetime.datetime(mes.year, mes.month, 1)
+
+
+def fim_do_mes(mes: datetime.date) -> datetime.datetime:
+    return datetime.datetime(mes.year + mes.month // 12, mes.month % 12 + 1, 1)
+
+
+def _instante(valor: Instante) -> datetime.datetime:
+    if isinstance(valor, datetime.datetime):
+        return valor
+    return datetime.datetime.combine(valor, datetime.time())
+
+
+def _chave(row: dict) -> tuple:
+    return row["data_hora"], row["id_cotacao"]
+
+
+def alcance(
+    pagina: Pagina, vivas: Sequence[dict] = ()
+) -> Tuple[Optional[datetime.datetime], Optional[datetime.datetime]]:
+    """
+    Oldest and newest data_hora, both inclusive, an archived row needs to
+    enter ``pagina``. Given ``vivas``, the page read from Cotações, a full
+    page only takes rows from its last one on.
+    """
+    inicio = _instante(pagina.inicio) if pagina.inicio is not None else None
+    teto = None
+    if pagina.fim is not None:
+        teto = _instante(pagina.fim) - datetime.timedelta(microseconds=1)
+    if pagina.cursor is not None:
+        instante, _ = decode_cursor(pagina.cursor)
+        teto = instante if teto is None else min(teto, instante)
+    if pagina.limite is not None and len(vivas) >= pagina.limite:
+        ultima = vivas[-1]["data_hora"]
+        inicio = ultima if inicio is None else max(inicio, ultima)
+    return inicio, teto
+
+
+def mesclar(vivas: Iterable[dict], arquivadas: Iterable[dict]) -> Iterator[dict]:
+    """
+    Merge two row sequences ordered newest first. A row found in both, left
+    in Cotações by an interrupted archiving, is returned once.
+    """
+    anterior = None
+    for row in heapq.merge(vivas, arquivadas, key=_chave, reverse=True):
+        chave = _chave(row)
+        if chave != anterior:
+            anterior = chave
+            yield row
+
+
+async def mesclar_lotes(
+    vivos: AsyncIterator[List[dict]], arquivados: AsyncIterator[List[dict]]
+) -> AsyncIterator[List[dict]]:
+    """Asyncio counterpart of ``mesclar``, over batches of rows."""
+    fontes = [vivos.__aiter__(), arquivados.__aiter__()]
+    buffers: List[List[dict]] = [[], []]
+    posicoes = [0, 0]
+    abertas = [True, True]
+    anterior = None
+    while True:
+        for i in (0, 1):
+            if posicoes[i] == len(buffers[i]) and abertas[i]:
+                lote = await anext(fontes[i], None)
+                if lote is None:
+                    abertas[i] = False
+                    buffers[i] = []
+                else:
+                    buffers[i] = lote
+                posicoes[i] = 0
+        if not any(abertas) and all(p == len(b) for p, b in zip(posicoes, buffers)):
+            return
+        saida = []
+        # Só avança enquanto cada fonte tem linhas no buffer ou já terminou.
+        while all(
+            posicoes[i] < len(buffers[i]) or not abertas[i] for i in (0, 1)
+        ) and any(posicoes[i] < len(buffers[i]) for i in (0, 1)):
+            if posicoes[1] == len(buffers[1]) or (
+                posicoes[0] < len(buffers[0])
+                and _chave(buffers[0][posicoes[0]]) >= _chave(buffers[1][posicoes[1]])
+            ):
+                i = 0
+            else:
+                i = 1
+            row = buffers[i][posicoes[i]]
+            posicoes[i] += 1
+            chave = _chave(row)
+            if chave != anterior:
+                anterior = chave
+                saida.append(row)
+        if saida:
+            yield saida
+
+
+class Arquivo:
+    """
+    Parquet files under ``diretorio``, one per criptomoeda and month, sorted
+    by (data_hora, id_cotacao) in row groups of ``linhas_por_grupo`` rows.
+    Reads memory-map the file, skip the row groups outside the requested
+    window by their data_hora statistics and decode only the requested
+    columns.
+    """
+
+    def __init__(self, diretorio: str, linhas_por_grupo: int = 100_000):
+        self.diretorio = diretorio
+        self.linhas_por_grupo = linhas_por_grupo
+
+    def caminho(self, id_cripto: int, mes: datetime.date) -> str:
+        return os.path.join("cotacoes", str(id_cripto), f"{mes:%Y-%m}.parquet")
+
+    def _absoluto(self, caminho: str) -> str:
+        return os.path.join(self.diretorio, caminho)
+
+    # --- Escrita ---
+
+    def arquivar(self, db, antes: datetime.date) -> List[dict]:
+        """
+        Move the cotações of every month that ends by ``antes`` from the
+        Database ``db`` to the archive, one transaction per criptomoeda and
+        month. The file is written aside and renamed into place right before
+        the commit that deletes the rows; if that commit fails the rows stay
+        in both places, which reads tolerate and the next run merges.
+        """
+        arquivados = []
+        for id_cripto, mes in db.meses_para_arquivar(antes):
+            caminho = self.caminho(id_cripto, mes)
+            destino = self._absoluto(caminho)
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            temporario = f"{destino}.{uuid.uuid4().hex}.tmp"
+            try:
+                with db.transacao() as tx:
+                    tabela, ids = self._montar(tx, id_cripto, mes, destino)
+                    pq.write_table(
+                        tabela,
+                        temporario,
+                        compression="zstd",
+                        row_group_size=self.linhas_por_grupo,
+                    )
+                    tx.remover_cotacoes_arquivadas(id_cripto, mes, ids)
+                    tx.registrar_arquivo(id_cripto, mes, caminho, tabela.num_rows)
+                    os.replace(temporario, destino)
+            finally:
+                if os.path.exists(temporario):
+                    os.remove(temporario)
+            arquivados.append({"id_cripto": id_cripto, "mes": mes, "linhas": len(ids)})
+        return arquivados
+
+    def _montar(
+        self, db, id_cripto: int, mes: datetime.date, destino: str
+    ) -> Tuple[pa.Table, List[int]]:
+        """The month's new rows, merged with the ones already archived."""
+        novas = pa.Table.from_batches(
+            [
+                pa.RecordBatch.from_pylist(lote, schema=ESQUEMA)
+                for lote in db.ler_cotacoes_mes(id_cripto, mes)
+            ],
+            schema=ESQUEMA,
+        )
+        ids = novas.column("id_cotacao").combine_chunks()
+        if os.path.exists(destino):
+            antigas = pq.read_table(destino, memory_map=True)
+            antigas = antigas.filter(
+                pc.invert(pc.is_in(antigas.column("id_cotacao"), value_set=ids))
+            )
+            novas = pa.concat_tables([antigas, novas])
+        tabela = novas.sort_by(
+            [("data_hora", "ascending"), ("id_cotacao", "ascending")]
+        )
+        return tabela, ids.to_pylist()
+
+    # --- Leitura ---
+
+    @staticmethod
+    def meses_da_pagina(
+        meses: Sequence[Mes], pagina: Pagina, vivas: Sequence[dict] = ()
+    ) -> List[Mes]:
+        """
+        The archived months that overlap ``pagina``'s window, narrowed by
+        ``vivas`` as in ``alcance``, newest first.
+        """
+        inicio, teto = alcance(pagina, vivas)
+        return sorted(
+            (
+                (mes, caminho)
+                for mes, caminho in meses
+                if (inicio is None or fim_do_mes(mes) > inicio)
+                and (teto is None or inicio_do_mes(mes) <= teto)
+            ),
+            reverse=True,
+        )
+
+    @staticmethod
+    def _filtro(pagina: Pagina) -> Optional[pc.Expression]:
+        data_hora, id_cotacao = pc.field("data_hora"), pc.field("id_cotacao")
+        condicoes = []
+        if pagina.inicio is not None:
+            condicoes.append(data_hora >= _instante(pagina.inicio))
+        if pagina.fim is not None:
+            condicoes.append(data_hora < _instante(pagina.fim))
+        if pagina.cursor is not None:
+            instante, id_ = decode_cursor(pagina.cursor)
+            condicoes.append(
+                (data_hora < instante) | ((data_hora == instante) & (id_cotacao < id_))
+            )
+        filtro = None
+        for condicao in condicoes:
+            filtro = condicao if filtro is None else filtro & condicao
+        return filtro
+
+    def grupos(
+        self,
+        caminho: str,
+        pagina: Pagina,
+        limite: Optional[int] = None,
+        colunas: Sequence[str] = COLUNAS,
+    ) -> Iterator[List[dict]]:
+        """
+        Rows of an archived month inside ``pagina``'s window, newest first,
+        one list per row group and at most ``limite`` rows from each.
+        ``colunas`` must include data_hora and id_cotacao.
+        """
+        arquivo = pq.ParquetFile(self._absoluto(caminho), memory_map=True)
+        indice = arquivo.schema_arrow.get_field_index("data_hora")
+        inicio, teto = alcance(pagina)
+        filtro = self._filtro(pagina)
+        for i in reversed(range(arquivo.num_row_groups)):
+            estatisticas = arquivo.metadata.row_group(i).column(indice).statistics
+            if estatisticas is not None and estatisticas.has_min_max:
+                if inicio is not None and estatisticas.max < inicio:
+                    continue
+                if teto is not None and estatisticas.min > teto:
+                    continue
+            tabela = arquivo.read_row_group(i, columns=list(colunas))
+            if filtro is not None:
+                tabela = tabela.filter(filtro)
+            if tabela.num_rows == 0:
+                continue
+            tabela = tabela.sort_by(MAIS_RECENTES)
+            if limite is not None:
+                tabela = tabela.slice(0, limite)
+            yield tabela.to_pylist()
+
+    def completar(
+        self, vivas: List[dict], meses: Sequence[Mes], pagina: Pagina
+    ) -> List[dict]:
+        """
+        Merge the archived rows of ``pagina``'s window into ``vivas``, the
+        page read from Cotações, keeping its order and limit. Months and row
+        groups are read newest first, only while they can still reach the
+        page.
+        """
+        linhas = vivas
+        for mes, caminho in self.meses_da_pagina(meses, pagina, vivas):
+            cheia = pagina.limite is not None and len(linhas) >= pagina.limite
+            if cheia and fim_do_mes(mes) <= linhas[-1]["data_hora"]:
+                break
+            for grupo in self.grupos(caminho, pagina, pagina.limite):
+                cheia = pagina.limite is not None and len(linhas) >= pagina.limite
+                if cheia and _chave(grupo[0]) < _chave(linhas[-1]):
+                    return linhas
+                linhas = list(itertools.islice(mesclar(linhas, grupo), pagina.limite))
+        return linhas
+
+    def completar_exportacao(
+        self,
+        lotes: Iterator[List[dict]],
+        meses: Sequence[Mes],
+        pagina: Pagina,
+        lote: int = 1000,
+    ) -> Iterator[List[dict]]:
+        """Merge the archived rows of ``pagina``'s window into an export."""
+        vivas = (row for linhas in lotes for row in linhas)
+        arquivadas = (
+            row
+            for _, caminho in self.meses_da_pagina(meses, pagina)
+            for grupo in self.grupos(caminho, pagina)
+            for row in grupo
+        )
+        linhas = mesclar(vivas, arquivadas)
+        while True:
+            saida = list(itertools.islice(linhas, lote))
+            if not saida:
+                return
+            yield saida
+
+    async def _grupos_async(
+        self, meses: Sequence[Mes], pagina: Pagina
+    ) -> AsyncIterator[List[dict]]:
+        for _, caminho in self.meses_da_pagina(meses, pagina):
+            grupos = self.grupos(caminho, pagina)
+            while True:
+                # Cada grupo é lido e decodificado fora do event loop.
+                grupo = await asyncio.to_thread(next, grupos, None)
+                if grupo is None:
+                    break
+                yield grupo
+
+    def completar_exportacao_async(
+        self, lotes: AsyncIterator[List[dict]], meses: Sequence[Mes], pagina: Pagina
+    ) -> AsyncIterator[List[dict]]:
+        """Asyncio counterpart of ``completar_exportacao``."""
+        return mesclar_lotes(lotes, self._grupos_async(meses, pagina))
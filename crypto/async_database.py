@@ -0,0 +1,1342 @@
+import asyncio
+import datetime
+import os
+import time
+import uuid
+from contextlib import asynccontextmanager
+from decimal import Decimal
+from typing import (
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+import dotenv
+from psycopg import AsyncConnection
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+
+from .arquivo import Arquivo, alcance
+from .cache import TTLCache
+from .metricas import POOL_ESPERA, medir_consulta, operacao_chamadora
+from .paginacao import Pagina, decode_rank_cursor
+
+
+class AsyncDatabase:
+    """
+    Asyncio counterpart of ``Database``, backed by a psycopg 3 connection pool.
+
+    One instance is shared by the whole application: every call checks a
+    connection out of the pool only for as long as its statement runs. Inside
+    ``transacao()`` the calls are bound to a single connection instead and
+    commit together.
+    """
+
+    def __init__(
+        self,
+        pool: AsyncConnectionPool,
+        conn: Optional[AsyncConnection] = None,
+        cache: Optional[TTLCache] = None,
+        preparar: bool = True,
+        arquivo: Optional[Arquivo] = None,
+        estado: Optional[dict] = None,
+        confirmacoes: Optional[list] = None,
+        finalizacoes: Optional[list] = None,
+    ):
+        self.pool = pool
+        self.conn = conn
+        # Cache opcional de listar_criptomoedas e listar_usuarios.
+        self.cache = cache
+        # Desligue atrás de um PgBouncer em modo transaction, que troca a
+        # sessão (e os comandos preparados) entre transações.
+        self.preparar = preparar
+        # Meses de cotações já movidos para arquivos Parquet.
+        self.arquivo = arquivo
+        # Dentro de transacao(): o que os chamadores guardam até o fim da
+        # transação externa, compartilhado pelas aninhadas, as ações de
+        # ao_confirmar deste nível e as de ao_terminar da transação externa.
+        self.estado = estado
+        self._confirmacoes = confirmacoes
+        self._finalizacoes = finalizacoes
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[AsyncConnection]:
+        if self.conn is not None:
+            yield self.conn
+        else:
+            inicio = time.perf_counter()
+            async with self.pool.connection() as conn:
+                POOL_ESPERA.observar(time.perf_counter() - inicio)
+                yield conn
+
+    @asynccontextmanager
+    async def transacao(self) -> AsyncIterator["AsyncDatabase"]:
+        """
+        Run the block in a transaction, or in a savepoint when already inside
+        one. The ``ao_confirmar`` actions of the block run after the
+        outermost transaction commits, and are dropped if it rolls back; the
+        ``ao_terminar`` ones run after it ends either way.
+        """
+        externa = self.estado is None
+        estado = {} if externa else self.estado
+        finalizacoes = [] if externa else self._finalizacoes
+        confirmacoes = []
+        try:
+            async with self.connection() as conn:
+                async with conn.transaction():
+                    yield type(self)(
+                        self.pool,
+                        conn,
+                        self.cache,
+                        self.preparar,
+                        self.arquivo,
+                        estado,
+                        confirmacoes,
+                        finalizacoes,
+                    )
+            if self._confirmacoes is not None:
+                self._confirmacoes.extend(confirmacoes)
+            else:
+                for acao in confirmacoes:
+                    acao()
+        finally:
+            if externa:
+                for acao in finalizacoes:
+                    acao()
+
+    def ao_confirmar(self, acao: Callable[[], None]):
+        """
+        Run ``acao`` once the current transaction commits, or right away
+        outside of transacao().
+        """
+        if self._confirmacoes is None:
+            acao()
+        else:
+            self._confirmacoes.append(acao)
+
+    def ao_terminar(self, acao: Callable[[], None]):
+        """
+        Run ``acao`` once the outermost transaction commits or rolls back, or
+        right away outside of transacao().
+        """
+        if self._finalizacoes is None:
+            acao()
+        else:
+            self._finalizacoes.append(acao)
+
+    def _prepare(self, preparar: bool) -> Optional[bool]:
+        """
+        ``prepare`` argument of psycopg's execute: the statements marked with
+        ``preparar`` are prepared on first use on each connection (psycopg
+        keeps them per connection, so a new connection prepares them again);
+        the rest follow psycopg's own threshold.
+        """
+        return self.preparar if preparar else None
+
+    async def query(
+        self, query: str, args: Tuple = (), preparar: bool = False
+    ) -> List[tuple]:
+        return await self._query(operacao_chamadora(), query, args, preparar)
+
+    async def query_dicts(
+        self, query: str, args: Tuple = (), preparar: bool = False
+    ) -> List[dict]:
+        """
+        ``query`` with each row built straight into a dict keyed by column
+        name by the cursor's row factory.
+        """
+        return await self._query(operacao_chamadora(), query, args, preparar, dict_row)
+
+    async def _query(
+        self,
+        operacao: str,
+        query: str,
+        args: Tuple,
+        preparar: bool = False,
+        row_factory=None,
+    ) -> list:
+        async with self.connection() as conn:
+            async with conn.cursor(row_factory=row_factory) as cursor:
+                with medir_consulta(operacao, query, args) as medicao:
+                    await cursor.execute(query, args, prepare=self._prepare(preparar))
+                    result = await cursor.fetchall()
+                    medicao.linhas = len(result)
+                    return result
+
+    async def execute(
+        self, query: str, args: Tuple = (), fetch: bool = False, preparar: bool = False
+    ) -> Union[List[tuple], None]:
+        # Outside of transacao() the pool commits when the connection is
+        # returned, or rolls back if the statement raised.
+        operacao = operacao_chamadora()
+        async with self.connection() as conn:
+            async with conn.cursor() as cursor:
+                with medir_consulta(operacao, query, args) as medicao:
+                    await cursor.execute(query, args, prepare=self._prepare(preparar))
+                    medicao.linhas = max(cursor.rowcount, 0)
+                    if fetch:
+                        return await cursor.fetchall()
+
+    async def copy(self, query: str, rows: Iterable[tuple]) -> int:
+        """
+        Feed rows to a ``COPY ... FROM STDIN`` statement. Outside of
+        transacao() they are committed together. Returns the number of rows.
+        """
+        operacao = operacao_chamadora()
+        async with self.connection() as conn:
+            async with conn.cursor() as cursor:
+                with medir_consulta(operacao, query) as medicao:
+                    async with cursor.copy(query) as copy:
+                        for row in rows:
+                            await copy.write_row(row)
+                    medicao.linhas = cursor.rowcount
+                return cursor.rowcount
+
+    def stream(
+        self, query: str, args: Tuple = (), lote: int = 1000
+    ) -> AsyncIterator[List[dict]]:
+        """
+        Run a query through a named (server-side) cursor and yield its rows
+        ``lote`` at a time, so the result is never fully materialized.
+        """
+        # Not a generator itself, so the caller is known before iterating.
+        return self._stream(operacao_chamadora(), query, args, lote)
+
+    async def _stream(
+        self, operacao: str, query: str, args: Tuple, lote: int
+    ) -> AsyncIterator[List[dict]]:
+        async with self.connection() as conn:
+            async with conn.cursor(
+                name=f"stream_{uuid.uuid4().hex}", row_factory=dict_row
+            ) as cursor:
+                with medir_consulta(operacao, query, args) as medicao:
+                    await cursor.execute(query, args)
+                    while True:
+                        rows = await cursor.fetchmany(lote)
+                        if not rows:
+                            break
+                        medicao.linhas += len(rows)
+                        yield rows
+
+    def enforce_only(self, value: List[tuple]):
+        if len(value) != 1:
+            raise ValueError("Enforce only validation failure.")
+        return value[0][0]
+
+    def stats(self) -> dict:
+        return self.pool.get_stats()
+
+    async def close(self):
+        await self.pool.close()
+
+    def _cache_leitura(self) -> Optional[TTLCache]:
+        # Dentro de transacao() a leitura precisa enxergar as escritas ainda
+        # não confirmadas, então vai direto ao banco.
+        return self.cache if self.conn is None else None
+
+    def _invalidar(self, chave: str):
+        if self.cache is not None:
+            self.cache.invalidar(chave)
+
+    # --- CRUD Notícias and Sentimentos ---
+
+    async def insert_noticia(
+        self,
+        id_cripto: int,
+        data_publicacao: datetime.date,
+        tema: str,
+        noticia: str,
+        fonte: str,
+    ) -> int:
+        query = """
+            INSERT INTO Notícias (id_cripto, data_publicacao, tema, noticia, fonte)
+            VALUES (%s, %s, %s, %s, %s)
+            RETURNING id_noticia;
+        """
+        result = await self.execute(
+            query,
+            (id_cripto, data_publicacao, tema, noticia, fonte),
+            fetch=True,
+            preparar=True,
+        )
+        return self.enforce_only(result)
+
+    async def atualizar_noticia(
+        self,
+        id_noticia: int,
+        id_cripto: int,
+        data_publicacao: datetime.date,
+        tema: str,
+        noticia: str,
+        fonte: str,
+    ):
+        query = """
+            UPDATE Notícias
+            SET id_cripto = %s, data_publicacao = %s, tema = %s, noticia = %s, fonte = %s
+            WHERE id_noticia = %s;
+        """
+        await self.execute(
+            query, (id_cripto, data_publicacao, tema, noticia, fonte, id_noticia)
+        )
+
+    async def inserir_sentimento(
+        self, id_noticia: int, id_usuario: int, sentimento: str, score_sentimento: float
+    ) -> int:
+        query = """
+            INSERT INTO Sentimentos_Notícias (id_noticia, id_usuario, sentimento, score_sentimento)
+            VALUES (%s, %s, %s, %s)
+            RETURNING id_sentimento;
+        """
+        result = await self.execute(
+            query,
+            (id_noticia, id_usuario, sentimento, score_sentimento),
+            fetch=True,
+            preparar=True,
+        )
+        return self.enforce_only(result)
+
+    async def excluir_sentimento(self, id_sentimento: int):
+        # Excluir sentimentos relacionados
+        query_sentimentos = "DELETE FROM Sentimentos_Notícias WHERE id_sentimento = %s;"
+        await self.execute(query_sentimentos, (id_sentimento,))
+
+    async def listar_noticias_por_criptomoeda(self, id_cripto: int) -> List[dict]:
+        query = """
+            SELECT N.id_noticia, N.data_publicacao, N.tema, N.noticia, N.fonte,
+                   U.nome AS usuario, S.sentimento, S.score_sentimento
+            FROM Notícias N
+            JOIN Sentimentos_Notícias S ON N.id_noticia = S.id_noticia
+            JOIN Usuarios U ON S.id_usuario = U.id_usuario
+            WHERE N.id_cripto = %s;
+        """
+        return await self.query_dicts(query, (id_cripto,), preparar=True)
+
+    async def atualizar_sentimento(
+        self,
+        id_sentimento: int,
+        id_usuario: int,
+        novo_sentimento: str,
+        novo_score: float,
+    ):
+        query = """
+            UPDATE Sentimentos_Notícias
+            SET id_usuario = %s, sentimento = %s, score_sentimento = %s
+            WHERE id_sentimento = %s;
+        """
+        await self.execute(
+            query, (id_usuario, novo_sentimento, novo_score, id_sentimento)
+        )
+
+    async def excluir_noticia(self, id_noticia: int):
+        async with self.transacao() as tx:
+            # Excluir sentimentos relacionados
+            query_sentimentos = (
+                "DELETE FROM Sentimentos_Notícias WHERE id_noticia = %s;"
+            )
+            await tx.execute(query_sentimentos, (id_noticia,))
+            # Excluir notícia
+            query_noticia = "DELETE FROM Notícias WHERE id_noticia = %s;"
+            await tx.execute(query_noticia, (id_noticia,))
+
+    async def listar_noticias(self, pagina: Optional[Pagina] = None) -> List[dict]:
+        """
+        List all news records with an aggregation of the sentiments.
+        Returns a list of dictionaries with the news details,
+        an array of associated sentiments, and the average sentiment score.
+        """
+        filtro, args = (pagina or Pagina()).sql("data_publicacao", "id_noticia")
+        query = f"SELECT * FROM Todas_Notícias {filtro};"
+        return await self.query_dicts(query, args, preparar=True)
+
+    async def buscar_noticias(
+        self,
+        termos: str,
+        id_cripto: Optional[int] = None,
+        limite: int = 20,
+        cursor: Optional[str] = None,
+        candidatos: int = 1000,
+    ) -> List[dict]:
+        """
+        Full-text search over tema and noticia, best matches first. ``termos``
+        accepts the web search syntax ("frases", OR, -exclusão). Snippets are
+        only built for the rows of the page.
+
+        Only the ``candidatos`` most recent matches are ranked, read through
+        the data_publicacao index, so the cost of a page does not grow with
+        the number of matches; older matches of a broad search are left out.
+        """
+        condicoes, args = ["N.busca @@ C.q"], [termos]
+        if id_cripto is not None:
+            condicoes.append("N.id_cripto = %s")
+            args.append(id_cripto)
+        args.append(candidatos)
+        posicao = ""
+        if cursor is not None:
+            posicao = "WHERE (R.rank, R.id_noticia) < (%s::REAL, %s)"
+            args.extend(decode_rank_cursor(cursor))
+        args.append(limite)
+        query = f"""
+            WITH C AS (SELECT websearch_to_tsquery('portuguese', %s) AS q)
+            SELECT R.id_noticia, R.id_cripto, R.data_publicacao, R.tema, R.fonte, R.rank,
+                   ts_headline('portuguese', R.noticia, C.q, 'MaxFragments=2, MaxWords=30, MinWords=10') AS trecho
+            FROM (
+                SELECT N.id_noticia, N.id_cripto, N.data_publicacao, N.tema, N.fonte,
+                       N.noticia, ts_rank(N.busca, C.q) AS rank
+                FROM (
+                    SELECT N.*
+                    FROM Notícias N, C
+                    WHERE {" AND ".join(condicoes)}
+                    ORDER BY N.data_publicacao DESC, N.id_noticia DESC
+                    LIMIT %s
+                ) N, C
+            ) R, C
+            {posicao}
+            ORDER BY R.rank DESC, R.id_noticia DESC
+            LIMIT %s;
+        """
+        return await self.query_dicts(query, tuple(args))
+
+    async def ler_limiares_sentimento(self) -> dict:
+        query = "SELECT positivo, negativo FROM Sentimentos_Limiares;"
+        positivo, negativo = (await self.query(query))[0]
+        return {"positivo": positivo, "negativo": negativo}
+
+    async def definir_limiares_sentimento(self, positivo: float, negativo: float):
+        """
+        Change the classification thresholds. Rows already written keep their
+        class until ``reclassificar_sentimentos`` runs.
+        """
+        query = "UPDATE Sentimentos_Limiares SET positivo = %s, negativo = %s;"
+        await self.execute(query, (positivo, negativo))
+
+    async def reclassificar_sentimentos(self, lote: int = 5000) -> int:
+        """
+        Fix the sentimento of rows whose class disagrees with the current
+        thresholds, committing every ``lote`` rows. Rows already right are not
+        rewritten. Returns the number of rows changed.
+        """
+        query = """
+            WITH Lote AS (
+                SELECT S.id_sentimento
+                FROM Sentimentos_Notícias S
+                CROSS JOIN Sentimentos_Limiares L
+                WHERE S.id_sentimento > %s
+                  AND S.sentimento IS DISTINCT FROM
+                      classificar_sentimento(S.score_sentimento, L.positivo, L.negativo)
+                ORDER BY S.id_sentimento
+                LIMIT %s
+            ), Atualizadas AS (
+                UPDATE Sentimentos_Notícias S
+                SET sentimento = NULL
+                FROM Lote
+                WHERE S.id_sentimento = Lote.id_sentimento
+                RETURNING S.id_sentimento
+            )
+            SELECT COUNT(*), MAX(id_sentimento) FROM Atualizadas;
+        """
+        ultimo, total = 0, 0
+        while True:
+            result = await self.execute(query, (ultimo, lote), fetch=True)
+            quantidade, proximo = result[0]
+            if proximo is None:
+                return total
+            total += quantidade
+            ultimo = proximo
+
+    async def listar_sentimentos_por_noticia(self, id_noticia: int) -> List[dict]:
+        """
+        List all sentiment entries (with user information) for a given news item.
+        """
+        query = """
+            SELECT S.id_sentimento, U.id_usuario, U.nome AS usuario, S.sentimento, S.score_sentimento
+            FROM Sentimentos_Notícias S
+            JOIN Usuarios U ON S.id_usuario = U.id_usuario
+            WHERE S.id_noticia = %s;
+        """
+        return await self.query_dicts(query, (id_noticia,), preparar=True)
+
+    # --- CRUD for Criptomoedas ---
+
+    async def inserir_criptomoeda(
+        self, nome: str, simbolo: str, descricao: str, mercado: str
+    ) -> int:
+        query = """
+            INSERT INTO Criptomoedas (nome, simbolo, descricao, mercado)
+            VALUES (%s, %s, %s, %s)
+            RETURNING id_cripto;
+        """
+        result = await self.execute(
+            query, (nome, simbolo, descricao, mercado), fetch=True
+        )
+        self._invalidar("criptomoedas")
+        return self.enforce_only(result)
+
+    async def listar_criptomoedas(self) -> List[dict]:
+        cache = self._cache_leitura()
+        if cache is not None:
+            cryptos = cache.get("criptomoedas")
+            if cryptos is not None:
+                return list(cryptos)
+            geracao = cache.geracao("criptomoedas")
+        query = "SELECT id_cripto, nome, simbolo, descricao, mercado FROM Criptomoedas ORDER BY nome;"
+        cryptos = await self.query_dicts(query)
+        if cache is not None:
+            cache.put("criptomoedas", tuple(cryptos), geracao)
+        return cryptos
+
+    async def atualizar_criptomoeda(
+        self, id_cripto: int, nome: str, simbolo: str, descricao: str, mercado: str
+    ):
+        query = """
+            UPDATE Criptomoedas
+            SET nome = %s, simbolo = %s, descricao = %s, mercado = %s
+            WHERE id_cripto = %s;
+        """
+        await self.execute(query, (nome, simbolo, descricao, mercado, id_cripto))
+        self._invalidar("criptomoedas")
+
+    async def excluir_criptomoeda(self, id_cripto: int):
+        query = "DELETE FROM Criptomoedas WHERE id_cripto = %s;"
+        await self.execute(query, (id_cripto,))
+        self._invalidar("criptomoedas")
+
+    # --- CRUD for Cotações ---
+
+    async def inserir_cotacao(
+        self,
+        id_cripto: int,
+        data_hora: datetime.datetime,
+        preco: float,
+        volume: float,
+        market_cap: float,
+        variacao: float,
+    ) -> int:
+        query = """
+            INSERT INTO Cotações (id_cripto, data_hora, preco, volume, market_cap, variacao)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            RETURNING id_cotacao;
+        """
+        result = await self.execute(
+            query,
+            (id_cripto, data_hora, preco, volume, market_cap, variacao),
+            fetch=True,
+            preparar=True,
+        )
+        return self.enforce_only(result)
+
+    async def inserir_cotacoes(self, cotacoes: Iterable[tuple]) -> int:
+        """
+        Bulk version of ``inserir_cotacao``. Each tuple follows its argument
+        order: (id_cripto, data_hora, preco, volume, market_cap, variacao).
+        """
+        query = """
+            COPY Cotações (id_cripto, data_hora, preco, volume, market_cap, variacao)
+            FROM STDIN;
+        """
+        return await self.copy(query, cotacoes)
+
+    async def listar_cotacoes(
+        self, id_cripto: int, pagina: Optional[Pagina] = None
+    ) -> List[dict]:
+        filtro, args = (pagina or Pagina()).sql(
+            "data_hora", "id_cotacao", ["id_cripto = %s"], [id_cripto]
+        )
+        query = f"""
+            SELECT id_cotacao, data_hora, preco, volume, market_cap, variacao
+            FROM Cotações
+            {filtro};
+        """
+        cotacoes = await self.query_dicts(query, args, preparar=True)
+        if self.arquivo is None:
+            return cotacoes
+        pagina = pagina or Pagina()
+        meses = await self.meses_arquivados(id_cripto, *alcance(pagina, cotacoes))
+        if not Arquivo.meses_da_pagina(meses, pagina, cotacoes):
+            return cotacoes
+        return await asyncio.to_thread(self.arquivo.completar, cotacoes, meses, pagina)
+
+    def exportar_cotacoes(
+        self, id_cripto: int, pagina: Optional[Pagina] = None
+    ) -> AsyncIterator[List[dict]]:
+        """
+        Streaming version of ``listar_cotacoes`` for exports of the full history.
+        """
+        filtro, args = (pagina or Pagina()).sql(
+            "data_hora", "id_cotacao", ["id_cripto = %s"], [id_cripto]
+        )
+        query = f"""
+            SELECT id_cotacao, data_hora, preco, volume, market_cap, variacao
+            FROM Cotações
+            {filtro};
+        """
+        lotes = self.stream(query, args)
+        if self.arquivo is None:
+            return lotes
+        return self._completar_exportacao(id_cripto, lotes, pagina or Pagina())
+
+    async def _completar_exportacao(
+        self, id_cripto: int, lotes: AsyncIterator[List[dict]], pagina: Pagina
+    ) -> AsyncIterator[List[dict]]:
+        meses = await self.meses_arquivados(id_cripto, *alcance(pagina))
+        async for lote in self.arquivo.completar_exportacao_async(lotes, meses, pagina):
+            yield lote
+
+    async def meses_arquivados(
+        self,
+        id_cripto: int,
+        inicio: Optional[datetime.datetime] = None,
+        teto: Optional[datetime.datetime] = None,
+    ) -> List[tuple]:
+        """
+        (mes, caminho) of the months of ``id_cripto`` in the archive, oldest
+        first. Without a cache only the months overlapping [inicio, teto] are
+        read, through the primary key; with one the whole index is cached and
+        the caller narrows it with ``Arquivo.meses_da_pagina``.
+        """
+        cache = self._cache_leitura()
+        if cache is None:
+            condicoes, args = ["id_cripto = %s"], [id_cripto]
+            if inicio is not None:
+                condicoes.append("mes > %s::TIMESTAMP - INTERVAL '1 month'")
+                args.append(inicio)
+            if teto is not None:
+                condicoes.append("mes <= %s")
+                args.append(teto)
+            query = f"""
+                SELECT mes, caminho
+                FROM Cotações_Arquivadas
+                WHERE {" AND ".join(condicoes)}
+                ORDER BY mes;
+            """
+            return [tuple(row) for row in await self.query(query, tuple(args))]
+        meses = cache.get("cotações_arquivadas")
+        if meses is not None:
+            return meses.get(id_cripto, [])
+        geracao = cache.geracao("cotações_arquivadas")
+        query = "SELECT id_cripto, mes, caminho FROM Cotações_Arquivadas ORDER BY mes;"
+        meses = {}
+        for id_arquivado, mes, caminho in await self.query(query):
+            meses.setdefault(id_arquivado, []).append((mes, caminho))
+        cache.put("cotações_arquivadas", meses, geracao)
+        return meses.get(id_cripto, [])
+
+    async def listar_candles(
+        self,
+        id_cripto: int,
+        intervalo: str,
+        inicio: Optional[datetime.datetime] = None,
+        fim: Optional[datetime.datetime] = None,
+        limite: int = 1000,
+    ) -> List[dict]:
+        """
+        List the precomputed OHLCV candles of a criptomoeda in chronological
+        order. Without ``inicio`` the most recent ``limite`` candles are returned.
+        """
+        condicoes, args = ["id_cripto = %s", "intervalo = %s"], [id_cripto, intervalo]
+        if inicio is not None:
+            condicoes.append("inicio >= %s")
+            args.append(inicio)
+        if fim is not None:
+            condicoes.append("inicio < %s")
+            args.append(fim)
+        ordem = "ASC" if inicio is not None else "DESC"
+        query = f"""
+            SELECT inicio, abertura, maxima, minima, fechamento, volume, quantidade_cotacoes
+            FROM Candles
+            WHERE {" AND ".join(condicoes)}
+            ORDER BY inicio {ordem}
+            LIMIT %s;
+        """
+        candles = await self.query_dicts(query, (*args, limite), preparar=True)
+        if ordem == "DESC":
+            candles.reverse()
+        return candles
+
+    async def retirar_tendencias_pendentes(self, limite: int) -> List[int]:
+        """
+        Remove up to ``limite`` criptomoedas from Tendencias_Pendentes and
+        return them. Rows queued by transactions still open are left for a
+        later run, so no quote is missed whatever order they commit in.
+        """
+        query = """
+            DELETE FROM Tendencias_Pendentes
+            WHERE id_cripto IN (
+                SELECT DISTINCT id_cripto FROM Tendencias_Pendentes
+                ORDER BY id_cripto
+                LIMIT %s
+            )
+            RETURNING id_cripto;
+        """
+        retiradas = await self.execute(query, (limite,), fetch=True)
+        return sorted({row[0] for row in retiradas})
+
+    async def enfileirar_tendencias(self):
+        """Queue every criptomoeda, so the next run recomputes all trends."""
+        await self.execute(
+            "INSERT INTO Tendencias_Pendentes (id_cripto) "
+            "SELECT id_cripto FROM Criptomoedas;"
+        )
+
+    async def series_cotacoes(
+        self, ids: List[int], janela: datetime.timedelta
+    ) -> List[tuple]:
+        """
+        The last ``janela`` of quotes of each criptomoeda, plus the last quote
+        before it, as (id_cripto, epoch seconds, preco) rows ordered by
+        criptomoeda and time. The earlier quote tells whether the series
+        covers the whole window.
+        """
+        query = """
+            SELECT C.id_cripto, EXTRACT(EPOCH FROM C.data_hora)::BIGINT, C.preco::FLOAT8
+            FROM unnest(%s::INT[]) AS U (id_cripto)
+            CROSS JOIN LATERAL (
+                SELECT MAX(data_hora) AS ultima FROM Cotações WHERE id_cripto = U.id_cripto
+            ) M
+            CROSS JOIN LATERAL (
+                SELECT MAX(data_hora) AS anterior
+                FROM Cotações
+                WHERE id_cripto = U.id_cripto AND data_hora <= M.ultima - %s
+            ) A
+            JOIN Cotações C ON C.id_cripto = U.id_cripto
+                AND C.data_hora >= COALESCE(A.anterior, M.ultima - %s)
+            ORDER BY C.id_cripto, C.data_hora, C.id_cotacao;
+        """
+        return await self.query(query, (list(ids), janela, janela))
+
+    async def salvar_tendencias(self, tendencias: Sequence[tuple]) -> int:
+        """
+        Upsert (id_cripto, periodo, variacao_preco, tendencia) rows into
+        Tendências_Preço and record the engine run in one statement.
+        """
+        colunas = list(zip(*tendencias)) or [(), (), (), ()]
+        query = """
+            WITH Salvas AS (
+                INSERT INTO Tendências_Preço (id_cripto, periodo, variacao_preco, tendencia)
+                SELECT * FROM unnest(%s::INT[], %s::VARCHAR[], %s::DECIMAL[], %s::VARCHAR[])
+                ON CONFLICT (id_cripto, periodo) DO UPDATE SET
+                    variacao_preco = EXCLUDED.variacao_preco,
+                    tendencia = EXCLUDED.tendencia,
+                    data_hora = EXCLUDED.data_hora
+                RETURNING 1
+            ), Progresso AS (
+                UPDATE Tendencias_Progresso
+                SET executada_em = CURRENT_TIMESTAMP
+            )
+            SELECT COUNT(*) FROM Salvas;
+        """
+        args = tuple(list(coluna) for coluna in colunas)
+        return self.enforce_only(await self.execute(query, args, fetch=True))
+
+    # --- CRUD for Transações de Mercado ---
+
+    async def inserir_transacao(
+        self,
+        id_cripto: int,
+        data_hora: datetime.datetime,
+        tipo: str,
+        quantidade: float,
+        preco_unitario: float,
+    ) -> int:
+        query = """
+            INSERT INTO Transações_Mercado (id_cripto, data_hora, tipo, quantidade, preco_unitario)
+            VALUES (%s, %s, %s, %s, %s)
+            RETURNING id_transacao;
+        """
+        result = await self.execute(
+            query,
+            (id_cripto, data_hora, tipo, quantidade, preco_unitario),
+            fetch=True,
+            preparar=True,
+        )
+        return self.enforce_only(result)
+
+    async def inserir_transacoes(self, transacoes: Iterable[tuple]) -> int:
+        """
+        Bulk version of ``inserir_transacao``. Each tuple follows its argument
+        order: (id_cripto, data_hora, tipo, quantidade, preco_unitario).
+        """
+        query = """
+            COPY Transações_Mercado (id_cripto, data_hora, tipo, quantidade, preco_unitario)
+            FROM STDIN;
+        """
+        return await self.copy(query, transacoes)
+
+    async def listar_transacoes(
+        self, id_cripto: int, pagina: Optional[Pagina] = None
+    ) -> List[dict]:
+        filtro, args = (pagina or Pagina()).sql(
+            "data_hora", "id_transacao", ["id_cripto = %s"], [id_cripto]
+        )
+        query = f"""
+            SELECT id_transacao, data_hora, tipo, quantidade, preco_unitario
+            FROM Transações_Mercado
+            {filtro};
+        """
+        return await self.query_dicts(query, args, preparar=True)
+
+    def exportar_transacoes(
+        self, id_cripto: int, pagina: Optional[Pagina] = None
+    ) -> AsyncIterator[List[dict]]:
+        """
+        Streaming version of ``listar_transacoes`` for exports of the full history.
+        """
+        filtro, args = (pagina or Pagina()).sql(
+            "data_hora", "id_transacao", ["id_cripto = %s"], [id_cripto]
+        )
+        query = f"""
+            SELECT id_transacao, data_hora, tipo, quantidade, preco_unitario
+            FROM Transações_Mercado
+            {filtro};
+        """
+        return self.stream(query, args)
+
+    # --- Portfólio ---
+
+    async def travar_portfolio(self):
+        """
+        Lock the portfolio engine progress row until the end of the current
+        transaction, so only one run drains the queue at a time. Only
+        meaningful inside transacao().
+        """
+        await self.query("SELECT 1 FROM Portfolio_Progresso FOR UPDATE;")
+
+    async def retirar_transacoes_pendentes(self, limite: int) -> List[tuple]:
+        """
+        Remove the ``limite`` oldest queued transactions and return them as
+        (data_hora, id_transacao, id_cripto, tipo, quantidade, preco_unitario)
+        rows in that order.
+        """
+        query = """
+            DELETE FROM Portfolio_Pendentes P
+            USING (
+                SELECT data_hora, id_transacao
+                FROM Portfolio_Pendentes
+                ORDER BY data_hora, id_transacao
+                LIMIT %s
+            ) R
+            WHERE P.data_hora = R.data_hora AND P.id_transacao = R.id_transacao
+            RETURNING P.data_hora, P.id_transacao, P.id_cripto, P.tipo,
+                      P.quantidade, P.preco_unitario;
+        """
+        return sorted(await self.execute(query, (limite,), fetch=True, preparar=True))
+
+    async def refazer_historico_portfolio(self, ids: List[int]) -> List[tuple]:
+        """
+        Drop the lots and the queued transactions of the criptomoedas in
+        ``ids`` and return their whole history, in the same row format and
+        order as ``retirar_transacoes_pendentes``. One statement, so the
+        queue rows removed are exactly the transactions returned.
+        """
+        query = """
+            WITH Lotes AS (
+                DELETE FROM Portfolio_Lotes WHERE id_cripto = ANY (%s)
+            ), Pendentes AS (
+                DELETE FROM Portfolio_Pendentes WHERE id_cripto = ANY (%s)
+            )
+            SELECT data_hora, id_transacao, id_cripto, tipo, quantidade, preco_unitario
+            FROM Transações_Mercado
+            WHERE id_cripto = ANY (%s)
+            ORDER BY data_hora, id_transacao;
+        """
+        ids = list(ids)
+        return await self.execute(query, (ids, ids, ids), fetch=True)
+
+    async def ler_posicoes(self, ids: List[int]) -> List[dict]:
+        query = """
+            SELECT id_cripto, quantidade, custo, pnl_realizado, empilhado,
+                   consumido, transacoes, atualizada_em
+            FROM Portfolio_Posicoes
+            WHERE id_cripto = ANY (%s);
+        """
+        return await self.query_dicts(query, (list(ids),), preparar=True)
+
+    async def ler_lotes_abertos(self, limites: Dict[int, Decimal]) -> List[dict]:
+        """
+        Open lots of each criptomoeda in ``limites`` starting before the
+        queue quantity it maps to, in FIFO order.
+        """
+        query = """
+            SELECT L.id_cripto, L.inicio, L.quantidade, L.preco, L.data_hora
+            FROM unnest(%s::INT[], %s::DECIMAL[]) AS U (id_cripto, ate)
+            JOIN Portfolio_Lotes L ON L.id_cripto = U.id_cripto AND L.inicio < U.ate
+            ORDER BY L.id_cripto, L.inicio;
+        """
+        args = (list(limites), list(limites.values()))
+        return await self.query_dicts(query, args, preparar=True)
+
+    async def salvar_portfolio(
+        self, posicoes: Sequence[tuple], lotes: Sequence[tuple]
+    ) -> int:
+        """
+        Upsert (id_cripto, quantidade, custo, pnl_realizado, empilhado,
+        consumido, transacoes, atualizada_em) positions, drop the lots they
+        fully consumed and add the new (id_cripto, inicio, quantidade, preco,
+        data_hora) lots, in one statement.
+        """
+        posicoes = list(zip(*posicoes)) or [()] * 8
+        lotes = list(zip(*lotes)) or [()] * 5
+        query = """
+            WITH Fechados AS (
+                DELETE FROM Portfolio_Lotes L
+                USING unnest(%s::INT[], %s::DECIMAL[]) AS U (id_cripto, consumido)
+                WHERE L.id_cripto = U.id_cripto
+                  AND L.inicio < U.consumido
+                  AND L.inicio + L.quantidade <= U.consumido
+            ), Abertos AS (
+                INSERT INTO Portfolio_Lotes (id_cripto, inicio, quantidade, preco, data_hora)
+                SELECT * FROM unnest(
+                    %s::INT[], %s::DECIMAL[], %s::DECIMAL[], %s::DECIMAL[], %s::TIMESTAMP[]
+                )
+            ), Salvas AS (
+                INSERT INTO Portfolio_Posicoes (
+                    id_cripto, quantidade, custo, pnl_realizado, empilhado,
+                    consumido, transacoes, atualizada_em
+                )
+                SELECT * FROM unnest(
+                    %s::INT[], %s::DECIMAL[], %s::DECIMAL[], %s::DECIMAL[],
+                    %s::DECIMAL[], %s::DECIMAL[], %s::INT[], %s::TIMESTAMP[]
+                )
+                ON CONFLICT (id_cripto) DO UPDATE SET
+                    quantidade = EXCLUDED.quantidade,
+                    custo = EXCLUDED.custo,
+                    pnl_realizado = EXCLUDED.pnl_realizado,
+                    empilhado = EXCLUDED.empilhado,
+                    consumido = EXCLUDED.consumido,
+                    transacoes = EXCLUDED.transacoes,
+                    atualizada_em = EXCLUDED.atualizada_em
+                RETURNING 1
+            ), Progresso AS (
+                UPDATE Portfolio_Progresso SET executada_em = CURRENT_TIMESTAMP
+            )
+            SELECT COUNT(*) FROM Salvas;
+        """
+        args = (
+            list(posicoes[0]),
+            list(posicoes[5]),
+            *(list(coluna) for coluna in lotes),
+            *(list(coluna) for coluna in posicoes),
+        )
+        return self.enforce_only(await self.execute(query, args, fetch=True))
+
+    async def listar_portfolio(self, id_cripto: Optional[int] = None) -> List[dict]:
+        """
+        Position, average cost and P&L of each criptomoeda, the unrealized
+        part marked against its latest quote, read from the archive when all
+        of its quotes were archived.
+        """
+        posicoes = await self._listar_portfolio(id_cripto, {})
+        if self.arquivo is None:
+            return posicoes
+        arquivadas = {}
+        for posicao in posicoes:
+            i = posicao["id_cripto"]
+            if posicao["ultimo_preco"] is None and await self.meses_arquivados(i):
+                cotacoes = await self.listar_cotacoes(i, Pagina(limite=1))
+                if cotacoes:
+                    arquivadas[i] = cotacoes[0]
+        if not arquivadas:
+            return posicoes
+        return await self._listar_portfolio(id_cripto, arquivadas)
+
+    async def _listar_portfolio(
+        self, id_cripto: Optional[int], arquivadas: Dict[int, dict]
+    ) -> List[dict]:
+        query = """
+            SELECT P.id_cripto, P.quantidade,
+                   ROUND(P.custo / NULLIF(ABS(P.quantidade), 0), 8) AS preco_medio,
+                   ROUND(P.custo, 8) AS custo,
+                   U.preco AS ultimo_preco,
+                   U.data_hora AS cotado_em,
+                   ROUND(P.pnl_realizado, 8) AS pnl_realizado,
+                   ROUND(U.preco * P.quantidade - SIGN(P.quantidade) * P.custo, 8)
+                       AS pnl_nao_realizado,
+                   P.transacoes, P.atualizada_em
+            FROM Portfolio_Posicoes P
+            LEFT JOIN LATERAL (
+                SELECT preco, data_hora
+                FROM Cotações
+                WHERE id_cripto = P.id_cripto
+                ORDER BY data_hora DESC, id_cotacao DESC
+                LIMIT 1
+            ) V ON TRUE
+            LEFT JOIN unnest(%s::INT[], %s::DECIMAL[], %s::TIMESTAMP[])
+                AS A (id_cripto, preco, data_hora) ON A.id_cripto = P.id_cripto
+            CROSS JOIN LATERAL (
+                SELECT COALESCE(V.preco, A.preco) AS preco,
+                       COALESCE(V.data_hora, A.data_hora) AS data_hora
+            ) U
+            WHERE %s::INT IS NULL OR P.id_cripto = %s
+            ORDER BY P.id_cripto;
+        """
+        args = (
+            list(arquivadas),
+            [cotacao["preco"] for cotacao in arquivadas.values()],
+            [cotacao["data_hora"] for cotacao in arquivadas.values()],
+            id_cripto,
+            id_cripto,
+        )
+        return await self.query_dicts(query, args, preparar=True)
+
+    async def reconstruir_portfolio(self):
+        """Reset the portfolio and queue the whole transaction history again."""
+        await self.execute("CALL reconstruir_portfolio();")
+
+    # --- CRUD for Ordens ---
+
+    async def inserir_ordem(
+        self, id_cripto: int, tipo: str, quantidade: float, preco_limite: float
+    ) -> int:
+        query = """
+            INSERT INTO Ordens (id_cripto, tipo, quantidade, preco_limite)
+            VALUES (%s, %s, %s, %s)
+            RETURNING id_ordem;
+        """
+        result = await self.execute(
+            query,
+            (id_cripto, tipo, quantidade, preco_limite),
+            fetch=True,
+            preparar=True,
+        )
+        return self.enforce_only(result)
+
+    async def listar_ordens(self, id_cripto: int) -> List[dict]:
+        query = """
+            SELECT id_ordem, tipo, quantidade, preco_limite
+            FROM Ordens
+            WHERE id_cripto = %s
+            ORDER BY id_ordem DESC;
+        """
+        return await self.query_dicts(query, (id_cripto,), preparar=True)
+
+    async def listar_ordens_abertas(
+        self, id_cripto: Optional[int] = None
+    ) -> List[dict]:
+        """
+        Orders still resting in the book, oldest first, as loaded by the
+        matching engine. Rows with an unknown tipo or no quantity are skipped.
+        """
+        condicoes, args = ["lower(tipo) IN ('compra', 'venda')", "quantidade > 0"], []
+        if id_cripto is not None:
+            condicoes.append("id_cripto = %s")
+            args.append(id_cripto)
+        query = f"""
+            SELECT id_ordem, id_cripto, tipo, quantidade, preco_limite
+            FROM Ordens
+            WHERE id_cripto IS NOT NULL AND {" AND ".join(condicoes)}
+            ORDER BY id_ordem;
+        """
+        return await self.query_dicts(query, tuple(args))
+
+    async def ler_ordem(self, id_ordem: int) -> Optional[dict]:
+        query = """
+            SELECT id_ordem, id_cripto, tipo, quantidade, preco_limite
+            FROM Ordens
+            WHERE id_ordem = %s;
+        """
+        result = await self.query(query, (id_ordem,), preparar=True)
+        if not result:
+            return None
+        id_ordem, id_cripto, tipo, quantidade, preco_limite = result[0]
+        return {
+            "id_ordem": id_ordem,
+            "id_cripto": id_cripto,
+            "tipo": tipo,
+            "quantidade": quantidade,
+            "preco_limite": preco_limite,
+        }
+
+    async def atualizar_quantidade_ordem(self, id_ordem: int, quantidade: float):
+        """
+        Set the quantity still open on an order, deleting it once fully filled.
+        """
+        if quantidade <= 0:
+            await self.excluir_ordem(id_ordem)
+            return
+        query = "UPDATE Ordens SET quantidade = %s WHERE id_ordem = %s;"
+        await self.execute(query, (quantidade, id_ordem), preparar=True)
+
+    async def excluir_ordem(self, id_ordem: int):
+        query = "DELETE FROM Ordens WHERE id_ordem = %s;"
+        await self.execute(query, (id_ordem,), preparar=True)
+
+    async def travar_livro(self, id_cripto: int) -> int:
+        """
+        Lock the book version of a criptomoeda until the end of the current
+        transaction and return it. Only meaningful inside transacao().
+        """
+        query = """
+            INSERT INTO Ordens_Versoes (id_cripto) VALUES (%s)
+            ON CONFLICT (id_cripto) DO NOTHING;
+        """
+        await self.execute(query, (id_cripto,), preparar=True)
+        query = "SELECT versao FROM Ordens_Versoes WHERE id_cripto = %s FOR UPDATE;"
+        return self.enforce_only(await self.query(query, (id_cripto,), preparar=True))
+
+    async def versao_livro(self, id_cripto: int) -> int:
+        query = "SELECT versao FROM Ordens_Versoes WHERE id_cripto = %s;"
+        result = await self.query(query, (id_cripto,), preparar=True)
+        return result[0][0] if result else 0
+
+    async def listar_versoes_livros(self) -> Dict[int, int]:
+        result = await self.query("SELECT id_cripto, versao FROM Ordens_Versoes;")
+        return dict(result)
+
+    # --- CRUD for Tendências de Preço ---
+
+    async def inserir_tendencia(
+        self, id_cripto: int, periodo: str, variacao_preco: float, tendencia: str
+    ) -> int:
+        query = """
+            INSERT INTO Tendências_Preço (id_cripto, periodo, variacao_preco, tendencia)
+            VALUES (%s, %s, %s, %s)
+            ON CONFLICT (id_cripto, periodo) DO UPDATE SET
+                variacao_preco = EXCLUDED.variacao_preco,
+                tendencia = EXCLUDED.tendencia,
+                data_hora = EXCLUDED.data_hora
+            RETURNING id_tendencia;
+        """
+        result = await self.execute(
+            query, (id_cripto, periodo, variacao_preco, tendencia), fetch=True
+        )
+        return self.enforce_only(result)
+
+    async def listar_tendencias(
+        self, id_cripto: int, pagina: Optional[Pagina] = None
+    ) -> List[dict]:
+        filtro, args = (pagina or Pagina()).sql(
+            "data_hora", "id_tendencia", ["id_cripto = %s"], [id_cripto]
+        )
+        query = f"""
+            SELECT id_tendencia, data_hora, periodo, variacao_preco, tendencia
+            FROM Tendências_Preço
+            {filtro};
+        """
+        return await self.query_dicts(query, args, preparar=True)
+
+    # --- CRUD for Dados Externos ---
+
+    async def inserir_dado_externo(
+        self, descricao: str, data_hora: datetime.datetime, valor: float
+    ) -> int:
+        query = """
+            INSERT INTO Dados_Externos (descricao, data_hora, valor)
+            VALUES (%s, %s, %s)
+            RETURNING id_dado;
+        """
+        result = await self.execute(query, (descricao, data_hora, valor), fetch=True)
+        return self.enforce_only(result)
+
+    async def listar_dados_externos(
+        self, pagina: Optional[Pagina] = None
+    ) -> List[dict]:
+        filtro, args = (pagina or Pagina()).sql("data_hora", "id_dado")
+        query = f"""
+            SELECT id_dado, descricao, data_hora, valor
+            FROM Dados_Externos
+            {filtro};
+        """
+        return await self.query_dicts(query, args)
+
+    # --- CRUD for Imagens de Criptomoedas ---
+
+    async def inserir_imagem_criptomoeda(
+        self, id_cripto: int, tipo: str, conteudo: bytes, data_upload: datetime.datetime
+    ) -> int:
+        query = """
+            INSERT INTO Imagens_Criptomoedas (id_cripto, tipo, conteudo, data_upload)
+            VALUES (%s, %s, %s, %s)
+            RETURNING id_imagem;
+        """
+        result = await self.execute(
+            query, (id_cripto, tipo, conteudo, data_upload), fetch=True
+        )
+        return self.enforce_only(result)
+
+    async def listar_imagens_criptomoedas(self, id_cripto: int) -> List[dict]:
+        query = """
+            SELECT id_imagem, tipo, data_upload
+            FROM Imagens_Criptomoedas
+            WHERE id_cripto = %s
+            ORDER BY data_upload DESC;
+        """
+        return await self.query_dicts(query, (id_cripto,))
+
+    async def read_logo_criptomoeda(self, id_cripto: int) -> str:
+        query = "SELECT encode(conteudo, 'base64') AS image_base64 FROM Imagens_Criptomoedas WHERE id_cripto=%s AND tipo='logo';"
+        result = await self.query(query, (id_cripto,))
+        if len(result) == 1:
+            return result[0][0]
+        else:
+            return None
+
+    async def ler_logo(
+        self,
+        id_cripto: int,
+        largura: Optional[int] = None,
+        formatos: Sequence[str] = ("png",),
+    ) -> Optional[dict]:
+        """
+        Find the current logo of a criptomoeda and, when ``largura`` is given,
+        its smallest rendition at least that wide, preferring ``formatos`` in
+        order. ``largura``/``formato`` come back as None when the original
+        should be served instead.
+        """
+        query = """
+            SELECT I.id_imagem, V.largura, V.formato
+            FROM (
+                SELECT id_imagem
+                FROM Imagens_Criptomoedas
+                WHERE id_cripto = %s AND tipo = 'logo'
+                ORDER BY id_imagem DESC
+                LIMIT 1
+            ) I
+            LEFT JOIN LATERAL (
+                SELECT largura, formato
+                FROM Imagens_Variantes V
+                WHERE V.id_imagem = I.id_imagem
+                  AND V.largura >= %s
+                  AND V.formato = ANY(%s)
+                ORDER BY V.largura, array_position(%s, V.formato::TEXT)
+                LIMIT 1
+            ) V ON TRUE;
+        """
+        formatos = list(formatos)
+        result = await self.query(query, (id_cripto, largura, formatos, formatos))
+        if len(result) == 1:
+            id_imagem, largura_variante, formato = result[0]
+            return {
+                "id_imagem": id_imagem,
+                "largura": largura_variante,
+                "formato": formato,
+            }
+        else:
+            return None
+
+    async def ler_imagem(self, id_imagem: int) -> Optional[bytes]:
+        query = "SELECT conteudo FROM Imagens_Criptomoedas WHERE id_imagem = %s;"
+        result = await self.query(query, (id_imagem,))
+        if len(result) == 1:
+            return bytes(result[0][0])
+        else:
+            return None
+
+    async def ler_variante(
+        self, id_imagem: int, largura: int, formato: str
+    ) -> Optional[bytes]:
+        query = """
+            SELECT conteudo
+            FROM Imagens_Variantes
+            WHERE id_imagem = %s AND largura = %s AND formato = %s;
+        """
+        result = await self.query(query, (id_imagem, largura, formato))
+        if len(result) == 1:
+            return bytes(result[0][0])
+        else:
+            return None
+
+    async def inserir_variantes_imagem(
+        self, id_imagem: int, variantes: Iterable[Tuple[int, str, bytes]]
+    ) -> int:
+        query = """
+            COPY Imagens_Variantes (id_imagem, largura, formato, conteudo)
+            FROM STDIN;
+        """
+        return await self.copy(
+            query,
+            (
+                (id_imagem, largura, formato, conteudo)
+                for largura, formato, conteudo in variantes
+            ),
+        )
+
+    # --- CRUD for Usuários ---
+
+    async def inserir_usuario(
+        self, nome: str, email: str, senha: str, admin_flag: bool = False
+    ) -> int:
+        query = """
+            INSERT INTO Usuarios (nome, email, senha, admin_flag)
+            VALUES (%s, %s, %s, %s)
+            RETURNING id_usuario;
+        """
+        result = await self.execute(query, (nome, email, senha, admin_flag), fetch=True)
+        self._invalidar("usuarios")
+        return self.enforce_only(result)
+
+    async def listar_usuarios(self) -> List[dict]:
+        cache = self._cache_leitura()
+        if cache is not None:
+            usuarios = cache.get("usuarios")
+            if usuarios is not None:
+                return list(usuarios)
+            geracao = cache.geracao("usuarios")
+        query = (
+            "SELECT id_usuario, nome, email, admin_flag FROM Usuarios ORDER BY nome;"
+        )
+        usuarios = await self.query_dicts(query)
+        if cache is not None:
+            cache.put("usuarios", tuple(usuarios), geracao)
+        return usuarios
+
+    async def atualizar_usuario(
+        self, id_usuario: int, nome: str, email: str, senha: str, admin_flag: bool
+    ):
+        query = """
+            UPDATE Usuarios
+            SET nome = %s, email = %s, senha = %s, admin_flag = %s
+            WHERE id_usuario = %s;
+        """
+        await self.execute(query, (nome, email, senha, admin_flag, id_usuario))
+        self._invalidar("usuarios")
+
+    async def excluir_usuario(self, id_usuario: int):
+        query = "DELETE FROM Usuarios WHERE id_usuario = %s;"
+        await self.execute(query, (id_usuario,))
+        self._invalidar("usuarios")
+
+    @staticmethod
+    async def load(
+        database_url: Optional[str] = None, cache: Optional[TTLCache] = None
+    ) -> "AsyncDatabase":
+        dotenv.load_dotenv()
+        if database_url is None:
+            database_url = os.environ.get("DB_URL")
+        if database_url is None:
+            raise ValueError("Could not load database: DB_URL not found.")
+
+        max_idle = float(os.environ.get("DB_POOL_MAX_IDLE", 60.0))
+
+        # O instante da última devolução fica na própria conexão, e some com
+        # ela quando o pool a descarta.
+        async def check(conn: AsyncConnection):
+            # Only ping connections that sat idle long enough to have been
+            # dropped by the server or a proxy in between.
+            ultimo_uso = getattr(conn, "_crypto_ultimo_uso", 0.0)
+            if time.monotonic() - ultimo_uso >= max_idle:
+                await AsyncConnectionPool.check_connection(conn)
+
+        async def reset(conn: AsyncConnection):
+            conn._crypto_ultimo_uso = time.monotonic()
+
+        pool = AsyncConnectionPool(
+            database_url,
+            min_size=int(os.environ.get("DB_POOL_MIN", 1)),
+            max_size=int(os.environ.get("DB_POOL_MAX", 10)),
+            timeout=float(os.environ.get("DB_POOL_TIMEOUT", 30.0)),
+            check=check,
+            reset=reset,
+            open=False,
+        )
+        await pool.open()
+        return AsyncDatabase(
+            pool,
+            cache=cache,
+            preparar=os.environ.get("DB_PREPARED_STATEMENTS", "1") != "0",
+            arquivo=Arquivo(os.environ.get("ARQUIVO_DIR", "arquivo")),
+        )
@@ -0,0 +1,118 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class LRUCache:
+    """
+    Least-recently-used cache of byte strings bounded by their total size.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._itens: "OrderedDict[Hashable, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, chave: Hashable) -> Optional[bytes]:
+        with self._lock:
+            valor = self._itens.get(chave)
+            if valor is None:
+                self.misses += 1
+                return None
+            self._itens.move_to_end(chave)
+            self.hits += 1
+            return valor
+
+    def put(self, chave: Hashable, valor: bytes):
+        if len(valor) > self.max_bytes:
+            return
+        with self._lock:
+            anterior = self._itens.pop(chave, None)
+            if anterior is not None:
+                self._bytes -= len(anterior)
+            self._itens[chave] = valor
+            self._bytes += len(valor)
+            while self._bytes > self.max_bytes:
+                _, removido = self._itens.popitem(last=False)
+                self._bytes -= len(removido)
+
+    def descartar(self, condicao: Callable[[Hashable], bool]):
+        with self._lock:
+            for chave in [chave for chave in self._itens if condicao(chave)]:
+                self._bytes -= len(self._itens.pop(chave))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "itens": len(self._itens),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+class TTLCache:
+    """
+    Small cache of whole query results that expire after ``ttl`` seconds or
+    when explicitly invalidated.
+
+    Every invalidation bumps a per-key generation. A reader takes the
+    generation before running its query and hands it back to ``put``, which
+    discards the result if a write invalidated the key in the meantime.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._itens: Dict[Hashable, Tuple[float, Any]] = {}
+        self._geracoes: Dict[Hashable, int] = {}
+        self._geral = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidacoes = 0
+
+    def get(self, chave: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None or item[0] <= time.monotonic():
+                self.misses += 1
+                return None
+            self.hits += 1
+            return item[1]
+
+    def geracao(self, chave: Hashable) -> int:
+        with self._lock:
+            return self._geral + self._geracoes.get(chave, 0)
+
+    def put(self, chave: Hashable, valor: Any, geracao: int):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            if self._geral + self._geracoes.get(chave, 0) == geracao:
+                self._itens[chave] = (time.monotonic() + self.ttl, valor)
+
+    def invalidar(self, chave: Optional[Hashable] = None):
+        """Drop ``chave``, or every key when it is None."""
+        with self._lock:
+            if chave is None:
+                self._itens.clear()
+                self._geral += 1
+            else:
+                self._itens.pop(chave, None)
+                self._geracoes[chave] = self._geracoes.get(chave, 0) + 1
+            self.invalidacoes += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "itens": len(self._itens),
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidacoes": self.invalidacoes,
+            }
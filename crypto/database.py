@@ -1,35 +1,220 @@
 import psycopg2
+import csv
 import datetime
 import dotenv
+import io
 import os
-from typing import List, Tuple, Union
+import re
+import uuid
+import weakref
+from contextlib import contextmanager
+from decimal import Decimal
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from .arquivo import Arquivo, alcance
+from .cache import TTLCache
+from .metricas import medir_consulta, operacao_chamadora
+from .paginacao import Pagina, decode_rank_cursor
+
+# Comandos preparados de cada conexão, SQL -> nome no servidor. Ficam com a
+# conexão e não com o Database; uma conexão nova (uma reconexão) começa sem
+# nenhum.
+_PREPARADOS: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+# Tabelas particionadas por mês de data_hora (migração 0011).
+TABELAS_PARTICIONADAS = ("Cotações", "Transações_Mercado")
+
+
+def _numerar_parametros(query: str) -> str:
+    """Turn the ``%s`` placeholders into the ``$1, $2...`` PREPARE expects."""
+    partes = re.split(r"(%%|%s)", query)
+    numero = 0
+    for i, parte in enumerate(partes):
+        if parte == "%s":
+            numero += 1
+            partes[i] = f"${numero}"
+        elif parte == "%%":
+            partes[i] = "%"
+    return "".join(partes)
 
 
 class Database:
-    def __init__(self, database_url: str):
+    def __init__(
+        self,
+        database_url: str,
+        cache: Optional[TTLCache] = None,
+        preparar: bool = True,
+        arquivo: Optional[Arquivo] = None,
+    ):
+        # Cache opcional de listar_criptomoedas e listar_usuarios.
+        self.cache = cache
+        # Desligue atrás de um PgBouncer em modo transaction, que troca a
+        # sessão (e os comandos preparados) entre transações.
+        self.preparar = preparar
+        # Meses de cotações já movidos para arquivos Parquet.
+        self.arquivo = arquivo
         self.conn = psycopg2.connect(database_url)
+        # Dentro de transacao() nada é confirmado nem desfeito comando a comando.
+        self._em_transacao = False
 
-    def query(self, query: str, args: Tuple = ()) -> List[tuple]:
-        with self.conn.cursor() as cursor:
+    @contextmanager
+    def transacao(self) -> Iterator["Database"]:
+        """
+        Unit of work: every call inside the block runs in one transaction,
+        committed when the block ends or rolled back if it raises. Nested
+        blocks join the outer one.
+        """
+        if self._em_transacao:
+            yield self
+            return
+        self._em_transacao = True
+        try:
+            yield self
+            self.conn.commit()
+        except BaseException:
+            self.conn.rollback()
+            raise
+        finally:
+            self._em_transacao = False
+
+    def _confirmar(self):
+        if not self._em_transacao:
+            self.conn.commit()
+
+    def _desfazer(self):
+        # Numa transacao() o erro sobe até o bloco, que desfaz tudo de uma vez.
+        if not self._em_transacao:
+            self.conn.rollback()
+
+    def _executar(self, cursor, query: str, args: Tuple, preparar: bool):
+        """
+        Run ``query`` on ``cursor``. With ``preparar`` it goes through a
+        server-side prepared statement, created on first use on this
+        connection, so Postgres parses and plans it only once.
+        """
+        if not (preparar and self.preparar):
+            cursor.execute(query, args)
+            return
+        preparados = _PREPARADOS.setdefault(self.conn, {})
+        nome = preparados.get(query)
+        if nome is None:
+            nome = f"crypto_{len(preparados)}"
+            cursor.execute(f"PREPARE {nome} AS {_numerar_parametros(query)}")
+            preparados[query] = nome
+        parametros = f" ({', '.join(['%s'] * len(args))})" if args else ""
+        try:
+            cursor.execute(f"EXECUTE {nome}{parametros};", args)
+        except psycopg2.errors.InvalidSqlStatementName:
+            # Sessão reiniciada no servidor (DISCARD ALL): prepara tudo de novo.
+            preparados.clear()
+            if self._em_transacao:
+                raise
+            self.conn.rollback()
+            self._executar(cursor, query, args, preparar)
+
+    def query(
+        self, query: str, args: Tuple = (), preparar: bool = False
+    ) -> List[tuple]:
+        operacao = operacao_chamadora()
+        with self.conn.cursor() as cursor, medir_consulta(
+            operacao, query, args
+        ) as medicao:
             try:
-                cursor.execute(query, args)
+                self._executar(cursor, query, args, preparar)
                 result = cursor.fetchall()
+                medicao.linhas = len(result)
                 return result
             except Exception as e:
-                self.conn.rollback()
+                self._desfazer()
+                raise e
+
+    def query_dicts(
+        self, query: str, args: Tuple = (), preparar: bool = False
+    ) -> List[dict]:
+        """``query`` with each row as a dict keyed by column name."""
+        operacao = operacao_chamadora()
+        with self.conn.cursor() as cursor, medir_consulta(
+            operacao, query, args
+        ) as medicao:
+            try:
+                self._executar(cursor, query, args, preparar)
+                colunas = [column.name for column in cursor.description]
+                result = [dict(zip(colunas, row)) for row in cursor.fetchall()]
+                medicao.linhas = len(result)
+                return result
+            except Exception as e:
+                self._desfazer()
                 raise e
 
     def execute(
-        self, query: str, args: Tuple = (), fetch: bool = False
+        self, query: str, args: Tuple = (), fetch: bool = False, preparar: bool = False
     ) -> Union[List[tuple], None]:
-        with self.conn.cursor() as cursor:
+        operacao = operacao_chamadora()
+        with self.conn.cursor() as cursor, medir_consulta(
+            operacao, query, args
+        ) as medicao:
             try:
-                cursor.execute(query, args)
-                self.conn.commit()
+                self._executar(cursor, query, args, preparar)
+                medicao.linhas = max(cursor.rowcount, 0)
+                self._confirmar()
                 if fetch:
                     return cursor.fetchall()
             except Exception as e:
-                self.conn.rollback()
+                self._desfazer()
+                raise e
+
+    def copy(self, query: str, rows: Iterable[tuple]) -> int:
+        """
+        Stream rows into a ``COPY ... FROM STDIN WITH (FORMAT csv)`` statement.
+        Outside of transacao() they are committed together. Returns the number
+        of rows.
+        """
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(
+            # bytea entra no CSV no formato hexadecimal do Postgres.
+            tuple("\\x" + v.hex() if isinstance(v, bytes) else v for v in row)
+            for row in rows
+        )
+        buffer.seek(0)
+        operacao = operacao_chamadora()
+        with self.conn.cursor() as cursor, medir_consulta(operacao, query) as medicao:
+            try:
+                cursor.copy_expert(query, buffer)
+                self._confirmar()
+                medicao.linhas = cursor.rowcount
+                return cursor.rowcount
+            except Exception as e:
+                self._desfazer()
+                raise e
+
+    def stream(
+        self, query: str, args: Tuple = (), lote: int = 1000
+    ) -> Iterator[List[dict]]:
+        """
+        Run a query through a named (server-side) cursor and yield its rows
+        ``lote`` at a time, so the result is never fully materialized.
+        """
+        # Not a generator itself, so the caller is known before iterating.
+        return self._stream(operacao_chamadora(), query, args, lote)
+
+    def _stream(
+        self, operacao: str, query: str, args: Tuple, lote: int
+    ) -> Iterator[List[dict]]:
+        with medir_consulta(operacao, query, args) as medicao:
+            try:
+                with self.conn.cursor(name=f"stream_{uuid.uuid4().hex}") as cursor:
+                    cursor.itersize = lote
+                    cursor.execute(query, args)
+                    while True:
+                        rows = cursor.fetchmany(lote)
+                        if not rows:
+                            break
+                        medicao.linhas += len(rows)
+                        colunas = [column.name for column in cursor.description]
+                        yield [dict(zip(colunas, row)) for row in rows]
+                self._confirmar()
+            except Exception as e:
+                self._desfazer()
                 raise e
 
     def enforce_only(self, value: List[tuple]):
@@ -40,6 +225,14 @@ class Database:
     def close(self):
         if self.conn:
             self.conn.close()
+            self.conn = None
+
+    def _cache_leitura(self) -> Optional[TTLCache]:
+        return self.cache
+
+    def _invalidar(self, chave: str):
+        if self.cache is not None:
+            self.cache.invalidar(chave)
 
     # --- CRUD Notícias and Sentimentos ---
 
@@ -57,7 +250,10 @@ class Database:
             RETURNING id_noticia;
         """
         result = self.execute(
-            query, (id_cripto, data_publicacao, tema, noticia, fonte), fetch=True
+            query,
+            (id_cripto, data_publicacao, tema, noticia, fonte),
+            fetch=True,
+            preparar=True,
         )
         return self.enforce_only(result)
 
@@ -88,7 +284,10 @@ class Database:
             RETURNING id_sentimento;
         """
         result = self.execute(
-            query, (id_noticia, id_usuario, sentimento, score_sentimento), fetch=True
+            query,
+            (id_noticia, id_usuario, sentimento, score_sentimento),
+            fetch=True,
+            preparar=True,
         )
         return self.enforce_only(result)
 
@@ -106,32 +305,7 @@ class Database:
             JOIN Usuarios U ON S.id_usuario = U.id_usuario
             WHERE N.id_cripto = %s;
         """
-        result = self.query(query, (id_cripto,))
-        noticias = []
-        for row in result:
-            (
-                id_noticia,
-                data_publicacao,
-                tema,
-                noticia,
-                fonte,
-                usuario,
-                sentimento,
-                score,
-            ) = row
-            noticias.append(
-                {
-                    "id_noticia": id_noticia,
-                    "data_publicacao": data_publicacao,
-                    "tema": tema,
-                    "noticia": noticia,
-                    "fonte": fonte,
-                    "usuario": usuario,
-                    "sentimento": sentimento,
-                    "score_sentimento": score,
-                }
-            )
-        return noticias
+        return self.query_dicts(query, (id_cripto,), preparar=True)
 
     def atualizar_sentimento(
         self,
@@ -148,44 +322,148 @@ class Database:
         self.execute(query, (id_usuario, novo_sentimento, novo_score, id_sentimento))
 
     def excluir_noticia(self, id_noticia: int):
-        # Excluir sentimentos relacionados
-        query_sentimentos = "DELETE FROM Sentimentos_Notícias WHERE id_noticia = %s;"
-        self.execute(query_sentimentos, (id_noticia,))
-        # Excluir notícia
-        query_noticia = "DELETE FROM Notícias WHERE id_noticia = %s;"
-        self.execute(query_noticia, (id_noticia,))
+        with self.transacao() as tx:
+            # Excluir sentimentos relacionados
+            query_sentimentos = (
+                "DELETE FROM Sentimentos_Notícias WHERE id_noticia = %s;"
+            )
+            tx.execute(query_sentimentos, (id_noticia,))
+            # Excluir notícia
+            query_noticia = "DELETE FROM Notícias WHERE id_noticia = %s;"
+            tx.execute(query_noticia, (id_noticia,))
 
-    def listar_noticias(self) -> List[dict]:
+    def listar_noticias(self, pagina: Optional[Pagina] = None) -> List[dict]:
         """
         List all news records with an aggregation of the sentiments.
         Returns a list of dictionaries with the news details,
         an array of associated sentiments, and the average sentiment score.
         """
-        query = "SELECT * FROM Todas_Notícias ORDER BY data_publicacao DESC;"
-        result = self.query(query)
-        noticias = []
-        for row in result:
-            (
-                id_noticia,
-                id_cripto,
-                data_publicacao,
-                tema,
-                noticia,
-                fonte,
-                score_medio,
-            ) = row
-            noticias.append(
-                {
-                    "id_noticia": id_noticia,
-                    "id_cripto": id_cripto,
-                    "data_publicacao": data_publicacao,
-                    "tema": tema,
-                    "noticia": noticia,
-                    "fonte": fonte,
-                    "score_medio": score_medio,
-                }
+        filtro, args = (pagina or Pagina()).sql("data_publicacao", "id_noticia")
+        query = f"SELECT * FROM Todas_Notícias {filtro};"
+        return self.query_dicts(query, args, preparar=True)
+
+    def buscar_noticias(
+        self,
+        termos: str,
+        id_cripto: Optional[int] = None,
+        limite: int = 20,
+        cursor: Optional[str] = None,
+        candidatos: int = 1000,
+    ) -> List[dict]:
+        """
+        Full-text search over tema and noticia, best matches first. ``termos``
+        accepts the web search syntax ("frases", OR, -exclusão). Snippets are
+        only built for the rows of the page.
+
+        Only the ``candidatos`` most recent matches are ranked, read through
+        the data_publicacao index, so the cost of a page does not grow with
+        the number of matches; older matches of a broad search are left out.
+        """
+        condicoes, args = ["N.busca @@ C.q"], [termos]
+        if id_cripto is not None:
+            condicoes.append("N.id_cripto = %s")
+            args.append(id_cripto)
+        args.append(candidatos)
+        posicao = ""
+        if cursor is not None:
+            posicao = "WHERE (R.rank, R.id_noticia) < (%s::REAL, %s)"
+            args.extend(decode_rank_cursor(cursor))
+        args.append(limite)
+        query = f"""
+            WITH C AS (SELECT websearch_to_tsquery('portuguese', %s) AS q)
+            SELECT R.id_noticia, R.id_cripto, R.data_publicacao, R.tema, R.fonte, R.rank,
+                   ts_headline('portuguese', R.noticia, C.q, 'MaxFragments=2, MaxWords=30, MinWords=10') AS trecho
+            FROM (
+                SELECT N.id_noticia, N.id_cripto, N.data_publicacao, N.tema, N.fonte,
+                       N.noticia, ts_rank(N.busca, C.q) AS rank
+                FROM (
+                    SELECT N.*
+                    FROM Notícias N, C
+                    WHERE {" AND ".join(condicoes)}
+                    ORDER BY N.data_publicacao DESC, N.id_noticia DESC
+                    LIMIT %s
+                ) N, C
+            ) R, C
+            {posicao}
+            ORDER BY R.rank DESC, R.id_noticia DESC
+            LIMIT %s;
+        """
+        return self.query_dicts(query, tuple(args))
+
+    def verificar_sentimentos_agregados(self) -> List[dict]:
+        """
+        Compare Sentimentos_Agregados with a fresh aggregation of
+        Sentimentos_Notícias and return the news items that disagree.
+        """
+        query = """
+            WITH Real AS (
+                SELECT id_noticia, COUNT(score_sentimento) AS quantidade,
+                       COALESCE(SUM(score_sentimento), 0) AS soma_score
+                FROM Sentimentos_Notícias
+                WHERE id_noticia IS NOT NULL
+                GROUP BY id_noticia
+            )
+            SELECT COALESCE(R.id_noticia, A.id_noticia) AS id_noticia,
+                   COALESCE(R.quantidade, 0) AS quantidade,
+                   COALESCE(R.soma_score, 0) AS soma_score,
+                   COALESCE(A.quantidade, 0) AS quantidade_agregada,
+                   COALESCE(A.soma_score, 0) AS soma_agregada
+            FROM Real R
+            FULL JOIN Sentimentos_Agregados A ON R.id_noticia = A.id_noticia
+            WHERE COALESCE(R.quantidade, 0) <> COALESCE(A.quantidade, 0)
+               OR COALESCE(R.soma_score, 0) <> COALESCE(A.soma_score, 0);
+        """
+        return self.query_dicts(query)
+
+    def reconstruir_sentimentos_agregados(self):
+        self.execute("CALL reconstruir_sentimentos_agregados();")
+
+    def ler_limiares_sentimento(self) -> dict:
+        query = "SELECT positivo, negativo FROM Sentimentos_Limiares;"
+        positivo, negativo = self.query(query)[0]
+        return {"positivo": positivo, "negativo": negativo}
+
+    def definir_limiares_sentimento(self, positivo: float, negativo: float):
+        """
+        Change the classification thresholds. Rows already written keep their
+        class until ``reclassificar_sentimentos`` runs.
+        """
+        query = "UPDATE Sentimentos_Limiares SET positivo = %s, negativo = %s;"
+        self.execute(query, (positivo, negativo))
+
+    def reclassificar_sentimentos(self, lote: int = 5000) -> int:
+        """
+        Fix the sentimento of rows whose class disagrees with the current
+        thresholds, committing every ``lote`` rows. Rows already right are not
+        rewritten. Returns the number of rows changed.
+        """
+        query = """
+            WITH Lote AS (
+                SELECT S.id_sentimento
+                FROM Sentimentos_Notícias S
+                CROSS JOIN Sentimentos_Limiares L
+                WHERE S.id_sentimento > %s
+                  AND S.sentimento IS DISTINCT FROM
+                      classificar_sentimento(S.score_sentimento, L.positivo, L.negativo)
+                ORDER BY S.id_sentimento
+                LIMIT %s
+            ), Atualizadas AS (
+                UPDATE Sentimentos_Notícias S
+                SET sentimento = NULL
+                FROM Lote
+                WHERE S.id_sentimento = Lote.id_sentimento
+                RETURNING S.id_sentimento
             )
-        return noticias
+            SELECT COUNT(*), MAX(id_sentimento) FROM Atualizadas;
+        """
+        ultimo, total = 0, 0
+        while True:
+            result = self.execute(query, (ultimo, lote), fetch=True)
+            quantidade, proximo = result[0]
+            if proximo is None:
+                return total
+            total += quantidade
+            ultimo = proximo
 
     def listar_sentimentos_por_noticia(self, id_noticia: int) -> List[dict]:
         """
@@ -197,20 +475,7 @@ class Database:
             JOIN Usuarios U ON S.id_usuario = U.id_usuario
             WHERE S.id_noticia = %s;
         """
-        result = self.query(query, (id_noticia,))
-        sentimentos = []
-        for row in result:
-            id_sentimento, id_usuario, usuario, sentimento, score_sentimento = row
-            sentimentos.append(
-                {
-                    "id_sentimento": id_sentimento,
-                    "id_usuario": id_usuario,
-                    "usuario": usuario,
-                    "sentimento": sentimento,
-                    "score_sentimento": score_sentimento,
-                }
-            )
-        return sentimentos
+        return self.query_dicts(query, (id_noticia,), preparar=True)
 
     # --- CRUD for Criptomoedas ---
 
@@ -223,23 +488,20 @@ class Database:
             RETURNING id_cripto;
         """
         result = self.execute(query, (nome, simbolo, descricao, mercado), fetch=True)
+        self._invalidar("criptomoedas")
         return self.enforce_only(result)
 
     def listar_criptomoedas(self) -> List[dict]:
+        cache = self._cache_leitura()
+        if cache is not None:
+            cryptos = cache.get("criptomoedas")
+            if cryptos is not None:
+                return list(cryptos)
+            geracao = cache.geracao("criptomoedas")
         query = "SELECT id_cripto, nome, simbolo, descricao, mercado FROM Criptomoedas ORDER BY nome;"
-        result = self.query(query)
-        cryptos = []
-        for row in result:
-            id_cripto, nome, simbolo, descricao, mercado = row
-            cryptos.append(
-                {
-                    "id_cripto": id_cripto,
-                    "nome": nome,
-                    "simbolo": simbolo,
-                    "descricao": descricao,
-                    "mercado": mercado,
-                }
-            )
+        cryptos = self.query_dicts(query)
+        if cache is not None:
+            cache.put("criptomoedas", tuple(cryptos), geracao)
         return cryptos
 
     def atualizar_criptomoeda(
@@ -251,10 +513,12 @@ class Database:
             WHERE id_cripto = %s;
         """
         self.execute(query, (nome, simbolo, descricao, mercado, id_cripto))
+        self._invalidar("criptomoedas")
 
     def excluir_criptomoeda(self, id_cripto: int):
         query = "DELETE FROM Criptomoedas WHERE id_cripto = %s;"
         self.execute(query, (id_cripto,))
+        self._invalidar("criptomoedas")
 
     # --- CRUD for Cotações ---
 
@@ -276,31 +540,254 @@ class Database:
             query,
             (id_cripto, data_hora, preco, volume, market_cap, variacao),
             fetch=True,
+            preparar=True,
         )
         return self.enforce_only(result)
 
-    def listar_cotacoes(self, id_cripto: int) -> List[dict]:
+    def inserir_cotacoes(self, cotacoes: Iterable[tuple]) -> int:
+        """
+        Bulk version of ``inserir_cotacao``. Each tuple follows its argument
+        order: (id_cripto, data_hora, preco, volume, market_cap, variacao).
+        """
+        query = """
+            COPY Cotações (id_cripto, data_hora, preco, volume, market_cap, variacao)
+            FROM STDIN WITH (FORMAT csv);
+        """
+        return self.copy(query, cotacoes)
+
+    def listar_cotacoes(
+        self, id_cripto: int, pagina: Optional[Pagina] = None
+    ) -> List[dict]:
+        filtro, args = (pagina or Pagina()).sql(
+            "data_hora", "id_cotacao", ["id_cripto = %s"], [id_cripto]
+        )
+        query = f"""
+            SELECT id_cotacao, data_hora, preco, volume, market_cap, variacao
+            FROM Cotações
+            {filtro};
+        """
+        cotacoes = self.query_dicts(query, args, preparar=True)
+        if self.arquivo is None:
+            return cotacoes
+        pagina = pagina or Pagina()
+        meses = self.meses_arquivados(id_cripto, *alcance(pagina, cotacoes))
+        if not Arquivo.meses_da_pagina(meses, pagina, cotacoes):
+            return cotacoes
+        return self.arquivo.completar(cotacoes, meses, pagina)
+
+    def exportar_cotacoes(
+        self, id_cripto: int, pagina: Optional[Pagina] = None
+    ) -> Iterator[List[dict]]:
+        """
+        Streaming version of ``listar_cotacoes`` for exports of the full history.
+        """
+        filtro, args = (pagina or Pagina()).sql(
+            "data_hora", "id_cotacao", ["id_cripto = %s"], [id_cripto]
+        )
+        query = f"""
+            SELECT id_cotacao, data_hora, preco, volume, market_cap, variacao
+            FROM Cotações
+            {filtro};
+        """
+        lotes = self.stream(query, args)
+        if self.arquivo is None:
+            return lotes
+        pagina = pagina or Pagina()
+        meses = self.meses_arquivados(id_cripto, *alcance(pagina))
+        return self.arquivo.completar_exportacao(lotes, meses, pagina)
+
+    def meses_arquivados(
+        self,
+        id_cripto: int,
+        inicio: Optional[datetime.datetime] = None,
+        teto: Optional[datetime.datetime] = None,
+    ) -> List[tuple]:
+        """
+        (mes, caminho) of the months of ``id_cripto`` in the archive, oldest
+        first. Without a cache only the months overlapping [inicio, teto] are
+        read, through the primary key; with one the whole index is cached and
+        the caller narrows it with ``Arquivo.meses_da_pagina``.
+        """
+        cache = self._cache_leitura()
+        if cache is None:
+            condicoes, args = ["id_cripto = %s"], [id_cripto]
+            if inicio is not None:
+                condicoes.append("mes > %s::TIMESTAMP - INTERVAL '1 month'")
+                args.append(inicio)
+            if teto is not None:
+                condicoes.append("mes <= %s")
+                args.append(teto)
+            query = f"""
+                SELECT mes, caminho
+                FROM Cotações_Arquivadas
+                WHERE {" AND ".join(condicoes)}
+                ORDER BY mes;
+            """
+            return [tuple(row) for row in self.query(query, tuple(args))]
+        meses = cache.get("cotações_arquivadas")
+        if meses is not None:
+            return meses.get(id_cripto, [])
+        geracao = cache.geracao("cotações_arquivadas")
+        query = "SELECT id_cripto, mes, caminho FROM Cotações_Arquivadas ORDER BY mes;"
+        meses = {}
+        for id_arquivado, mes, caminho in self.query(query):
+            meses.setdefault(id_arquivado, []).append((mes, caminho))
+        cache.put("cotações_arquivadas", meses, geracao)
+        return meses.get(id_cripto, [])
+
+    def meses_para_arquivar(self, antes: datetime.date) -> List[tuple]:
+        """(id_cripto, mes) of the months with cotações that end by ``antes``."""
+        query = """
+            SELECT DISTINCT id_cripto, date_trunc('month', data_hora)::DATE AS mes
+            FROM Cotações
+            WHERE data_hora < date_trunc('month', %s::TIMESTAMP)
+              AND id_cripto IS NOT NULL
+            ORDER BY mes, id_cripto;
+        """
+        return self.query(query, (antes,))
+
+    def ler_cotacoes_mes(
+        self, id_cripto: int, mes: datetime.date
+    ) -> Iterator[List[dict]]:
         query = """
             SELECT id_cotacao, data_hora, preco, volume, market_cap, variacao
             FROM Cotações
             WHERE id_cripto = %s
-            ORDER BY data_hora DESC;
+              AND data_hora >= %s::DATE AND data_hora < %s::DATE + INTERVAL '1 month';
         """
-        result = self.query(query, (id_cripto,))
-        cotacoes = []
-        for row in result:
-            id_cotacao, data_hora, preco, volume, market_cap, variacao = row
-            cotacoes.append(
-                {
-                    "id_cotacao": id_cotacao,
-                    "data_hora": data_hora,
-                    "preco": preco,
-                    "volume": volume,
-                    "market_cap": market_cap,
-                    "variacao": variacao,
-                }
+        return self.stream(query, (id_cripto, mes, mes))
+
+    def remover_cotacoes_arquivadas(
+        self, id_cripto: int, mes: datetime.date, ids: List[int]
+    ):
+        query = """
+            DELETE FROM Cotações
+            WHERE id_cripto = %s
+              AND data_hora >= %s::DATE AND data_hora < %s::DATE + INTERVAL '1 month'
+              AND id_cotacao = ANY(%s);
+        """
+        self.execute(query, (id_cripto, mes, mes, ids))
+
+    def registrar_arquivo(
+        self, id_cripto: int, mes: datetime.date, caminho: str, linhas: int
+    ):
+        query = """
+            INSERT INTO Cotações_Arquivadas (id_cripto, mes, caminho, linhas)
+            VALUES (%s, %s, %s, %s)
+            ON CONFLICT (id_cripto, mes) DO UPDATE SET
+                caminho = EXCLUDED.caminho,
+                linhas = EXCLUDED.linhas,
+                arquivada_em = CURRENT_TIMESTAMP;
+        """
+        self.execute(query, (id_cripto, mes, caminho, linhas))
+        self._invalidar("cotações_arquivadas")
+
+    def listar_candles(
+        self,
+        id_cripto: int,
+        intervalo: str,
+        inicio: Optional[datetime.datetime] = None,
+        fim: Optional[datetime.datetime] = None,
+        limite: int = 1000,
+    ) -> List[dict]:
+        """
+        List the precomputed OHLCV candles of a criptomoeda in chronological
+        order. Without ``inicio`` the most recent ``limite`` candles are returned.
+        """
+        condicoes, args = ["id_cripto = %s", "intervalo = %s"], [id_cripto, intervalo]
+        if inicio is not None:
+            condicoes.append("inicio >= %s")
+            args.append(inicio)
+        if fim is not None:
+            condicoes.append("inicio < %s")
+            args.append(fim)
+        ordem = "ASC" if inicio is not None else "DESC"
+        query = f"""
+            SELECT inicio, abertura, maxima, minima, fechamento, volume, quantidade_cotacoes
+            FROM Candles
+            WHERE {" AND ".join(condicoes)}
+            ORDER BY inicio {ordem}
+            LIMIT %s;
+        """
+        candles = self.query_dicts(query, (*args, limite), preparar=True)
+        if ordem == "DESC":
+            candles.reverse()
+        return candles
+
+    def retirar_tendencias_pendentes(self, limite: int) -> List[int]:
+        """
+        Remove up to ``limite`` criptomoedas from Tendencias_Pendentes and
+        return them. Rows queued by transactions still open are left for a
+        later run, so no quote is missed whatever order they commit in.
+        """
+        query = """
+            DELETE FROM Tendencias_Pendentes
+            WHERE id_cripto IN (
+                SELECT DISTINCT id_cripto FROM Tendencias_Pendentes
+                ORDER BY id_cripto
+                LIMIT %s
+            )
+            RETURNING id_cripto;
+        """
+        retiradas = self.execute(query, (limite,), fetch=True)
+        return sorted({row[0] for row in retiradas})
+
+    def enfileirar_tendencias(self):
+        """Queue every criptomoeda, so the next run recomputes all trends."""
+        self.execute(
+            "INSERT INTO Tendencias_Pendentes (id_cripto) "
+            "SELECT id_cripto FROM Criptomoedas;"
+        )
+
+    def series_cotacoes(
+        self, ids: List[int], janela: datetime.timedelta
+    ) -> List[tuple]:
+        """
+        The last ``janela`` of quotes of each criptomoeda, plus the last quote
+        before it, as (id_cripto, epoch seconds, preco) rows ordered by
+        criptomoeda and time. The earlier quote tells whether the series
+        covers the whole window.
+        """
+        query = """
+            SELECT C.id_cripto, EXTRACT(EPOCH FROM C.data_hora)::BIGINT, C.preco::FLOAT8
+            FROM unnest(%s::INT[]) AS U (id_cripto)
+            CROSS JOIN LATERAL (
+                SELECT MAX(data_hora) AS ultima FROM Cotações WHERE id_cripto = U.id_cripto
+            ) M
+            CROSS JOIN LATERAL (
+                SELECT MAX(data_hora) AS anterior
+                FROM Cotações
+                WHERE id_cripto = U.id_cripto AND data_hora <= M.ultima - %s
+            ) A
+            JOIN Cotações C ON C.id_cripto = U.id_cripto
+                AND C.data_hora >= COALESCE(A.anterior, M.ultima - %s)
+            ORDER BY C.id_cripto, C.data_hora, C.id_cotacao;
+        """
+        return self.query(query, (list(ids), janela, janela))
+
+    def salvar_tendencias(self, tendencias: Sequence[tuple]) -> int:
+        """
+        Upsert (id_cripto, periodo, variacao_preco, tendencia) rows into
+        Tendências_Preço and record the engine run in one statement.
+        """
+        colunas = list(zip(*tendencias)) or [(), (), (), ()]
+        query = """
+            WITH Salvas AS (
+                INSERT INTO Tendências_Preço (id_cripto, periodo, variacao_preco, tendencia)
+                SELECT * FROM unnest(%s::INT[], %s::VARCHAR[], %s::DECIMAL[], %s::VARCHAR[])
+                ON CONFLICT (id_cripto, periodo) DO UPDATE SET
+                    variacao_preco = EXCLUDED.variacao_preco,
+                    tendencia = EXCLUDED.tendencia,
+                    data_hora = EXCLUDED.data_hora
+                RETURNING 1
+            ), Progresso AS (
+                UPDATE Tendencias_Progresso
+                SET executada_em = CURRENT_TIMESTAMP
             )
-        return cotacoes
+            SELECT COUNT(*) FROM Salvas;
+        """
+        args = tuple(list(coluna) for coluna in colunas)
+        return self.enforce_only(self.execute(query, args, fetch=True))
 
     # --- CRUD for Transações de Mercado ---
 
@@ -318,31 +805,287 @@ class Database:
             RETURNING id_transacao;
         """
         result = self.execute(
-            query, (id_cripto, data_hora, tipo, quantidade, preco_unitario), fetch=True
+            query,
+            (id_cripto, data_hora, tipo, quantidade, preco_unitario),
+            fetch=True,
+            preparar=True,
         )
         return self.enforce_only(result)
 
-    def listar_transacoes(self, id_cripto: int) -> List[dict]:
+    def inserir_transacoes(self, transacoes: Iterable[tuple]) -> int:
+        """
+        Bulk version of ``inserir_transacao``. Each tuple follows its argument
+        order: (id_cripto, data_hora, tipo, quantidade, preco_unitario).
+        """
         query = """
+            COPY Transações_Mercado (id_cripto, data_hora, tipo, quantidade, preco_unitario)
+            FROM STDIN WITH (FORMAT csv);
+        """
+        return self.copy(query, transacoes)
+
+    def listar_transacoes(
+        self, id_cripto: int, pagina: Optional[Pagina] = None
+    ) -> List[dict]:
+        filtro, args = (pagina or Pagina()).sql(
+            "data_hora", "id_transacao", ["id_cripto = %s"], [id_cripto]
+        )
+        query = f"""
             SELECT id_transacao, data_hora, tipo, quantidade, preco_unitario
             FROM Transações_Mercado
-            WHERE id_cripto = %s
-            ORDER BY data_hora DESC;
+            {filtro};
         """
-        result = self.query(query, (id_cripto,))
-        transacoes = []
-        for row in result:
-            id_transacao, data_hora, tipo, quantidade, preco_unitario = row
-            transacoes.append(
-                {
-                    "id_transacao": id_transacao,
-                    "data_hora": data_hora,
-                    "tipo": tipo,
-                    "quantidade": quantidade,
-                    "preco_unitario": preco_unitario,
-                }
+        return self.query_dicts(query, args, preparar=True)
+
+    def exportar_transacoes(
+        self, id_cripto: int, pagina: Optional[Pagina] = None
+    ) -> Iterator[List[dict]]:
+        """
+        Streaming version of ``listar_transacoes`` for exports of the full history.
+        """
+        filtro, args = (pagina or Pagina()).sql(
+            "data_hora", "id_transacao", ["id_cripto = %s"], [id_cripto]
+        )
+        query = f"""
+            SELECT id_transacao, data_hora, tipo, quantidade, preco_unitario
+            FROM Transações_Mercado
+            {filtro};
+        """
+        return self.stream(query, args)
+
+    # --- Partições de Cotações e Transações de Mercado ---
+
+    def criar_particoes(self, meses: int = 3) -> List[str]:
+        """
+        Create the monthly partitions of the current month and of the next
+        ``meses`` ones that are missing. Rows of those months already in the
+        default partition move to the new ones. Returns the created names.
+        """
+        query = """
+            SELECT P.nome
+            FROM unnest(%s::TEXT[]) AS T (tabela)
+            CROSS JOIN generate_series(
+                date_trunc('month', LOCALTIMESTAMP),
+                date_trunc('month', LOCALTIMESTAMP) + %s * INTERVAL '1 month',
+                INTERVAL '1 month'
+            ) AS M (mes)
+            CROSS JOIN LATERAL criar_particao_mensal(T.tabela::REGCLASS, M.mes::DATE) AS P (nome)
+            WHERE P.nome IS NOT NULL;
+        """
+        result = self.execute(query, (list(TABELAS_PARTICIONADAS), meses), fetch=True)
+        return [nome for (nome,) in result]
+
+    def remover_particoes(self, retencao: int, desanexar: bool = False) -> List[str]:
+        """
+        Drop the monthly partitions that ended before the last ``retencao``
+        months, counting the current one. With ``desanexar`` they are only
+        detached and stay as standalone tables. Returns their names.
+        """
+        if retencao < 1:
+            raise ValueError("Retention must keep at least the current month.")
+        query = """
+            SELECT P.nome
+            FROM unnest(%s::TEXT[]) AS T (tabela)
+            CROSS JOIN LATERAL remover_particoes_antigas(
+                T.tabela::REGCLASS,
+                date_trunc('month', LOCALTIMESTAMP) - (%s - 1) * INTERVAL '1 month',
+                %s
+            ) AS P (nome);
+        """
+        result = self.execute(
+            query, (list(TABELAS_PARTICIONADAS), retencao, desanexar), fetch=True
+        )
+        return [nome for (nome,) in result]
+
+    # --- Portfólio ---
+
+    def travar_portfolio(self):
+        """
+        Lock the portfolio engine progress row until the end of the current
+        transaction, so only one run drains the queue at a time. Only
+        meaningful inside transacao().
+        """
+        self.query("SELECT 1 FROM Portfolio_Progresso FOR UPDATE;")
+
+    def retirar_transacoes_pendentes(self, limite: int) -> List[tuple]:
+        """
+        Remove the ``limite`` oldest queued transactions and return them as
+        (data_hora, id_transacao, id_cripto, tipo, quantidade, preco_unitario)
+        rows in that order.
+        """
+        query = """
+            DELETE FROM Portfolio_Pendentes P
+            USING (
+                SELECT data_hora, id_transacao
+                FROM Portfolio_Pendentes
+                ORDER BY data_hora, id_transacao
+                LIMIT %s
+            ) R
+            WHERE P.data_hora = R.data_hora AND P.id_transacao = R.id_transacao
+            RETURNING P.data_hora, P.id_transacao, P.id_cripto, P.tipo,
+                      P.quantidade, P.preco_unitario;
+        """
+        return sorted(self.execute(query, (limite,), fetch=True, preparar=True))
+
+    def refazer_historico_portfolio(self, ids: List[int]) -> List[tuple]:
+        """
+        Drop the lots and the queued transactions of the criptomoedas in
+        ``ids`` and return their whole history, in the same row format and
+        order as ``retirar_transacoes_pendentes``. One statement, so the
+        queue rows removed are exactly the transactions returned.
+        """
+        query = """
+            WITH Lotes AS (
+                DELETE FROM Portfolio_Lotes WHERE id_cripto = ANY (%s)
+            ), Pendentes AS (
+                DELETE FROM Portfolio_Pendentes WHERE id_cripto = ANY (%s)
             )
-        return transacoes
+            SELECT data_hora, id_transacao, id_cripto, tipo, quantidade, preco_unitario
+            FROM Transações_Mercado
+            WHERE id_cripto = ANY (%s)
+            ORDER BY data_hora, id_transacao;
+        """
+        ids = list(ids)
+        return self.execute(query, (ids, ids, ids), fetch=True)
+
+    def ler_posicoes(self, ids: List[int]) -> List[dict]:
+        query = """
+            SELECT id_cripto, quantidade, custo, pnl_realizado, empilhado,
+                   consumido, transacoes, atualizada_em
+            FROM Portfolio_Posicoes
+            WHERE id_cripto = ANY (%s);
+        """
+        return self.query_dicts(query, (list(ids),), preparar=True)
+
+    def ler_lotes_abertos(self, limites: Dict[int, Decimal]) -> List[dict]:
+        """
+        Open lots of each criptomoeda in ``limites`` starting before the
+        queue quantity it maps to, in FIFO order.
+        """
+        query = """
+            SELECT L.id_cripto, L.inicio, L.quantidade, L.preco, L.data_hora
+            FROM unnest(%s::INT[], %s::DECIMAL[]) AS U (id_cripto, ate)
+            JOIN Portfolio_Lotes L ON L.id_cripto = U.id_cripto AND L.inicio < U.ate
+            ORDER BY L.id_cripto, L.inicio;
+        """
+        args = (list(limites), list(limites.values()))
+        return self.query_dicts(query, args, preparar=True)
+
+    def salvar_portfolio(
+        self, posicoes: Sequence[tuple], lotes: Sequence[tuple]
+    ) -> int:
+        """
+        Upsert (id_cripto, quantidade, custo, pnl_realizado, empilhado,
+        consumido, transacoes, atualizada_em) positions, drop the lots they
+        fully consumed and add the new (id_cripto, inicio, quantidade, preco,
+        data_hora) lots, in one statement.
+        """
+        posicoes = list(zip(*posicoes)) or [()] * 8
+        lotes = list(zip(*lotes)) or [()] * 5
+        query = """
+            WITH Fechados AS (
+                DELETE FROM Portfolio_Lotes L
+                USING unnest(%s::INT[], %s::DECIMAL[]) AS U (id_cripto, consumido)
+                WHERE L.id_cripto = U.id_cripto
+                  AND L.inicio < U.consumido
+                  AND L.inicio + L.quantidade <= U.consumido
+            ), Abertos AS (
+                INSERT INTO Portfolio_Lotes (id_cripto, inicio, quantidade, preco, data_hora)
+                SELECT * FROM unnest(
+                    %s::INT[], %s::DECIMAL[], %s::DECIMAL[], %s::DECIMAL[], %s::TIMESTAMP[]
+                )
+            ), Salvas AS (
+                INSERT INTO Portfolio_Posicoes (
+                    id_cripto, quantidade, custo, pnl_realizado, empilhado,
+                    consumido, transacoes, atualizada_em
+                )
+                SELECT * FROM unnest(
+                    %s::INT[], %s::DECIMAL[], %s::DECIMAL[], %s::DECIMAL[],
+                    %s::DECIMAL[], %s::DECIMAL[], %s::INT[], %s::TIMESTAMP[]
+                )
+                ON CONFLICT (id_cripto) DO UPDATE SET
+                    quantidade = EXCLUDED.quantidade,
+                    custo = EXCLUDED.custo,
+                    pnl_realizado = EXCLUDED.pnl_realizado,
+                    empilhado = EXCLUDED.empilhado,
+                    consumido = EXCLUDED.consumido,
+                    transacoes = EXCLUDED.transacoes,
+                    atualizada_em = EXCLUDED.atualizada_em
+                RETURNING 1
+            ), Progresso AS (
+                UPDATE Portfolio_Progresso SET executada_em = CURRENT_TIMESTAMP
+            )
+            SELECT COUNT(*) FROM Salvas;
+        """
+        args = (
+            list(posicoes[0]),
+            list(posicoes[5]),
+            *(list(coluna) for coluna in lotes),
+            *(list(coluna) for coluna in posicoes),
+        )
+        return self.enforce_only(self.execute(query, args, fetch=True))
+
+    def listar_portfolio(self, id_cripto: Optional[int] = None) -> List[dict]:
+        """
+        Position, average cost and P&L of each criptomoeda, the unrealized
+        part marked against its latest quote, read from the archive when all
+        of its quotes were archived.
+        """
+        posicoes = self._listar_portfolio(id_cripto, {})
+        if self.arquivo is None:
+            return posicoes
+        arquivadas = {}
+        for posicao in posicoes:
+            i = posicao["id_cripto"]
+            if posicao["ultimo_preco"] is None and self.meses_arquivados(i):
+                cotacoes = self.listar_cotacoes(i, Pagina(limite=1))
+                if cotacoes:
+                    arquivadas[i] = cotacoes[0]
+        if not arquivadas:
+            return posicoes
+        return self._listar_portfolio(id_cripto, arquivadas)
+
+    def _listar_portfolio(
+        self, id_cripto: Optional[int], arquivadas: Dict[int, dict]
+    ) -> List[dict]:
+        query = """
+            SELECT P.id_cripto, P.quantidade,
+                   ROUND(P.custo / NULLIF(ABS(P.quantidade), 0), 8) AS preco_medio,
+                   ROUND(P.custo, 8) AS custo,
+                   U.preco AS ultimo_preco,
+                   U.data_hora AS cotado_em,
+                   ROUND(P.pnl_realizado, 8) AS pnl_realizado,
+                   ROUND(U.preco * P.quantidade - SIGN(P.quantidade) * P.custo, 8)
+                       AS pnl_nao_realizado,
+                   P.transacoes, P.atualizada_em
+            FROM Portfolio_Posicoes P
+            LEFT JOIN LATERAL (
+                SELECT preco, data_hora
+                FROM Cotações
+                WHERE id_cripto = P.id_cripto
+                ORDER BY data_hora DESC, id_cotacao DESC
+                LIMIT 1
+            ) V ON TRUE
+            LEFT JOIN unnest(%s::INT[], %s::DECIMAL[], %s::TIMESTAMP[])
+                AS A (id_cripto, preco, data_hora) ON A.id_cripto = P.id_cripto
+            CROSS JOIN LATERAL (
+                SELECT COALESCE(V.preco, A.preco) AS preco,
+                       COALESCE(V.data_hora, A.data_hora) AS data_hora
+            ) U
+            WHERE %s::INT IS NULL OR P.id_cripto = %s
+            ORDER BY P.id_cripto;
+        """
+        args = (
+            list(arquivadas),
+            [cotacao["preco"] for cotacao in arquivadas.values()],
+            [cotacao["data_hora"] for cotacao in arquivadas.values()],
+            id_cripto,
+            id_cripto,
+        )
+        return self.query_dicts(query, args, preparar=True)
+
+    def reconstruir_portfolio(self):
+        """Reset the portfolio and queue the whole transaction history again."""
+        self.execute("CALL reconstruir_portfolio();")
 
     # --- CRUD for Ordens ---
 
@@ -355,7 +1098,10 @@ class Database:
             RETURNING id_ordem;
         """
         result = self.execute(
-            query, (id_cripto, tipo, quantidade, preco_limite), fetch=True
+            query,
+            (id_cripto, tipo, quantidade, preco_limite),
+            fetch=True,
+            preparar=True,
         )
         return self.enforce_only(result)
 
@@ -366,19 +1112,65 @@ class Database:
             WHERE id_cripto = %s
             ORDER BY id_ordem DESC;
         """
-        result = self.query(query, (id_cripto,))
-        ordens = []
-        for row in result:
-            id_ordem, tipo, quantidade, preco_limite = row
-            ordens.append(
-                {
-                    "id_ordem": id_ordem,
-                    "tipo": tipo,
-                    "quantidade": quantidade,
-                    "preco_limite": preco_limite,
-                }
-            )
-        return ordens
+        return self.query_dicts(query, (id_cripto,), preparar=True)
+
+    def listar_ordens_abertas(self, id_cripto: Optional[int] = None) -> List[dict]:
+        """
+        Orders still resting in the book, oldest first, as loaded by the
+        matching engine. Rows with an unknown tipo or no quantity are skipped.
+        """
+        condicoes, args = ["lower(tipo) IN ('compra', 'venda')", "quantidade > 0"], []
+        if id_cripto is not None:
+            condicoes.append("id_cripto = %s")
+            args.append(id_cripto)
+        query = f"""
+            SELECT id_ordem, id_cripto, tipo, quantidade, preco_limite
+            FROM Ordens
+            WHERE id_cripto IS NOT NULL AND {" AND ".join(condicoes)}
+            ORDER BY id_ordem;
+        """
+        return self.query_dicts(query, tuple(args))
+
+    def ler_ordem(self, id_ordem: int) -> Optional[dict]:
+        query = """
+            SELECT id_ordem, id_cripto, tipo, quantidade, preco_limite
+            FROM Ordens
+            WHERE id_ordem = %s;
+        """
+        result = self.query(query, (id_ordem,), preparar=True)
+        if not result:
+            return None
+        id_ordem, id_cripto, tipo, quantidade, preco_limite = result[0]
+        return {
+            "id_ordem": id_ordem,
+            "id_cripto": id_cripto,
+            "tipo": tipo,
+            "quantidade": quantidade,
+            "preco_limite": preco_limite,
+        }
+
+    def atualizar_quantidade_ordem(self, id_ordem: int, quantidade: float):
+        """
+        Set the quantity still open on an order, deleting it once fully filled.
+        """
+        if quantidade <= 0:
+            self.excluir_ordem(id_ordem)
+            return
+        query = "UPDATE Ordens SET quantidade = %s WHERE id_ordem = %s;"
+        self.execute(query, (quantidade, id_ordem), preparar=True)
+
+    def excluir_ordem(self, id_ordem: int):
+        query = "DELETE FROM Ordens WHERE id_ordem = %s;"
+        self.execute(query, (id_ordem,), preparar=True)
+
+    def versao_livro(self, id_cripto: int) -> int:
+        query = "SELECT versao FROM Ordens_Versoes WHERE id_cripto = %s;"
+        result = self.query(query, (id_cripto,), preparar=True)
+        return result[0][0] if result else 0
+
+    def listar_versoes_livros(self) -> Dict[int, int]:
+        result = self.query("SELECT id_cripto, versao FROM Ordens_Versoes;")
+        return dict(result)
 
     # --- CRUD for Tendências de Preço ---
 
@@ -388,6 +1180,10 @@ class Database:
         query = """
             INSERT INTO Tendências_Preço (id_cripto, periodo, variacao_preco, tendencia)
             VALUES (%s, %s, %s, %s)
+            ON CONFLICT (id_cripto, periodo) DO UPDATE SET
+                variacao_preco = EXCLUDED.variacao_preco,
+                tendencia = EXCLUDED.tendencia,
+                data_hora = EXCLUDED.data_hora
             RETURNING id_tendencia;
         """
         result = self.execute(
@@ -395,26 +1191,18 @@ class Database:
         )
         return self.enforce_only(result)
 
-    def listar_tendencias(self, id_cripto: int) -> List[dict]:
-        query = """
-            SELECT id_tendencia, periodo, variacao_preco, tendencia
+    def listar_tendencias(
+        self, id_cripto: int, pagina: Optional[Pagina] = None
+    ) -> List[dict]:
+        filtro, args = (pagina or Pagina()).sql(
+            "data_hora", "id_tendencia", ["id_cripto = %s"], [id_cripto]
+        )
+        query = f"""
+            SELECT id_tendencia, data_hora, periodo, variacao_preco, tendencia
             FROM Tendências_Preço
-            WHERE id_cripto = %s
-            ORDER BY periodo DESC;
+            {filtro};
         """
-        result = self.query(query, (id_cripto,))
-        tendencias = []
-        for row in result:
-            id_tendencia, periodo, variacao_preco, tendencia = row
-            tendencias.append(
-                {
-                    "id_tendencia": id_tendencia,
-                    "periodo": periodo,
-                    "variacao_preco": variacao_preco,
-                    "tendencia": tendencia,
-                }
-            )
-        return tendencias
+        return self.query_dicts(query, args, preparar=True)
 
     # --- CRUD for Dados Externos ---
 
@@ -429,25 +1217,14 @@ class Database:
         result = self.execute(query, (descricao, data_hora, valor), fetch=True)
         return self.enforce_only(result)
 
-    def listar_dados_externos(self) -> List[dict]:
-        query = """
+    def listar_dados_externos(self, pagina: Optional[Pagina] = None) -> List[dict]:
+        filtro, args = (pagina or Pagina()).sql("data_hora", "id_dado")
+        query = f"""
             SELECT id_dado, descricao, data_hora, valor
             FROM Dados_Externos
-            ORDER BY data_hora DESC;
-        """
-        result = self.query(query)
-        dados = []
-        for row in result:
-            id_dado, descricao, data_hora, valor = row
-            dados.append(
-                {
-                    "id_dado": id_dado,
-                    "descricao": descricao,
-                    "data_hora": data_hora,
-                    "valor": valor,
-                }
-            )
-        return dados
+            {filtro};
+        """
+        return self.query_dicts(query, args)
 
     # --- CRUD for Imagens de Criptomoedas ---
 
@@ -471,18 +1248,7 @@ class Database:
             WHERE id_cripto = %s
             ORDER BY data_upload DESC;
         """
-        result = self.query(query, (id_cripto,))
-        imagens = []
-        for row in result:
-            id_imagem, tipo, data_upload = row
-            imagens.append(
-                {
-                    "id_imagem": id_imagem,
-                    "tipo": tipo,
-                    "data_upload": data_upload,
-                }
-            )
-        return imagens
+        return self.query_dicts(query, (id_cripto,))
 
     def read_logo_criptomoeda(self, id_cripto: int) -> str:
         query = "SELECT encode(conteudo, 'base64') AS image_base64 FROM Imagens_Criptomoedas WHERE id_cripto=%s AND tipo='logo';"
@@ -492,6 +1258,97 @@ class Database:
         else:
             return None
 
+    def ler_logo(
+        self,
+        id_cripto: int,
+        largura: Optional[int] = None,
+        formatos: Sequence[str] = ("png",),
+    ) -> Optional[dict]:
+        """
+        Find the current logo of a criptomoeda and, when ``largura`` is given,
+        its smallest rendition at least that wide, preferring ``formatos`` in
+        order. ``largura``/``formato`` come back as None when the original
+        should be served instead.
+        """
+        query = """
+            SELECT I.id_imagem, V.largura, V.formato
+            FROM (
+                SELECT id_imagem
+                FROM Imagens_Criptomoedas
+                WHERE id_cripto = %s AND tipo = 'logo'
+                ORDER BY id_imagem DESC
+                LIMIT 1
+            ) I
+            LEFT JOIN LATERAL (
+                SELECT largura, formato
+                FROM Imagens_Variantes V
+                WHERE V.id_imagem = I.id_imagem
+                  AND V.largura >= %s
+                  AND V.formato = ANY(%s)
+                ORDER BY V.largura, array_position(%s, V.formato::TEXT)
+                LIMIT 1
+            ) V ON TRUE;
+        """
+        formatos = list(formatos)
+        result = self.query(query, (id_cripto, largura, formatos, formatos))
+        if len(result) == 1:
+            id_imagem, largura_variante, formato = result[0]
+            return {
+                "id_imagem": id_imagem,
+                "largura": largura_variante,
+                "formato": formato,
+            }
+        else:
+            return None
+
+    def ler_imagem(self, id_imagem: int) -> Optional[bytes]:
+        query = "SELECT conteudo FROM Imagens_Criptomoedas WHERE id_imagem = %s;"
+        result = self.query(query, (id_imagem,))
+        if len(result) == 1:
+            return bytes(result[0][0])
+        else:
+            return None
+
+    def ler_variante(
+        self, id_imagem: int, largura: int, formato: str
+    ) -> Optional[bytes]:
+        query = """
+            SELECT conteudo
+            FROM Imagens_Variantes
+            WHERE id_imagem = %s AND largura = %s AND formato = %s;
+        """
+        result = self.query(query, (id_imagem, largura, formato))
+        if len(result) == 1:
+            return bytes(result[0][0])
+        else:
+            return None
+
+    def inserir_variantes_imagem(
+        self, id_imagem: int, variantes: Iterable[Tuple[int, str, bytes]]
+    ) -> int:
+        query = """
+            COPY Imagens_Variantes (id_imagem, largura, formato, conteudo)
+            FROM STDIN WITH (FORMAT csv);
+        """
+        return self.copy(
+            query,
+            (
+                (id_imagem, largura, formato, conteudo)
+                for largura, formato, conteudo in variantes
+            ),
+        )
+
+    def listar_imagens_sem_variantes(self) -> List[int]:
+        query = """
+            SELECT I.id_imagem
+            FROM Imagens_Criptomoedas I
+            WHERE NOT EXISTS (
+                SELECT 1 FROM Imagens_Variantes V WHERE V.id_imagem = I.id_imagem
+            )
+            ORDER BY I.id_imagem;
+        """
+        return [row[0] for row in self.query(query)]
+
     # --- CRUD for Usuários ---
 
     def inserir_usuario(
@@ -503,24 +1360,22 @@ class Database:
             RETURNING id_usuario;
         """
         result = self.execute(query, (nome, email, senha, admin_flag), fetch=True)
+        self._invalidar("usuarios")
         return self.enforce_only(result)
 
     def listar_usuarios(self) -> List[dict]:
+        cache = self._cache_leitura()
+        if cache is not None:
+            usuarios = cache.get("usuarios")
+            if usuarios is not None:
+                return list(usuarios)
+            geracao = cache.geracao("usuarios")
         query = (
             "SELECT id_usuario, nome, email, admin_flag FROM Usuarios ORDER BY nome;"
         )
-        result = self.query(query)
-        usuarios = []
-        for row in result:
-            id_usuario, nome, email, admin_flag = row
-            usuarios.append(
-                {
-                    "id_usuario": id_usuario,
-                    "nome": nome,
-                    "email": email,
-                    "admin_flag": admin_flag,
-                }
-            )
+        usuarios = self.query_dicts(query)
+        if cache is not None:
+            cache.put("usuarios", tuple(usuarios), geracao)
         return usuarios
 
     def atualizar_usuario(
@@ -532,10 +1387,12 @@ class Database:
             WHERE id_usuario = %s;
         """
         self.execute(query, (nome, email, senha, admin_flag, id_usuario))
+        self._invalidar("usuarios")
 
     def excluir_usuario(self, id_usuario: int):
         query = "DELETE FROM Usuarios WHERE id_usuario = %s;"
         self.execute(query, (id_usuario,))
+        self._invalidar("usuarios")
 
     @staticmethod
     def load():
@@ -543,4 +1400,8 @@ class Database:
         database_url = os.environ.get("DB_URL")
         if database_url is None:
             raise ValueError("Could not load database: DB_URL not found.")
-        return Database(database_url)
+        return Database(
+            database_url,
+            preparar=os.environ.get("DB_PREPARED_STATEMENTS", "1") != "0",
+            arquivo=Arquivo(os.environ.get("ARQUIVO_DIR", "arquivo")),
+        )
@@ -0,0 +1,61 @@
+import csv
+import decimal
+import io
+from typing import Any, AsyncIterable, AsyncIterator, List
+
+import orjson
+
+FORMATOS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _json_default(value):
+    # datetime e date o orjson já serializa em ISO 8601, como isoformat().
+    if isinstance(value, decimal.Decimal):
+        # Mesmo formato do jsonable_encoder do FastAPI.
+        return int(value) if value.as_tuple().exponent >= 0 else float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def json_(valor: Any) -> bytes:
+    """
+    Encode rows straight from the database (Decimal, datetime, date) as
+    UTF-8 JSON, in C, without converting them to plain Python types first.
+    """
+    return orjson.dumps(valor, default=_json_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def ndjson(lote: List[dict]) -> bytes:
+    return b"".join(
+        orjson.dumps(row, default=_json_default, option=orjson.OPT_APPEND_NEWLINE)
+        for row in lote
+    )
+
+
+def csv_(lote: List[dict], cabecalho: bool = False) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=list(lote[0]))
+    if cabecalho:
+        writer.writeheader()
+    writer.writerows(lote)
+    return buffer.getvalue().encode()
+
+
+async def formatar(
+    lotes: AsyncIterable[List[dict]], formato: str
+) -> AsyncIterator[bytes]:
+    """
+    Encode batches of rows as NDJSON or CSV chunks, one chunk per batch, so
+    only a single batch is ever held in memory.
+    """
+    primeiro = True
+    async for lote in lotes:
+        if not lote:
+            continue
+        if formato == "csv":
+            yield csv_(lote, cabecalho=primeiro)
+        else:
+            yield ndjson(lote)
+        primeiro = False
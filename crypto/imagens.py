@@ -0,0 +1,57 @@
+import io
+from typing import List, Tuple
+
+from PIL import Image
+
+ASSINATURAS = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+LARGURAS = (32, 64, 128)
+FORMATOS = ("png", "webp")
+
+
+def tipo_mime(conteudo: bytes) -> str:
+    for assinatura, mime in ASSINATURAS:
+        if conteudo.startswith(assinatura):
+            return mime
+    if conteudo[:4] == b"RIFF" and conteudo[8:12] == b"WEBP":
+        return "image/webp"
+    return "application/octet-stream"
+
+
+def _codificar(imagem: Image.Image, formato: str) -> bytes:
+    buffer = io.BytesIO()
+    if formato == "webp":
+        imagem.save(buffer, "WEBP", quality=90, method=6)
+    else:
+        imagem.save(buffer, "PNG", optimize=True)
+    return buffer.getvalue()
+
+
+def gerar_variantes(conteudo: bytes) -> List[Tuple[int, str, bytes]]:
+    """
+    Build the resized renditions of an uploaded image as
+    ``(largura, formato, conteudo)`` tuples: every width in ``LARGURAS``
+    smaller than the original in each of ``FORMATOS``, plus a WebP copy at the
+    original width.
+
+    CPU bound, meant to run in a worker process off the request path.
+    """
+    with Image.open(io.BytesIO(conteudo)) as original:
+        original.load()
+        imagem = original.convert("RGBA")
+
+    variantes = []
+    for largura in LARGURAS:
+        if largura >= imagem.width:
+            continue
+        altura = max(1, round(imagem.height * largura / imagem.width))
+        reduzida = imagem.resize((largura, altura), Image.Resampling.LANCZOS)
+        for formato in FORMATOS:
+            variantes.append((largura, formato, _codificar(reduzida, formato)))
+    variantes.append((imagem.width, "webp", _codificar(imagem, "webp")))
+    return variantes
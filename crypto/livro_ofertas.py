@@ -0,0 +1,456 @@
+import asyncio
+import datetime
+import functools
+import heapq
+import itertools
+from collections import defaultdict
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from .async_database import AsyncDatabase
+
+COMPRA = "Compra"
+VENDA = "Venda"
+CASAS = Decimal("0.00000001")
+
+
+def normalizar_tipo(tipo: str) -> str:
+    tipo = tipo.strip().capitalize()
+    if tipo not in (COMPRA, VENDA):
+        raise ValueError(f"Invalid order type: {tipo!r}")
+    return tipo
+
+
+def decimal(valor) -> Decimal:
+    return Decimal(str(valor)).quantize(CASAS)
+
+
+@dataclass
+class Ordem:
+    id_ordem: Optional[int]
+    tipo: str
+    quantidade: Decimal
+    preco_limite: Decimal
+
+
+@dataclass
+class Execucao:
+    id_ordem: int
+    quantidade: Decimal
+    preco: Decimal
+
+
+class Nivel:
+    """
+    Orders resting at one price, kept in arrival order. A dict preserves
+    insertion order, so it works as a FIFO queue with O(1) removal by id.
+    """
+
+    __slots__ = ("ordens", "quantidade")
+
+    def __init__(self):
+        self.ordens: Dict[int, Ordem] = {}
+        self.quantidade = Decimal(0)
+
+    def adicionar(self, ordem: Ordem):
+        self.ordens[ordem.id_ordem] = ordem
+        self.quantidade += ordem.quantidade
+
+    def remover(self, id_ordem: int) -> Ordem:
+        ordem = self.ordens.pop(id_ordem)
+        self.quantidade -= ordem.quantidade
+        return ordem
+
+    def reduzir(self, id_ordem: int, quantidade: Decimal):
+        self.ordens[id_ordem].quantidade -= quantidade
+        self.quantidade -= quantidade
+
+
+class Lado:
+    """
+    One side of the book: a binary heap of prices, best first (highest bid,
+    lowest ask), and the level resting at each price. Opening a level costs
+    O(log n); an emptied level leaves the dict at once and the heap lazily,
+    when it reaches the top or when stale entries outnumber the live ones.
+    """
+
+    def __init__(self, tipo: str):
+        self.tipo = tipo
+        # heapq é de mínimo: as compras entram ordenadas pelo preço negativo.
+        self.compra = tipo == COMPRA
+        self.heap: List[Tuple[Decimal, Decimal]] = []
+        # Preços com entrada no heap, viva ou não; cada um entra uma só vez.
+        self.no_heap: Set[Decimal] = set()
+        self.niveis: Dict[Decimal, Nivel] = {}
+
+    def melhor(self) -> Optional[Decimal]:
+        """Best price in O(1): the top of the heap is never a stale level."""
+        return self.heap[0][1] if self.heap else None
+
+    def melhores(self) -> Iterator[Decimal]:
+        """
+        Iterate the prices with resting orders from the best one, walking the
+        heap as a tree with a frontier ordered by price: the first k prices
+        cost O(k log k), whatever the size of the book. The side must not
+        change while the iterator is in use.
+        """
+        heap, niveis = self.heap, self.niveis
+        if not heap:
+            return
+        tamanho = len(heap)
+        fronteira = [(heap[0], 0)]
+        while fronteira:
+            (_, preco), i = heapq.heappop(fronteira)
+            filho = 2 * i + 1
+            if filho < tamanho:
+                heapq.heappush(fronteira, (heap[filho], filho))
+                if filho + 1 < tamanho:
+                    heapq.heappush(fronteira, (heap[filho + 1], filho + 1))
+            if preco in niveis:
+                yield preco
+
+    def adicionar(self, ordem: Ordem):
+        preco = ordem.preco_limite
+        nivel = self.niveis.get(preco)
+        if nivel is None:
+            nivel = self.niveis[preco] = Nivel()
+            if preco not in self.no_heap:
+                heapq.heappush(self.heap, (-preco if self.compra else preco, preco))
+                self.no_heap.add(preco)
+        nivel.adicionar(ordem)
+
+    def remover(self, id_ordem: int, preco: Decimal) -> Ordem:
+        nivel = self.niveis[preco]
+        ordem = nivel.remover(id_ordem)
+        if not nivel.ordens:
+            del self.niveis[preco]
+            self._limpar()
+        return ordem
+
+    def _limpar(self):
+        heap, niveis = self.heap, self.niveis
+        while heap and heap[0][1] not in niveis:
+            self.no_heap.discard(heapq.heappop(heap)[1])
+        # Refazer o heap custa O(n), pago pelas n remoções que o sujaram.
+        if len(heap) > 2 * len(niveis) + 64:
+            self.heap = [(-p if self.compra else p, p) for p in niveis]
+            heapq.heapify(self.heap)
+            self.no_heap = set(niveis)
+
+
+class LivroOfertas:
+    """
+    Price-time priority order book of a single criptomoeda.
+
+    Matching is split in two steps so the database write can sit between
+    them: ``simular`` computes the fills of an incoming order without touching
+    the book, and ``aplicar`` commits them once they are persisted.
+    """
+
+    def __init__(self):
+        self.lados = {COMPRA: Lado(COMPRA), VENDA: Lado(VENDA)}
+        self.ordens: Dict[int, Ordem] = {}
+
+    def adicionar(self, ordem: Ordem):
+        self.lados[ordem.tipo].adicionar(ordem)
+        self.ordens[ordem.id_ordem] = ordem
+
+    def copiar(self) -> "LivroOfertas":
+        """
+        Independent copy of the book. ``ordens`` keeps arrival order, so every
+        level keeps its time priority.
+        """
+        copia = LivroOfertas()
+        for ordem in self.ordens.values():
+            copia.adicionar(
+                Ordem(ordem.id_ordem, ordem.tipo, ordem.quantidade, ordem.preco_limite)
+            )
+        return copia
+
+    def cancelar(self, id_ordem: int) -> Optional[Ordem]:
+        ordem = self.ordens.pop(id_ordem, None)
+        if ordem is not None:
+            self.lados[ordem.tipo].remover(id_ordem, ordem.preco_limite)
+        return ordem
+
+    def profundidade(self, niveis: int) -> dict:
+        """
+        The ``niveis`` best price levels of each side with their quantity and
+        the cumulative quantity up to them. Costs O(niveis): the level totals
+        are kept up to date on every insert, fill and cancel.
+        """
+        snapshot = {}
+        for chave, tipo in (("bids", COMPRA), ("asks", VENDA)):
+            lado = self.lados[tipo]
+            acumulada = Decimal(0)
+            linhas = []
+            for preco in itertools.islice(lado.melhores(), niveis):
+                quantidade = lado.niveis[preco].quantidade
+                acumulada += quantidade
+                linhas.append(
+                    {
+                        "preco": preco,
+                        "quantidade": quantidade,
+                        "quantidade_acumulada": acumulada,
+                        "ordens": len(lado.niveis[preco].ordens),
+                    }
+                )
+            snapshot[chave] = linhas
+        return snapshot
+
+    def simular(self, ordem: Ordem) -> List[Execucao]:
+        oposto = self.lados[VENDA if ordem.tipo == COMPRA else COMPRA]
+        melhor = oposto.melhor()
+        # Uma ordem que não cruza nem chega a percorrer o heap.
+        if melhor is None or (
+            melhor > ordem.preco_limite
+            if ordem.tipo == COMPRA
+            else melhor < ordem.preco_limite
+        ):
+            return []
+        restante = ordem.quantidade
+        execucoes = []
+        for preco in oposto.melhores():
+            if restante <= 0:
+                break
+            if ordem.tipo == COMPRA and preco > ordem.preco_limite:
+                break
+            if ordem.tipo == VENDA and preco < ordem.preco_limite:
+                break
+            for passiva in oposto.niveis[preco].ordens.values():
+                quantidade = min(restante, passiva.quantidade)
+                execucoes.append(Execucao(passiva.id_ordem, quantidade, preco))
+                restante -= quantidade
+                if restante <= 0:
+                    break
+        return execucoes
+
+    def aplicar(self, ordem: Ordem, execucoes: List[Execucao]):
+        for execucao in execucoes:
+            passiva = self.ordens[execucao.id_ordem]
+            if execucao.quantidade >= passiva.quantidade:
+                self.cancelar(passiva.id_ordem)
+            else:
+                lado = self.lados[passiva.tipo]
+                lado.niveis[passiva.preco_limite].reduzir(
+                    passiva.id_ordem, execucao.quantidade
+                )
+        restante = ordem.quantidade - sum(e.quantidade for e in execucoes)
+        if restante > 0:
+            self.adicionar(
+                Ordem(ordem.id_ordem, ordem.tipo, restante, ordem.preco_limite)
+            )
+
+
+class MotorNegociacao:
+    """
+    Keeps one LivroOfertas per criptomoeda in memory and matches incoming
+    orders against it, persisting orders and fills in a single transaction.
+
+    Every write to Ordens bumps Ordens_Versoes (by trigger), and each
+    submission locks that row. A book whose version differs from the
+    database, because another worker or a script wrote to Ordens, is reloaded
+    before matching, so several server processes stay consistent. ``livros``
+    only ever holds committed orders: inside a caller's transaction the
+    changes go to a draft, published when that transaction commits.
+    """
+
+    def __init__(self):
+        self.livros: Dict[int, LivroOfertas] = defaultdict(LivroOfertas)
+        self.versoes: Dict[int, int] = {}
+        self._locks: Dict[int, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+    async def carregar(self, db: AsyncDatabase):
+        """Rebuild every book from the Ordens table."""
+        async with db.transacao() as tx:
+            versoes = await tx.listar_versoes_livros()
+            ordens = await tx.listar_ordens_abertas()
+        self.livros.clear()
+        for ordem in ordens:
+            self._adicionar(ordem)
+        self.versoes = versoes
+
+    async def _ler_livro(self, tx: AsyncDatabase, id_cripto: int) -> LivroOfertas:
+        livro = LivroOfertas()
+        for ordem in await tx.listar_ordens_abertas(id_cripto):
+            self._adicionar(ordem, livro)
+        return livro
+
+    def _adicionar(self, row: dict, livro: Optional[LivroOfertas] = None):
+        if livro is None:
+            livro = self.livros[row["id_cripto"]]
+        livro.adicionar(
+            Ordem(
+                row["id_ordem"],
+                normalizar_tipo(row["tipo"]),
+                row["quantidade"],
+                row["preco_limite"],
+            )
+        )
+
+    def _publicar(self, id_cripto: int, livro: LivroOfertas, versoes: dict):
+        """
+        Make a committed draft the book of ``id_cripto``, unless a newer one
+        already is. ``versoes`` is read only now, after the last write.
+        """
+        versao = versoes[id_cripto]
+        if versao > self.versoes.get(id_cripto, 0):
+            self.livros[id_cripto] = livro
+            self.versoes[id_cripto] = versao
+
+    async def _travar(self, tx: AsyncDatabase, id_cripto: int):
+        """
+        Hold the in-process lock of ``id_cripto`` until the outermost
+        transaction of ``tx`` ends, taking it once per transaction.
+
+        It is taken only after the row of Ordens_Versoes, and both are kept
+        until the same commit, so no one waits on the row while holding the
+        lock: a batch with several orders of a criptomoeda can never end up
+        behind a request that is itself waiting on the batch's row lock, a
+        cycle Postgres could not see.
+        """
+        travas = tx.estado.setdefault("travas", set())
+        if id_cripto not in travas:
+            trava = self._locks[id_cripto]
+            await trava.acquire()
+            travas.add(id_cripto)
+            tx.ao_terminar(trava.release)
+
+    def _aplicar(self, id_cripto: int, acao: Callable[[], object], versao: int):
+        """Apply a committed change to the published book."""
+        acao()
+        self.versoes[id_cripto] = versao
+
+    async def _sincronizar(
+        self, tx: AsyncDatabase, id_cripto: int, rascunho: bool
+    ) -> LivroOfertas:
+        """
+        Lock the book of ``id_cripto``, in the database and in this process,
+        until ``tx`` ends and return it as ``tx`` sees it. With ``rascunho`` (a transaction opened by the caller,
+        such as POST /batch) that is a private draft, kept in the transaction
+        state and published only on commit, so depth snapshots never show
+        orders that may still roll back.
+        """
+        versao = await tx.travar_livro(id_cripto)
+        await self._travar(tx, id_cripto)
+        if rascunho:
+            rascunhos = tx.estado.setdefault("livros", {})
+            # A trava vale até o fim da transação: o rascunho está em dia.
+            if id_cripto not in rascunhos:
+                if self.versoes.get(id_cripto, 0) == versao:
+                    rascunhos[id_cripto] = self.livros[id_cripto].copiar()
+                else:
+                    rascunhos[id_cripto] = await self._ler_livro(tx, id_cripto)
+                tx.estado.setdefault("versoes", {})[id_cripto] = versao
+                tx.ao_confirmar(
+                    functools.partial(
+                        self._publicar,
+                        id_cripto,
+                        rascunhos[id_cripto],
+                        tx.estado["versoes"],
+                    )
+                )
+            return rascunhos[id_cripto]
+        if self.versoes.get(id_cripto, 0) != versao:
+            # Nada foi escrito ainda por tx: o que ela lê está confirmado.
+            self.livros[id_cripto] = await self._ler_livro(tx, id_cripto)
+            self.versoes[id_cripto] = versao
+        return self.livros[id_cripto]
+
+    async def profundidade(
+        self, db: AsyncDatabase, id_cripto: int, niveis: int
+    ) -> dict:
+        """
+        Depth snapshot of the committed book. The version check is a plain
+        read, so snapshots never wait on a submission holding the book lock.
+        """
+        versao = await db.versao_livro(id_cripto)
+        if self.versoes.get(id_cripto, 0) != versao:
+            async with self._locks[id_cripto]:
+                if self.versoes.get(id_cripto, 0) != versao:
+                    # A versão é lida antes das ordens: se alguém escrever
+                    # entre as duas leituras, a próxima chamada recarrega.
+                    self.livros[id_cripto] = await self._ler_livro(db, id_cripto)
+                    self.versoes[id_cripto] = versao
+        return {"versao": versao, **self.livros[id_cripto].profundidade(niveis)}
+
+    async def submeter(
+        self, db: AsyncDatabase, id_cripto: int, tipo: str, quantidade, preco_limite
+    ) -> dict:
+        tipo = normalizar_tipo(tipo)
+        quantidade, preco_limite = decimal(quantidade), decimal(preco_limite)
+        if quantidade <= 0 or preco_limite <= 0:
+            raise ValueError("Order quantity and price must be positive.")
+
+        rascunho = db.estado is not None
+        async with db.transacao() as tx:
+            livro = await self._sincronizar(tx, id_cripto, rascunho)
+            id_ordem = await tx.inserir_ordem(id_cripto, tipo, quantidade, preco_limite)
+            ordem = Ordem(id_ordem, tipo, quantidade, preco_limite)
+            execucoes = livro.simular(ordem)
+
+            agora = datetime.datetime.now()
+            for execucao in execucoes:
+                passiva = livro.ordens[execucao.id_ordem]
+                await tx.atualizar_quantidade_ordem(
+                    passiva.id_ordem, passiva.quantidade - execucao.quantidade
+                )
+            await tx.inserir_transacoes(
+                (id_cripto, agora, tipo, execucao.quantidade, execucao.preco)
+                for execucao in execucoes
+            )
+            restante = quantidade - sum(e.quantidade for e in execucoes)
+            if restante != quantidade:
+                await tx.atualizar_quantidade_ordem(id_ordem, restante)
+            versao = await tx.versao_livro(id_cripto)
+            if rascunho:
+                livro.aplicar(ordem, execucoes)
+                tx.estado["versoes"][id_cripto] = versao
+            else:
+                # Antes de a trava ser solta, que vem depois do commit.
+                tx.ao_confirmar(
+                    functools.partial(
+                        self._aplicar,
+                        id_cripto,
+                        functools.partial(livro.aplicar, ordem, execucoes),
+                        versao,
+                    )
+                )
+
+        return {
+            "id": id_ordem,
+            "quantidade_restante": restante,
+            "execucoes": [
+                {
+                    "id_ordem": execucao.id_ordem,
+                    "quantidade": execucao.quantidade,
+                    "preco": execucao.preco,
+                }
+                for execucao in execucoes
+            ],
+        }
+
+    async def cancelar(self, db: AsyncDatabase, id_ordem: int) -> bool:
+        ordem = await db.ler_ordem(id_ordem)
+        if ordem is None:
+            return False
+        id_cripto = ordem["id_cripto"]
+        rascunho = db.estado is not None
+        async with db.transacao() as tx:
+            livro = await self._sincronizar(tx, id_cripto, rascunho)
+            await tx.excluir_ordem(id_ordem)
+            versao = await tx.versao_livro(id_cripto)
+            if rascunho:
+                livro.cancelar(id_ordem)
+                tx.estado["versoes"][id_cripto] = versao
+            else:
+                tx.ao_confirmar(
+                    functools.partial(
+                        self._aplicar,
+                        id_cripto,
+                        functools.partial(livro.cancelar, id_ordem),
+                        versao,
+                    )
+                )
+        return True
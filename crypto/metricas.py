@@ -0,0 +1,253 @@
+"""
+In-process metrics in the Prometheus text format.
+
+Every server worker keeps its own values; scrape each worker (or run a
+single one) to get complete numbers.
+"""
+
+import logging
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+LIMITES_SEGUNDOS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+Rotulos = Tuple[Tuple[str, str], ...]
+
+
+def _rotulos(rotulos: Dict[str, str]) -> Rotulos:
+    return tuple(sorted((chave, str(valor)) for chave, valor in rotulos.items()))
+
+
+def _numero(valor: float) -> str:
+    return str(int(valor)) if float(valor).is_integer() else repr(float(valor))
+
+
+def _formatar(rotulos: Rotulos, extra: Sequence[Tuple[str, str]] = ()) -> str:
+    pares = list(rotulos) + list(extra)
+    if not pares:
+        return ""
+    texto = ",".join(
+        f'{chave}="{valor.replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for chave, valor in pares
+    )
+    return "{" + texto + "}"
+
+
+class Metrica:
+    tipo = ""
+
+    def __init__(self, nome: str, descricao: str):
+        self.nome = nome
+        self.descricao = descricao
+        self._lock = threading.Lock()
+
+    def linhas(self) -> List[str]:
+        return [
+            f"# HELP {self.nome} {self.descricao}",
+            f"# TYPE {self.nome} {self.tipo}",
+        ]
+
+
+class Contador(Metrica):
+    tipo = "counter"
+
+    def __init__(self, nome: str, descricao: str):
+        super().__init__(nome, descricao)
+        self._valores: Dict[Rotulos, float] = defaultdict(float)
+
+    def incrementar(self, valor: float = 1, **rotulos):
+        with self._lock:
+            self._valores[_rotulos(rotulos)] += valor
+
+    def linhas(self) -> List[str]:
+        with self._lock:
+            valores = list(self._valores.items())
+        return super().linhas() + [
+            f"{self.nome}{_formatar(rotulos)} {_numero(valor)}"
+            for rotulos, valor in valores
+        ]
+
+
+class Medidor(Metrica):
+    tipo = "gauge"
+
+    def __init__(self, nome: str, descricao: str):
+        super().__init__(nome, descricao)
+        self._valores: Dict[Rotulos, float] = {}
+
+    def definir(self, valor: float, **rotulos):
+        with self._lock:
+            self._valores[_rotulos(rotulos)] = valor
+
+    def linhas(self) -> List[str]:
+        with self._lock:
+            valores = list(self._valores.items())
+        return super().linhas() + [
+            f"{self.nome}{_formatar(rotulos)} {_numero(valor)}"
+            for rotulos, valor in valores
+        ]
+
+
+class Histograma(Metrica):
+    tipo = "histogram"
+
+    def __init__(
+        self, nome: str, descricao: str, limites: Sequence[float] = LIMITES_SEGUNDOS
+    ):
+        super().__init__(nome, descricao)
+        self.limites = tuple(limites)
+        # Por rótulo: contagem por faixa (não acumulada), soma e total.
+        self._series: Dict[Rotulos, list] = {}
+
+    def observar(self, valor: float, **rotulos):
+        chave = _rotulos(rotulos)
+        with self._lock:
+            serie = self._series.get(chave)
+            if serie is None:
+                serie = self._series[chave] = [[0] * len(self.limites), 0.0, 0]
+            for i, limite in enumerate(self.limites):
+                if valor <= limite:
+                    serie[0][i] += 1
+                    break
+            serie[1] += valor
+            serie[2] += 1
+
+    def linhas(self) -> List[str]:
+        with self._lock:
+            series = [(r, list(s[0]), s[1], s[2]) for r, s in self._series.items()]
+        linhas = super().linhas()
+        for rotulos, faixas, soma, total in series:
+            acumulado = 0
+            for limite, quantidade in zip(self.limites, faixas):
+                acumulado += quantidade
+                linhas.append(
+                    f"{self.nome}_bucket{_formatar(rotulos, [('le', f'{limite:g}')])} {acumulado}"
+                )
+            linhas.append(
+                f"{self.nome}_bucket{_formatar(rotulos, [('le', '+Inf')])} {total}"
+            )
+            linhas.append(f"{self.nome}_sum{_formatar(rotulos)} {_numero(soma)}")
+            linhas.append(f"{self.nome}_count{_formatar(rotulos)} {total}")
+        return linhas
+
+
+class Registro:
+    def __init__(self):
+        self._metricas: List[Metrica] = []
+
+    def registrar(self, metrica: Metrica) -> Metrica:
+        self._metricas.append(metrica)
+        return metrica
+
+    def exportar(self) -> str:
+        return "\n".join(linha for m in self._metricas for linha in m.linhas()) + "\n"
+
+
+REGISTRO = Registro()
+
+CONSULTA_DURACAO = REGISTRO.registrar(
+    Histograma(
+        "db_consulta_duracao_segundos", "Duration of SQL statements by operation."
+    )
+)
+CONSULTA_LINHAS = REGISTRO.registrar(
+    Contador("db_consulta_linhas_total", "Rows returned or written by operation.")
+)
+CONSULTA_ERROS = REGISTRO.registrar(
+    Contador("db_consulta_erros_total", "Failed SQL statements by operation.")
+)
+POOL_ESPERA = REGISTRO.registrar(
+    Histograma("db_pool_espera_segundos", "Time waiting for a pool connection.")
+)
+POOL = REGISTRO.registrar(Medidor("db_pool", "Connection pool statistics."))
+CACHE = REGISTRO.registrar(Medidor("cache", "In-memory cache statistics."))
+STREAM = REGISTRO.registrar(Medidor("stream", "Live cotação stream statistics."))
+HTTP_DURACAO = REGISTRO.registrar(
+    Histograma(
+        "http_requisicao_duracao_segundos", "HTTP request latency by route and status."
+    )
+)
+
+# Limiar, em milissegundos, acima do qual o comando é registrado no log.
+LIMIAR_LENTA_MS = float(os.environ.get("DB_SLOW_QUERY_MS", 500))
+
+
+def operacao_chamadora(profundidade: int = 2) -> str:
+    """
+    Name of the function ``profundidade`` frames up: the Database method that
+    issued the statement, such as ``listar_cotacoes``. Must be called before
+    the first ``await`` of a coroutine, while the caller's frame is still on
+    the stack.
+    """
+    return sys._getframe(profundidade).f_code.co_name
+
+
+def formato_parametros(args) -> str:
+    """Shape of the statement parameters, without their values."""
+
+    def formato(valor) -> str:
+        if isinstance(valor, (list, tuple)):
+            return f"{type(valor).__name__}[{len(valor)}]"
+        if isinstance(valor, (bytes, str)):
+            return f"{type(valor).__name__}({len(valor)})"
+        return type(valor).__name__
+
+    if isinstance(args, dict):
+        return "{" + ", ".join(f"{k}: {formato(v)}" for k, v in args.items()) + "}"
+    return "(" + ", ".join(formato(v) for v in args) + ")"
+
+
+class Medicao:
+    __slots__ = ("linhas",)
+
+    def __init__(self):
+        self.linhas = 0
+
+
+@contextmanager
+def medir_consulta(operacao: str, query: str, args=()) -> Iterator[Medicao]:
+    """
+    Time a statement and record it under ``operacao``. The caller sets
+    ``linhas`` on the yielded object.
+    """
+    medicao = Medicao()
+    inicio = time.perf_counter()
+    try:
+        yield medicao
+    except Exception:
+        CONSULTA_ERROS.incrementar(operacao=operacao)
+        raise
+    finally:
+        duracao = time.perf_counter() - inicio
+        CONSULTA_DURACAO.observar(duracao, operacao=operacao)
+        if medicao.linhas:
+            CONSULTA_LINHAS.incrementar(medicao.linhas, operacao=operacao)
+        if LIMIAR_LENTA_MS > 0 and duracao * 1000 >= LIMIAR_LENTA_MS:
+            logger.warning(
+                "Slow query in %s took %.1fms, params %s: %s",
+                operacao,
+                duracao * 1000,
+                formato_parametros(args),
+                " ".join(query.split()),
+            )
@@ -0,0 +1,222 @@
+"""
+Versioned schema migrations.
+
+Each migration is a ``NNNN_nome.sql`` file in ``versoes/``, applied in version
+order and recorded in the ``Migracoes`` table. A migration runs inside a
+single transaction unless its first line is ``-- migracao: sem-transacao``,
+in which case its statements run one by one in autocommit mode, as required
+by ``CREATE INDEX CONCURRENTLY`` on a live database.
+"""
+
+import datetime
+import os
+import re
+from dataclasses import dataclass
+from typing import List, Optional
+
+from psycopg2 import extensions
+
+VERSOES = os.path.join(os.path.dirname(__file__), "versoes")
+SEM_TRANSACAO = "-- migracao: sem-transacao"
+DOLLAR_QUOTE = re.compile(r"\$\w*\$")
+
+# Chave do advisory lock que impede dois processos de migrarem ao mesmo tempo.
+LOCK_MIGRACOES = 727_001
+
+
+@dataclass
+class Migracao:
+    versao: int
+    nome: str
+    caminho: str
+
+    @property
+    def sql(self) -> str:
+        with open(self.caminho, encoding="utf-8") as file:
+            return file.read()
+
+    @property
+    def transacional(self) -> bool:
+        return not self.sql.lstrip().startswith(SEM_TRANSACAO)
+
+
+def carregar_migracoes(diretorio: str = VERSOES) -> List[Migracao]:
+    migracoes = []
+    for arquivo in sorted(os.listdir(diretorio)):
+        match = re.fullmatch(r"(\d+)_(\w+)\.sql", arquivo)
+        if match is None:
+            continue
+        versao, nome = match.groups()
+        migracoes.append(Migracao(int(versao), nome, os.path.join(diretorio, arquivo)))
+    versoes = [m.versao for m in migracoes]
+    if len(set(versoes)) != len(versoes):
+        raise ValueError("Duplicate migration versions.")
+    return migracoes
+
+
+def dividir_comandos(sql: str) -> List[str]:
+    """
+    Split a script into statements on ``;``, ignoring the ones inside
+    comments, quoted strings and dollar-quoted bodies.
+    """
+    comandos, atual, i = [], [], 0
+    while i < len(sql):
+        if sql.startswith("--", i):
+            fim = sql.find("\n", i)
+            fim = len(sql) if fim == -1 else fim
+            atual.append(sql[i:fim])
+            i = fim
+            continue
+        char = sql[i]
+        if char == "'":
+            fim = i + 1
+            while True:
+                fim = sql.index("'", fim) + 1
+                if not sql.startswith("'", fim):
+                    break
+                fim += 1
+            atual.append(sql[i:fim])
+            i = fim
+            continue
+        match = DOLLAR_QUOTE.match(sql, i)
+        if match:
+            tag = match.group(0)
+            fim = sql.index(tag, i + len(tag)) + len(tag)
+            atual.append(sql[i:fim])
+            i = fim
+            continue
+        if char == ";":
+            comandos.append("".join(atual))
+            atual = []
+        else:
+            atual.append(char)
+        i += 1
+    comandos.append("".join(atual))
+    return [
+        c.strip()
+        for c in comandos
+        if any(
+            linha.strip() and not linha.strip().startswith("--")
+            for linha in c.splitlines()
+        )
+    ]
+
+
+def _garantir_tabela(conn: extensions.connection):
+    query = """
+        CREATE TABLE IF NOT EXISTS Migracoes (
+            versao INT PRIMARY KEY,
+            nome VARCHAR(100) NOT NULL,
+            aplicada_em TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(query)
+    conn.commit()
+
+
+def aplicadas(conn: extensions.connection) -> dict:
+    _garantir_tabela(conn)
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT versao, aplicada_em FROM Migracoes;")
+        result = dict(cursor.fetchall())
+    conn.commit()
+    return result
+
+
+def status(conn: extensions.connection) -> List[dict]:
+    feitas = aplicadas(conn)
+    return [
+        {
+            "versao": m.versao,
+            "nome": m.nome,
+            "transacional": m.transacional,
+            "aplicada_em": feitas.get(m.versao),
+        }
+        for m in carregar_migracoes()
+    ]
+
+
+def _remover_indices_invalidos(conn: extensions.connection, sql: str):
+    # Um CREATE INDEX CONCURRENTLY interrompido deixa o índice marcado como
+    # inválido, e o IF NOT EXISTS da nova tentativa o manteria assim.
+    nomes = re.findall(
+        r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+(\w+)",
+        sql,
+        flags=re.IGNORECASE,
+    )
+    if not nomes:
+        return
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT C.relname
+            FROM pg_index I
+            JOIN pg_class C ON C.oid = I.indexrelid
+            WHERE NOT I.indisvalid AND C.relname = ANY(%s);
+            """,
+            ([nome.lower() for nome in nomes],),
+        )
+        for (nome,) in cursor.fetchall():
+            cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{nome}";')
+
+
+def aplicar_migracao(conn: extensions.connection, migracao: Migracao):
+    sql = migracao.sql
+    registro = "INSERT INTO Migracoes (versao, nome) VALUES (%s, %s);"
+    if migracao.transacional:
+        with conn.cursor() as cursor:
+            try:
+                cursor.execute(sql)
+                cursor.execute(registro, (migracao.versao, migracao.nome))
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                raise e
+        return
+
+    conn.autocommit = True
+    try:
+        _remover_indices_invalidos(conn, sql)
+        with conn.cursor() as cursor:
+            for comando in dividir_comandos(sql):
+                cursor.execute(comando)
+            cursor.execute(registro, (migracao.versao, migracao.nome))
+    finally:
+        conn.autocommit = False
+
+
+def aplicar(
+    conn: extensions.connection,
+    ate: Optional[int] = None,
+    log=print,
+) -> List[Migracao]:
+    """
+    Apply every pending migration up to version ``ate`` (all by default) and
+    return the ones that ran.
+    """
+    feitas = aplicadas(conn)
+    pendentes = [
+        m
+        for m in carregar_migracoes()
+        if m.versao not in feitas and (ate is None or m.versao <= ate)
+    ]
+    executadas = []
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_lock(%s);", (LOCK_MIGRACOES,))
+    conn.commit()
+    try:
+        for migracao in pendentes:
+            # Outro processo pode ter aplicado enquanto esperávamos o lock.
+            if migracao.versao in aplicadas(conn):
+                continue
+            inicio = datetime.datetime.now()
+            log(f"Applying {migracao.versao:04d}_{migracao.nome}...")
+            aplicar_migracao(conn, migracao)
+            log(f"  done in {(datetime.datetime.now() - inicio).total_seconds():.2f}s")
+            executadas.append(migracao)
+    finally:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock(%s);", (LOCK_MIGRACOES,))
+        conn.commit()
+    return executadas
@@ -0,0 +1,34 @@
+import argparse
+
+from crypto import Database
+from crypto.migrations import aplicar, status
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m crypto.migrations", description="Schema migrations."
+    )
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+    apply_parser = subparsers.add_parser("apply", help="Apply pending migrations.")
+    apply_parser.add_argument(
+        "--to", dest="ate", type=int, help="Stop after this migration version."
+    )
+    subparsers.add_parser("status", help="List migrations and when they ran.")
+    args = parser.parse_args()
+
+    db = Database.load()
+    try:
+        if args.comando == "apply":
+            executadas = aplicar(db.conn, args.ate)
+            if not executadas:
+                print("Database is up to date.")
+        else:
+            for migracao in status(db.conn):
+                aplicada_em = migracao["aplicada_em"] or "pending"
+                print(f"{migracao['versao']:04d}  {migracao['nome']:<40} {aplicada_em}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+-- Candles OHLCV mantidos por gatilho a cada inserção em Cotações. Era o
+-- script avulso sql/candles.sql; virou migração porque a 0011 recria o
+-- gatilho de Cotações com atualizar_candles(). Bancos que já rodaram o
+-- script passam por ela sem mudanças, por isso tudo aqui é idempotente.
+
+CREATE TABLE IF NOT EXISTS Candles (
+    id_cripto INT REFERENCES Criptomoedas (id_cripto), -- Referência à criptomoeda
+    intervalo VARCHAR(5) NOT NULL, -- Intervalo do candle (1m, 5m, 1h, 1d)
+    inicio TIMESTAMP NOT NULL, -- Início do intervalo
+    abertura DECIMAL(18, 8) NOT NULL, -- Preço da primeira cotação do intervalo
+    maxima DECIMAL(18, 8) NOT NULL, -- Maior preço do intervalo
+    minima DECIMAL(18, 8) NOT NULL, -- Menor preço do intervalo
+    fechamento DECIMAL(18, 8) NOT NULL, -- Preço da última cotação do intervalo
+    volume DECIMAL(18, 2) NOT NULL DEFAULT 0, -- Volume somado das cotações do intervalo
+    quantidade_cotacoes INT NOT NULL, -- Número de cotações agregadas
+    abertura_em TIMESTAMP NOT NULL, -- Data e hora da primeira cotação do intervalo
+    fechamento_em TIMESTAMP NOT NULL, -- Data e hora da última cotação do intervalo
+    PRIMARY KEY (id_cripto, intervalo, inicio)
+);
+
+COMMENT ON TABLE Candles IS 'Tabela que armazena candles OHLCV pré-calculados a partir das cotações, mantidos por gatilho a cada inserção.';
+COMMENT ON COLUMN Candles.id_cripto IS 'Referência à criptomoeda';
+COMMENT ON COLUMN Candles.intervalo IS 'Intervalo do candle (1m, 5m, 1h, 1d)';
+COMMENT ON COLUMN Candles.inicio IS 'Início do intervalo';
+COMMENT ON COLUMN Candles.abertura IS 'Preço da primeira cotação do intervalo';
+COMMENT ON COLUMN Candles.maxima IS 'Maior preço do intervalo';
+COMMENT ON COLUMN Candles.minima IS 'Menor preço do intervalo';
+COMMENT ON COLUMN Candles.fechamento IS 'Preço da última cotação do intervalo';
+COMMENT ON COLUMN Candles.volume IS 'Volume somado das cotações do intervalo';
+COMMENT ON COLUMN Candles.quantidade_cotacoes IS 'Número de cotações agregadas';
+COMMENT ON COLUMN Candles.abertura_em IS 'Data e hora da primeira cotação do intervalo';
+COMMENT ON COLUMN Candles.fechamento_em IS 'Data e hora da última cotação do intervalo';
+
+-- Funde as cotações recém-inseridas nos candles de todos os intervalos. O
+-- gatilho é por comando, então um COPY de milhares de linhas gera um único
+-- upsert por candle afetado.
+CREATE OR REPLACE FUNCTION atualizar_candles ()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    INSERT INTO Candles (
+        id_cripto, intervalo, inicio, abertura, maxima, minima, fechamento,
+        volume, quantidade_cotacoes, abertura_em, fechamento_em
+    )
+    SELECT
+        C.id_cripto,
+        I.intervalo,
+        date_bin(I.passo, C.data_hora, TIMESTAMP '2000-01-01'),
+        (array_agg(C.preco ORDER BY C.data_hora, C.id_cotacao))[1],
+        MAX(C.preco),
+        MIN(C.preco),
+        (array_agg(C.preco ORDER BY C.data_hora DESC, C.id_cotacao DESC))[1],
+        COALESCE(SUM(C.volume), 0),
+        COUNT(*),
+        MIN(C.data_hora),
+        MAX(C.data_hora)
+    FROM novas_cotacoes C
+    CROSS JOIN (
+        VALUES
+            ('1m', INTERVAL '1 minute'),
+            ('5m', INTERVAL '5 minutes'),
+            ('1h', INTERVAL '1 hour'),
+            ('1d', INTERVAL '1 day')
+    ) AS I (intervalo, passo)
+    WHERE C.id_cripto IS NOT NULL
+    GROUP BY 1, 2, 3
+    ON CONFLICT (id_cripto, intervalo, inicio) DO UPDATE SET
+        abertura = CASE
+            WHEN EXCLUDED.abertura_em < Candles.abertura_em THEN EXCLUDED.abertura
+            ELSE Candles.abertura
+        END,
+        fechamento = CASE
+            WHEN EXCLUDED.fechamento_em >= Candles.fechamento_em THEN EXCLUDED.fechamento
+            ELSE Candles.fechamento
+        END,
+        maxima = GREATEST(Candles.maxima, EXCLUDED.maxima),
+        minima = LEAST(Candles.minima, EXCLUDED.minima),
+        volume = Candles.volume + EXCLUDED.volume,
+        quantidade_cotacoes = Candles.quantidade_cotacoes + EXCLUDED.quantidade_cotacoes,
+        abertura_em = LEAST(Candles.abertura_em, EXCLUDED.abertura_em),
+        fechamento_em = GREATEST(Candles.fechamento_em, EXCLUDED.fechamento_em);
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS cotacoes_candles ON Cotações;
+
+CREATE TRIGGER cotacoes_candles
+AFTER INSERT ON Cotações
+REFERENCING NEW TABLE AS novas_cotacoes
+FOR EACH STATEMENT
+EXECUTE FUNCTION atualizar_candles ();
+
+-- Recalcula todos os candles a partir das cotações. Os candles só são
+-- mantidos em inserções; rode após apagar ou corrigir cotações.
+CREATE OR REPLACE PROCEDURE reconstruir_candles ()
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    LOCK TABLE Cotações IN SHARE MODE;
+    DELETE FROM Candles;
+    INSERT INTO Candles (
+        id_cripto, intervalo, inicio, abertura, maxima, minima, fechamento,
+        volume, quantidade_cotacoes, abertura_em, fechamento_em
+    )
+    SELECT
+        C.id_cripto,
+        I.intervalo,
+        date_bin(I.passo, C.data_hora, TIMESTAMP '2000-01-01'),
+        (array_agg(C.preco ORDER BY C.data_hora, C.id_cotacao))[1],
+        MAX(C.preco),
+        MIN(C.preco),
+        (array_agg(C.preco ORDER BY C.data_hora DESC, C.id_cotacao DESC))[1],
+        COALESCE(SUM(C.volume), 0),
+        COUNT(*),
+        MIN(C.data_hora),
+        MAX(C.data_hora)
+    FROM Cotações C
+    CROSS JOIN (
+        VALUES
+            ('1m', INTERVAL '1 minute'),
+            ('5m', INTERVAL '5 minutes'),
+            ('1h', INTERVAL '1 hour'),
+            ('1d', INTERVAL '1 day')
+    ) AS I (intervalo, passo)
+    WHERE C.id_cripto IS NOT NULL
+    GROUP BY 1, 2, 3;
+END;
+$$;
+
+-- Só preenche uma tabela recém-criada: depois de arquivar cotações, recalcular
+-- perderia os candles dos meses que saíram do Postgres.
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM Candles) THEN
+        CALL reconstruir_candles();
+    END IF;
+END;
+$$;
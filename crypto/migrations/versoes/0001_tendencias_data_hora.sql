@@ -0,0 +1,5 @@
+-- Bancos criados antes da paginação por (data_hora, id) não têm a coluna.
+ALTER TABLE Tendências_Preço
+    ADD COLUMN IF NOT EXISTS data_hora TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP;
+
+COMMENT ON COLUMN Tendências_Preço.data_hora IS 'Data e hora do cálculo da tendência';
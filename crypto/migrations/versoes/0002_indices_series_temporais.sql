@@ -0,0 +1,43 @@
+-- migracao: sem-transacao
+-- Índices para as consultas por criptomoeda ordenadas por tempo e para as
+-- chaves estrangeiras usadas nos joins. Criados com CONCURRENTLY para não
+-- bloquear escritas em um banco em produção.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS cotacoes_cripto_data_hora
+    ON Cotações (id_cripto, data_hora DESC, id_cotacao DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS transacoes_cripto_data_hora
+    ON Transações_Mercado (id_cripto, data_hora DESC, id_transacao DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS tendencias_cripto_data_hora
+    ON Tendências_Preço (id_cripto, data_hora DESC, id_tendencia DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS dados_externos_data_hora
+    ON Dados_Externos (data_hora DESC, id_dado DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS noticias_data_publicacao
+    ON Notícias (data_publicacao DESC, id_noticia DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS noticias_cripto
+    ON Notícias (id_cripto);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS sentimentos_noticia
+    ON Sentimentos_Notícias (id_noticia);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS sentimentos_usuario
+    ON Sentimentos_Notícias (id_usuario);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ordens_cripto
+    ON Ordens (id_cripto, id_ordem);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS imagens_cripto_tipo
+    ON Imagens_Criptomoedas (id_cripto, tipo, id_imagem DESC);
+
+ANALYZE Cotações;
+ANALYZE Transações_Mercado;
+ANALYZE Tendências_Preço;
+ANALYZE Dados_Externos;
+ANALYZE Notícias;
+ANALYZE Sentimentos_Notícias;
+ANALYZE Ordens;
+ANALYZE Imagens_Criptomoedas;
@@ -0,0 +1,81 @@
+-- Contagem, soma e média dos scores de cada notícia, mantidas por gatilho a
+-- cada escrita em Sentimentos_Notícias, no lugar do AVG sobre a tabela toda
+-- feito pela view Todas_Notícias.
+
+CREATE TABLE Sentimentos_Agregados (
+    id_noticia INT PRIMARY KEY REFERENCES Notícias (id_noticia) ON DELETE CASCADE, -- Referência à notícia
+    quantidade INT NOT NULL DEFAULT 0, -- Número de sentimentos com score
+    soma_score DECIMAL(18, 2) NOT NULL DEFAULT 0, -- Soma dos scores
+    score_medio DECIMAL GENERATED ALWAYS AS (soma_score / NULLIF(quantidade, 0)) STORED -- Média dos scores
+);
+
+COMMENT ON TABLE Sentimentos_Agregados IS 'Tabela que armazena a contagem, a soma e a média dos scores de sentimento de cada notícia.';
+COMMENT ON COLUMN Sentimentos_Agregados.id_noticia IS 'Referência à notícia';
+COMMENT ON COLUMN Sentimentos_Agregados.quantidade IS 'Número de sentimentos com score';
+COMMENT ON COLUMN Sentimentos_Agregados.soma_score IS 'Soma dos scores';
+COMMENT ON COLUMN Sentimentos_Agregados.score_medio IS 'Média dos scores';
+
+CREATE OR REPLACE FUNCTION somar_sentimento (noticia INT, delta_quantidade INT, delta_soma DECIMAL)
+RETURNS VOID
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF noticia IS NULL OR delta_quantidade = 0 THEN
+        RETURN;
+    END IF;
+    INSERT INTO Sentimentos_Agregados (id_noticia, quantidade, soma_score)
+    VALUES (noticia, delta_quantidade, delta_soma)
+    ON CONFLICT (id_noticia) DO UPDATE SET
+        quantidade = Sentimentos_Agregados.quantidade + EXCLUDED.quantidade,
+        soma_score = Sentimentos_Agregados.soma_score + EXCLUDED.soma_score;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION atualizar_sentimentos_agregados ()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.score_sentimento IS NOT NULL THEN
+        PERFORM somar_sentimento(OLD.id_noticia, -1, -OLD.score_sentimento);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.score_sentimento IS NOT NULL THEN
+        PERFORM somar_sentimento(NEW.id_noticia, 1, NEW.score_sentimento);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+-- Recalcula os agregados a partir de Sentimentos_Notícias.
+CREATE OR REPLACE PROCEDURE reconstruir_sentimentos_agregados ()
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    LOCK TABLE Sentimentos_Notícias IN SHARE ROW EXCLUSIVE MODE;
+    DELETE FROM Sentimentos_Agregados;
+    INSERT INTO Sentimentos_Agregados (id_noticia, quantidade, soma_score)
+    SELECT S.id_noticia, COUNT(S.score_sentimento), SUM(S.score_sentimento)
+    FROM Sentimentos_Notícias S
+    WHERE S.id_noticia IS NOT NULL AND S.score_sentimento IS NOT NULL
+    GROUP BY S.id_noticia;
+END;
+$$;
+
+CREATE TRIGGER sentimentos_agregados
+AFTER INSERT OR DELETE OR UPDATE OF id_noticia, score_sentimento ON Sentimentos_Notícias
+FOR EACH ROW
+EXECUTE FUNCTION atualizar_sentimentos_agregados ();
+
+CALL reconstruir_sentimentos_agregados();
+
+CREATE OR REPLACE VIEW Todas_Notícias AS
+SELECT
+    N.id_noticia,
+    N.id_cripto,
+    N.data_publicacao,
+    N.tema,
+    N.noticia,
+    N.fonte,
+    A.score_medio
+FROM Notícias N
+LEFT JOIN Sentimentos_Agregados A ON N.id_noticia = A.id_noticia;
@@ -0,0 +1,15 @@
+-- Versões redimensionadas e recomprimidas das imagens, geradas após o upload.
+
+CREATE TABLE Imagens_Variantes (
+    id_imagem INT REFERENCES Imagens_Criptomoedas (id_imagem) ON DELETE CASCADE, -- Referência à imagem original
+    largura INT NOT NULL, -- Largura da variante em pixels
+    formato VARCHAR(10) NOT NULL, -- Formato da variante (png, webp)
+    conteudo BYTEA NOT NULL, -- Conteúdo da variante armazenado como binário
+    PRIMARY KEY (id_imagem, largura, formato)
+);
+
+COMMENT ON TABLE Imagens_Variantes IS 'Tabela que armazena versões redimensionadas e recomprimidas das imagens das criptomoedas.';
+COMMENT ON COLUMN Imagens_Variantes.id_imagem IS 'Referência à imagem original';
+COMMENT ON COLUMN Imagens_Variantes.largura IS 'Largura da variante em pixels';
+COMMENT ON COLUMN Imagens_Variantes.formato IS 'Formato da variante (png, webp)';
+COMMENT ON COLUMN Imagens_Variantes.conteudo IS 'Conteúdo da variante armazenado como binário';
@@ -0,0 +1,41 @@
+-- Versão do livro de ofertas de cada criptomoeda, incrementada a cada
+-- escrita em Ordens. Cada processo do servidor guarda o livro em memória e o
+-- recarrega quando a versão no banco não é a que ele conhece.
+
+CREATE TABLE Ordens_Versoes (
+    id_cripto INT PRIMARY KEY REFERENCES Criptomoedas (id_cripto) ON DELETE CASCADE, -- Referência à criptomoeda
+    versao BIGINT NOT NULL DEFAULT 0 -- Número de escritas já feitas nas ordens da criptomoeda
+);
+
+COMMENT ON TABLE Ordens_Versoes IS 'Tabela que registra a versão do livro de ofertas de cada criptomoeda.';
+COMMENT ON COLUMN Ordens_Versoes.id_cripto IS 'Referência à criptomoeda';
+COMMENT ON COLUMN Ordens_Versoes.versao IS 'Número de escritas já feitas nas ordens da criptomoeda';
+
+CREATE OR REPLACE FUNCTION incrementar_versao_livro ()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    cripto INT;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        cripto := OLD.id_cripto;
+    ELSE
+        cripto := NEW.id_cripto;
+    END IF;
+    IF TG_OP = 'UPDATE' AND OLD.id_cripto IS DISTINCT FROM NEW.id_cripto AND OLD.id_cripto IS NOT NULL THEN
+        UPDATE Ordens_Versoes SET versao = versao + 1 WHERE id_cripto = OLD.id_cripto;
+    END IF;
+    IF cripto IS NOT NULL THEN
+        INSERT INTO Ordens_Versoes (id_cripto, versao)
+        VALUES (cripto, 1)
+        ON CONFLICT (id_cripto) DO UPDATE SET versao = Ordens_Versoes.versao + 1;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER ordens_versao_livro
+AFTER INSERT OR UPDATE OR DELETE ON Ordens
+FOR EACH ROW
+EXECUTE FUNCTION incrementar_versao_livro ();
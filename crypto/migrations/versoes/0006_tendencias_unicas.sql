@@ -0,0 +1,25 @@
+-- Uma tendência por criptomoeda e período, atualizada no lugar pelo motor de
+-- tendências. Bancos antigos podem ter várias linhas por par: fica a mais
+-- recente.
+DELETE FROM Tendências_Preço T
+USING Tendências_Preço R
+WHERE T.id_cripto = R.id_cripto
+  AND T.periodo = R.periodo
+  AND (T.data_hora, T.id_tendencia) < (R.data_hora, R.id_tendencia);
+
+ALTER TABLE Tendências_Preço
+    ADD CONSTRAINT tendencias_cripto_periodo UNIQUE (id_cripto, periodo);
+
+-- Última cotação já considerada pelo motor de tendências.
+CREATE TABLE Tendencias_Progresso (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id), -- Garante uma única linha
+    ultima_cotacao INT NOT NULL DEFAULT 0, -- Maior id_cotacao já processado
+    executada_em TIMESTAMP -- Data e hora da última execução
+);
+
+COMMENT ON TABLE Tendencias_Progresso IS 'Tabela que registra até qual cotação as tendências de preço já foram calculadas.';
+COMMENT ON COLUMN Tendencias_Progresso.id IS 'Garante uma única linha';
+COMMENT ON COLUMN Tendencias_Progresso.ultima_cotacao IS 'Maior id_cotacao já processado';
+COMMENT ON COLUMN Tendencias_Progresso.executada_em IS 'Data e hora da última execução';
+
+INSERT INTO Tendencias_Progresso DEFAULT VALUES;
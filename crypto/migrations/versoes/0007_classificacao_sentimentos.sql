@@ -0,0 +1,85 @@
+-- Classificação dos sentimentos feita na escrita, por gatilho, com limiares
+-- configuráveis. O procedimento atualizar_sentimentos passa a reescrever só
+-- as linhas cuja classificação mudou, em lotes com COMMIT entre eles.
+
+CREATE TABLE Sentimentos_Limiares (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id), -- Garante uma única linha
+    positivo DECIMAL(5, 2) NOT NULL DEFAULT 0.5, -- Score acima do qual o sentimento é positivo
+    negativo DECIMAL(5, 2) NOT NULL DEFAULT -0.5, -- Score abaixo do qual o sentimento é negativo
+    CHECK (negativo <= positivo)
+);
+
+COMMENT ON TABLE Sentimentos_Limiares IS 'Tabela que armazena os limiares de score usados para classificar os sentimentos.';
+COMMENT ON COLUMN Sentimentos_Limiares.id IS 'Garante uma única linha';
+COMMENT ON COLUMN Sentimentos_Limiares.positivo IS 'Score acima do qual o sentimento é positivo';
+COMMENT ON COLUMN Sentimentos_Limiares.negativo IS 'Score abaixo do qual o sentimento é negativo';
+
+INSERT INTO Sentimentos_Limiares DEFAULT VALUES;
+
+CREATE OR REPLACE FUNCTION classificar_sentimento (score DECIMAL, positivo DECIMAL, negativo DECIMAL)
+RETURNS VARCHAR
+LANGUAGE sql
+IMMUTABLE
+AS $$
+    SELECT CASE
+        WHEN score > positivo THEN 'Positivo'
+        WHEN score < negativo THEN 'Negativo'
+        ELSE 'Neutro'
+    END;
+$$;
+
+CREATE OR REPLACE FUNCTION classificar_sentimento_escrito ()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    limiares Sentimentos_Limiares;
+BEGIN
+    SELECT * INTO limiares FROM Sentimentos_Limiares;
+    NEW.sentimento := classificar_sentimento(NEW.score_sentimento, limiares.positivo, limiares.negativo);
+    RETURN NEW;
+END;
+$$;
+
+CREATE TRIGGER sentimentos_classificacao
+BEFORE INSERT OR UPDATE OF sentimento, score_sentimento ON Sentimentos_Notícias
+FOR EACH ROW
+EXECUTE FUNCTION classificar_sentimento_escrito ();
+
+-- Reclassifica as linhas cuja classificação não bate com os limiares atuais
+-- (por exemplo, depois de alterá-los), percorrendo a tabela por id_sentimento
+-- em lotes de até "lote" linhas. Linhas já corretas não são reescritas.
+DROP PROCEDURE IF EXISTS atualizar_sentimentos ();
+
+CREATE OR REPLACE PROCEDURE atualizar_sentimentos (lote INT DEFAULT 5000)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    ultimo INT := 0;
+    proximo INT;
+BEGIN
+    LOOP
+        WITH Lote AS (
+            SELECT S.id_sentimento
+            FROM Sentimentos_Notícias S
+            CROSS JOIN Sentimentos_Limiares L
+            WHERE S.id_sentimento > ultimo
+              AND S.sentimento IS DISTINCT FROM
+                  classificar_sentimento(S.score_sentimento, L.positivo, L.negativo)
+            ORDER BY S.id_sentimento
+            LIMIT lote
+        ), Atualizadas AS (
+            -- O gatilho sentimentos_classificacao calcula a nova classificação.
+            UPDATE Sentimentos_Notícias S
+            SET sentimento = NULL
+            FROM Lote
+            WHERE S.id_sentimento = Lote.id_sentimento
+            RETURNING S.id_sentimento
+        )
+        SELECT MAX(id_sentimento) INTO proximo FROM Atualizadas;
+        EXIT WHEN proximo IS NULL;
+        ultimo := proximo;
+        COMMIT;
+    END LOOP;
+END;
+$$;
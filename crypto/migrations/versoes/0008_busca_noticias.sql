@@ -0,0 +1,15 @@
+-- migracao: sem-transacao
+-- Busca textual nas notícias: vetor em português do tema (peso A) e do texto
+-- (peso B), mantido pelo próprio Postgres como coluna gerada, e índice GIN
+-- criado com CONCURRENTLY para não bloquear escritas.
+
+ALTER TABLE Notícias
+    ADD COLUMN IF NOT EXISTS busca TSVECTOR GENERATED ALWAYS AS (
+        setweight(to_tsvector('portuguese', coalesce(tema, '')), 'A')
+        || setweight(to_tsvector('portuguese', noticia), 'B')
+    ) STORED;
+
+COMMENT ON COLUMN Notícias.busca IS 'Vetor de busca textual do tema e do texto da notícia';
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS noticias_busca
+    ON Notícias USING GIN (busca);
@@ -0,0 +1,23 @@
+-- Avisa os processos do servidor, pelo canal "invalidacao_cache", que uma
+-- tabela de referência mudou. O NOTIFY só é entregue no COMMIT, então nenhum
+-- processo recarrega dados ainda não confirmados.
+
+CREATE OR REPLACE FUNCTION notificar_invalidacao_cache ()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM pg_notify('invalidacao_cache', lower(TG_TABLE_NAME));
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER criptomoedas_invalidacao_cache
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON Criptomoedas
+FOR EACH STATEMENT
+EXECUTE FUNCTION notificar_invalidacao_cache ();
+
+CREATE TRIGGER usuarios_invalidacao_cache
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON Usuarios
+FOR EACH STATEMENT
+EXECUTE FUNCTION notificar_invalidacao_cache ();
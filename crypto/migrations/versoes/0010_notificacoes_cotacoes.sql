@@ -0,0 +1,33 @@
+-- Publica as cotações novas no canal "cotacoes" para a transmissão ao vivo.
+-- O gatilho é por comando: um COPY de milhares de linhas gera uma só
+-- notificação por criptomoeda, com a cotação mais recente do lote.
+
+CREATE OR REPLACE FUNCTION notificar_cotacoes ()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM pg_notify('cotacoes', json_build_object(
+        'id_cotacao', C.id_cotacao,
+        'id_cripto', C.id_cripto,
+        'data_hora', C.data_hora,
+        'preco', C.preco,
+        'volume', C.volume,
+        'market_cap', C.market_cap,
+        'variacao', C.variacao
+    )::TEXT)
+    FROM (
+        SELECT DISTINCT ON (id_cripto) *
+        FROM novas_cotacoes
+        WHERE id_cripto IS NOT NULL
+        ORDER BY id_cripto, data_hora DESC, id_cotacao DESC
+    ) C;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER cotacoes_notificacao
+AFTER INSERT ON Cotações
+REFERENCING NEW TABLE AS novas_cotacoes
+FOR EACH STATEMENT
+EXECUTE FUNCTION notificar_cotacoes ();
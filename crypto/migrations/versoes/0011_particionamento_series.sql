@@ -0,0 +1,213 @@
+-- Particiona Cotações e Transações_Mercado por mês de data_hora. Cada mês
+-- vira uma tabela própria, então vacuum e índices trabalham só nos meses que
+-- mudam, e o histórico antigo sai com um DROP (ou DETACH) em vez de um DELETE.
+-- `python -m crypto particoes manter` cria os meses seguintes e aplica a
+-- retenção; linhas fora de qualquer mês criado caem na partição padrão.
+--
+-- A chave primária passa a incluir data_hora, exigência do Postgres para
+-- tabelas particionadas. Os ids continuam vindo das mesmas sequências.
+
+-- Cria a partição do mês de ``mes`` numa tabela particionada por data_hora,
+-- se ainda não existir, movendo para ela as linhas do mês que estiverem na
+-- partição padrão. A partição é montada à parte e anexada no fim, o que só
+-- trava a tabela mãe em SHARE UPDATE EXCLUSIVE.
+CREATE OR REPLACE FUNCTION criar_particao_mensal (tabela REGCLASS, mes DATE)
+RETURNS TEXT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    inicio TIMESTAMP := date_trunc('month', mes);
+    fim TIMESTAMP := date_trunc('month', mes) + INTERVAL '1 month';
+    esquema TEXT;
+    nome TEXT;
+    padrao REGCLASS;
+BEGIN
+    SELECT N.nspname, C.relname || '_' || to_char(inicio, 'YYYY_MM')
+    INTO esquema, nome
+    FROM pg_class C
+    JOIN pg_namespace N ON N.oid = C.relnamespace
+    WHERE C.oid = tabela;
+    IF to_regclass(format('%I.%I', esquema, nome)) IS NOT NULL THEN
+        RETURN NULL;
+    END IF;
+
+    EXECUTE format(
+        'CREATE TABLE %I.%I (LIKE %s INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+        esquema, nome, tabela
+    );
+    SELECT NULLIF(partdefid, 0)::REGCLASS INTO padrao
+    FROM pg_partitioned_table
+    WHERE partrelid = tabela;
+    IF padrao IS NOT NULL THEN
+        EXECUTE format(
+            'WITH Movidas AS (DELETE FROM %s WHERE data_hora >= $1 AND data_hora < $2 RETURNING *) '
+            'INSERT INTO %I.%I SELECT * FROM Movidas',
+            padrao, esquema, nome
+        ) USING inicio, fim;
+    END IF;
+    EXECUTE format(
+        'ALTER TABLE %s ATTACH PARTITION %I.%I FOR VALUES FROM (%L) TO (%L)',
+        tabela, esquema, nome, inicio, fim
+    );
+    RETURN nome;
+END;
+$$;
+
+-- Remove as partições mensais que terminam até ``antes``, ou só as desanexa,
+-- deixando-as como tabelas avulsas para arquivar. A partição padrão fica.
+CREATE OR REPLACE FUNCTION remover_particoes_antigas (
+    tabela REGCLASS,
+    antes TIMESTAMP,
+    desanexar BOOLEAN DEFAULT FALSE
+)
+RETURNS SETOF TEXT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    particao REGCLASS;
+BEGIN
+    FOR particao IN
+        SELECT P.particao
+        FROM (
+            SELECT C.oid::REGCLASS AS particao,
+                   substring(
+                       pg_get_expr(C.relpartbound, C.oid) FROM 'TO \(''([^'']+)''\)'
+                   )::TIMESTAMP AS fim
+            FROM pg_inherits I
+            JOIN pg_class C ON C.oid = I.inhrelid
+            WHERE I.inhparent = tabela
+        ) P
+        WHERE P.fim <= antes
+        ORDER BY P.fim
+    LOOP
+        IF desanexar THEN
+            EXECUTE format('ALTER TABLE %s DETACH PARTITION %s', tabela, particao);
+        ELSE
+            EXECUTE format('DROP TABLE %s', particao);
+        END IF;
+        RETURN NEXT particao::TEXT;
+    END LOOP;
+END;
+$$;
+
+-- Cria os meses do histórico existente até três meses à frente.
+CREATE OR REPLACE FUNCTION criar_particoes_ate (tabela REGCLASS, desde TIMESTAMP)
+RETURNS VOID
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    mes TIMESTAMP;
+BEGIN
+    FOR mes IN
+        SELECT generate_series(
+            date_trunc('month', LEAST(COALESCE(desde, LOCALTIMESTAMP), LOCALTIMESTAMP)),
+            date_trunc('month', LOCALTIMESTAMP) + INTERVAL '3 months',
+            INTERVAL '1 month'
+        )
+    LOOP
+        PERFORM criar_particao_mensal(tabela, mes::DATE);
+    END LOOP;
+END;
+$$;
+
+-- Cotações
+
+ALTER TABLE Cotações RENAME TO Cotações_Antiga;
+ALTER TABLE Cotações_Antiga RENAME CONSTRAINT cotações_pkey TO cotações_antiga_pkey;
+ALTER INDEX cotacoes_cripto_data_hora RENAME TO cotacoes_antiga_cripto_data_hora;
+ALTER SEQUENCE cotações_id_cotacao_seq OWNED BY NONE;
+
+CREATE TABLE Cotações (
+    id_cotacao INT NOT NULL DEFAULT nextval('cotações_id_cotacao_seq'), -- Identificador único da cotação
+    id_cripto INT REFERENCES Criptomoedas (id_cripto), -- Referência à criptomoeda
+    data_hora TIMESTAMP NOT NULL, -- Data e hora da cotação
+    preco DECIMAL(18, 8) NOT NULL, -- Preço da criptomoeda
+    volume DECIMAL(18, 2), -- Volume negociado
+    market_cap DECIMAL(18, 2), -- Capitalização de mercado
+    variacao DECIMAL(5, 2), -- Variação percentual do preço
+    PRIMARY KEY (id_cotacao, data_hora)
+) PARTITION BY RANGE (data_hora);
+
+CREATE INDEX cotacoes_cripto_data_hora
+    ON Cotações (id_cripto, data_hora DESC, id_cotacao DESC);
+
+CREATE TABLE Cotações_Padrao PARTITION OF Cotações DEFAULT;
+
+SELECT criar_particoes_ate('Cotações', (SELECT MIN(data_hora) FROM Cotações_Antiga));
+
+INSERT INTO Cotações (id_cotacao, id_cripto, data_hora, preco, volume, market_cap, variacao)
+SELECT id_cotacao, id_cripto, data_hora, preco, volume, market_cap, variacao
+FROM Cotações_Antiga;
+
+DROP TABLE Cotações_Antiga;
+ALTER SEQUENCE cotações_id_cotacao_seq OWNED BY Cotações.id_cotacao;
+
+-- Os gatilhos são recriados depois da cópia: as cotações copiadas já estão
+-- nos candles e não devem ser notificadas de novo.
+CREATE TRIGGER cotacoes_candles
+AFTER INSERT ON Cotações
+REFERENCING NEW TABLE AS novas_cotacoes
+FOR EACH STATEMENT
+EXECUTE FUNCTION atualizar_candles ();
+
+CREATE TRIGGER cotacoes_notificacao
+AFTER INSERT ON Cotações
+REFERENCING NEW TABLE AS novas_cotacoes
+FOR EACH STATEMENT
+EXECUTE FUNCTION notificar_cotacoes ();
+
+COMMENT ON TABLE Cotações IS 'Tabela que armazena informações sobre cotações das criptomoedas, incluindo preço, volume e market cap. Particionada por mês de data_hora.';
+COMMENT ON COLUMN Cotações.id_cotacao IS 'Identificador único da cotação';
+COMMENT ON COLUMN Cotações.id_cripto IS 'Referência à criptomoeda';
+COMMENT ON COLUMN Cotações.data_hora IS 'Data e hora da cotação';
+COMMENT ON COLUMN Cotações.preco IS 'Preço da criptomoeda';
+COMMENT ON COLUMN Cotações.volume IS 'Volume negociado';
+COMMENT ON COLUMN Cotações.market_cap IS 'Capitalização de mercado';
+COMMENT ON COLUMN Cotações.variacao IS 'Variação percentual do preço';
+
+-- Transações_Mercado
+
+ALTER TABLE Transações_Mercado RENAME TO Transações_Mercado_Antiga;
+ALTER TABLE Transações_Mercado_Antiga
+    RENAME CONSTRAINT transações_mercado_pkey TO transações_mercado_antiga_pkey;
+ALTER INDEX transacoes_cripto_data_hora RENAME TO transacoes_antiga_cripto_data_hora;
+ALTER SEQUENCE transações_mercado_id_transacao_seq OWNED BY NONE;
+
+CREATE TABLE Transações_Mercado (
+    id_transacao INT NOT NULL DEFAULT nextval('transações_mercado_id_transacao_seq'), -- Identificador único da transação
+    id_cripto INT REFERENCES Criptomoedas (id_cripto), -- Referência à criptomoeda
+    data_hora TIMESTAMP NOT NULL, -- Data e hora da transação
+    tipo VARCHAR(20) NOT NULL, -- Tipo da transação (compra, venda)
+    quantidade DECIMAL(18, 8) NOT NULL, -- Quantidade negociada
+    preco_unitario DECIMAL(18, 8) NOT NULL, -- Preço unitário da criptomoeda
+    PRIMARY KEY (id_transacao, data_hora)
+) PARTITION BY RANGE (data_hora);
+
+CREATE INDEX transacoes_cripto_data_hora
+    ON Transações_Mercado (id_cripto, data_hora DESC, id_transacao DESC);
+
+CREATE TABLE Transações_Mercado_Padrao PARTITION OF Transações_Mercado DEFAULT;
+
+SELECT criar_particoes_ate(
+    'Transações_Mercado', (SELECT MIN(data_hora) FROM Transações_Mercado_Antiga)
+);
+
+INSERT INTO Transações_Mercado (id_transacao, id_cripto, data_hora, tipo, quantidade, preco_unitario)
+SELECT id_transacao, id_cripto, data_hora, tipo, quantidade, preco_unitario
+FROM Transações_Mercado_Antiga;
+
+DROP TABLE Transações_Mercado_Antiga;
+ALTER SEQUENCE transações_mercado_id_transacao_seq OWNED BY Transações_Mercado.id_transacao;
+
+COMMENT ON TABLE Transações_Mercado IS 'Tabela que registra as transações realizadas no mercado de criptomoedas. Particionada por mês de data_hora.';
+COMMENT ON COLUMN Transações_Mercado.id_transacao IS 'Identificador único da transação';
+COMMENT ON COLUMN Transações_Mercado.id_cripto IS 'Referência à criptomoeda';
+COMMENT ON COLUMN Transações_Mercado.data_hora IS 'Data e hora da transação';
+COMMENT ON COLUMN Transações_Mercado.tipo IS 'Tipo da transação (compra, venda)';
+COMMENT ON COLUMN Transações_Mercado.quantidade IS 'Quantidade negociada';
+COMMENT ON COLUMN Transações_Mercado.preco_unitario IS 'Preço unitário da criptomoeda';
+
+DROP FUNCTION criar_particoes_ate (REGCLASS, TIMESTAMP);
+
+ANALYZE Cotações;
+ANALYZE Transações_Mercado;
@@ -0,0 +1,25 @@
+-- Meses de cotações movidos do Postgres para arquivos Parquet, um por
+-- criptomoeda e mês (`python -m crypto arquivo cotacoes`). As leituras de
+-- Cotações consultam esta tabela para saber onde completar com o arquivo.
+
+CREATE TABLE Cotações_Arquivadas (
+    id_cripto INT NOT NULL REFERENCES Criptomoedas (id_cripto), -- Referência à criptomoeda
+    mes DATE NOT NULL, -- Primeiro dia do mês arquivado
+    caminho VARCHAR(255) NOT NULL, -- Arquivo Parquet, relativo ao diretório do arquivo
+    linhas INT NOT NULL, -- Número de cotações no arquivo
+    arquivada_em TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP, -- Data e hora do último arquivamento do mês
+    PRIMARY KEY (id_cripto, mes)
+);
+
+COMMENT ON TABLE Cotações_Arquivadas IS 'Tabela que registra os meses de cotações de cada criptomoeda movidos para arquivos Parquet.';
+COMMENT ON COLUMN Cotações_Arquivadas.id_cripto IS 'Referência à criptomoeda';
+COMMENT ON COLUMN Cotações_Arquivadas.mes IS 'Primeiro dia do mês arquivado';
+COMMENT ON COLUMN Cotações_Arquivadas.caminho IS 'Arquivo Parquet, relativo ao diretório do arquivo';
+COMMENT ON COLUMN Cotações_Arquivadas.linhas IS 'Número de cotações no arquivo';
+COMMENT ON COLUMN Cotações_Arquivadas.arquivada_em IS 'Data e hora do último arquivamento do mês';
+
+-- Os processos do servidor guardam esta tabela no cache de referências.
+CREATE TRIGGER cotacoes_arquivadas_invalidacao_cache
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON Cotações_Arquivadas
+FOR EACH STATEMENT
+EXECUTE FUNCTION notificar_invalidacao_cache ();
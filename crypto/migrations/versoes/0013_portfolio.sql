@@ -0,0 +1,116 @@
+-- Carteira calculada a partir de Transações_Mercado pelo motor de portfólio
+-- (crypto/portfolio.py): posição, custo e P&L realizado de cada criptomoeda,
+-- com os lotes casados em ordem FIFO. Cada transação nova entra numa fila por
+-- gatilho e é aplicada uma única vez sobre o estado salvo, sem reprocessar o
+-- histórico.
+
+CREATE TABLE Portfolio_Posicoes (
+    id_cripto INT PRIMARY KEY REFERENCES Criptomoedas (id_cripto) ON DELETE CASCADE, -- Referência à criptomoeda
+    quantidade DECIMAL(28, 8) NOT NULL DEFAULT 0, -- Posição: positiva se comprada, negativa se vendida
+    custo DECIMAL(38, 16) NOT NULL DEFAULT 0, -- Custo dos lotes em aberto
+    pnl_realizado DECIMAL(38, 16) NOT NULL DEFAULT 0, -- Lucro ou prejuízo dos lotes já fechados
+    empilhado DECIMAL(28, 8) NOT NULL DEFAULT 0, -- Quantidade total já aberta em lotes
+    consumido DECIMAL(28, 8) NOT NULL DEFAULT 0, -- Quantidade total já fechada dos lotes
+    transacoes INT NOT NULL DEFAULT 0, -- Número de transações aplicadas
+    atualizada_em TIMESTAMP -- Data e hora da última transação aplicada
+);
+
+COMMENT ON TABLE Portfolio_Posicoes IS 'Tabela que armazena a posição e o P&L realizado de cada criptomoeda, mantidos pelo motor de portfólio.';
+COMMENT ON COLUMN Portfolio_Posicoes.id_cripto IS 'Referência à criptomoeda';
+COMMENT ON COLUMN Portfolio_Posicoes.quantidade IS 'Posição: positiva se comprada, negativa se vendida';
+COMMENT ON COLUMN Portfolio_Posicoes.custo IS 'Custo dos lotes em aberto';
+COMMENT ON COLUMN Portfolio_Posicoes.pnl_realizado IS 'Lucro ou prejuízo dos lotes já fechados';
+COMMENT ON COLUMN Portfolio_Posicoes.empilhado IS 'Quantidade total já aberta em lotes';
+COMMENT ON COLUMN Portfolio_Posicoes.consumido IS 'Quantidade total já fechada dos lotes';
+COMMENT ON COLUMN Portfolio_Posicoes.transacoes IS 'Número de transações aplicadas';
+COMMENT ON COLUMN Portfolio_Posicoes.atualizada_em IS 'Data e hora da última transação aplicada';
+
+-- Os lotes formam uma fila por criptomoeda. ``inicio`` é a quantidade
+-- acumulada antes do lote, então os lotes fechados por uma venda são os de
+-- ``inicio`` menor que o novo total consumido: uma faixa da chave primária.
+CREATE TABLE Portfolio_Lotes (
+    id_cripto INT NOT NULL REFERENCES Criptomoedas (id_cripto) ON DELETE CASCADE, -- Referência à criptomoeda
+    inicio DECIMAL(28, 8) NOT NULL, -- Quantidade acumulada da fila antes do lote
+    quantidade DECIMAL(18, 8) NOT NULL, -- Quantidade aberta pelo lote
+    preco DECIMAL(18, 8) NOT NULL, -- Preço unitário do lote
+    data_hora TIMESTAMP NOT NULL, -- Data e hora da transação que abriu o lote
+    PRIMARY KEY (id_cripto, inicio)
+);
+
+COMMENT ON TABLE Portfolio_Lotes IS 'Tabela que armazena os lotes em aberto da carteira, em ordem FIFO.';
+COMMENT ON COLUMN Portfolio_Lotes.id_cripto IS 'Referência à criptomoeda';
+COMMENT ON COLUMN Portfolio_Lotes.inicio IS 'Quantidade acumulada da fila antes do lote';
+COMMENT ON COLUMN Portfolio_Lotes.quantidade IS 'Quantidade aberta pelo lote';
+COMMENT ON COLUMN Portfolio_Lotes.preco IS 'Preço unitário do lote';
+COMMENT ON COLUMN Portfolio_Lotes.data_hora IS 'Data e hora da transação que abriu o lote';
+
+-- Transações ainda não aplicadas. Uma fila, e não o maior id já visto, porque
+-- uma transação pode confirmar depois de outra com id maior.
+CREATE TABLE Portfolio_Pendentes (
+    data_hora TIMESTAMP NOT NULL, -- Data e hora da transação
+    id_transacao INT NOT NULL, -- Referência à transação
+    id_cripto INT NOT NULL REFERENCES Criptomoedas (id_cripto) ON DELETE CASCADE, -- Referência à criptomoeda
+    tipo VARCHAR(20) NOT NULL, -- Tipo da transação (compra, venda)
+    quantidade DECIMAL(18, 8) NOT NULL, -- Quantidade negociada
+    preco_unitario DECIMAL(18, 8) NOT NULL, -- Preço unitário da criptomoeda
+    PRIMARY KEY (data_hora, id_transacao)
+);
+
+COMMENT ON TABLE Portfolio_Pendentes IS 'Tabela que enfileira as transações de mercado ainda não aplicadas à carteira.';
+COMMENT ON COLUMN Portfolio_Pendentes.data_hora IS 'Data e hora da transação';
+COMMENT ON COLUMN Portfolio_Pendentes.id_transacao IS 'Referência à transação';
+COMMENT ON COLUMN Portfolio_Pendentes.id_cripto IS 'Referência à criptomoeda';
+COMMENT ON COLUMN Portfolio_Pendentes.tipo IS 'Tipo da transação (compra, venda)';
+COMMENT ON COLUMN Portfolio_Pendentes.quantidade IS 'Quantidade negociada';
+COMMENT ON COLUMN Portfolio_Pendentes.preco_unitario IS 'Preço unitário da criptomoeda';
+
+-- Linha travada por cada execução do motor, para os processos do servidor
+-- não aplicarem a mesma fila ao mesmo tempo.
+CREATE TABLE Portfolio_Progresso (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id), -- Garante uma única linha
+    executada_em TIMESTAMP -- Data e hora da última execução
+);
+
+COMMENT ON TABLE Portfolio_Progresso IS 'Tabela que registra a última execução do motor de portfólio.';
+COMMENT ON COLUMN Portfolio_Progresso.id IS 'Garante uma única linha';
+COMMENT ON COLUMN Portfolio_Progresso.executada_em IS 'Data e hora da última execução';
+
+INSERT INTO Portfolio_Progresso DEFAULT VALUES;
+
+CREATE OR REPLACE FUNCTION enfileirar_transacoes_portfolio ()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    INSERT INTO Portfolio_Pendentes (data_hora, id_transacao, id_cripto, tipo, quantidade, preco_unitario)
+    SELECT data_hora, id_transacao, id_cripto, tipo, quantidade, preco_unitario
+    FROM novas_transacoes
+    WHERE id_cripto IS NOT NULL;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER transacoes_portfolio
+AFTER INSERT ON Transações_Mercado
+REFERENCING NEW TABLE AS novas_transacoes
+FOR EACH STATEMENT
+EXECUTE FUNCTION enfileirar_transacoes_portfolio ();
+
+-- Zera a carteira e enfileira todo o histórico de novo. Rode após apagar ou
+-- corrigir transações; a próxima execução do motor refaz tudo.
+CREATE OR REPLACE PROCEDURE reconstruir_portfolio ()
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM 1 FROM Portfolio_Progresso FOR UPDATE;
+    DELETE FROM Portfolio_Lotes;
+    DELETE FROM Portfolio_Posicoes;
+    DELETE FROM Portfolio_Pendentes;
+    INSERT INTO Portfolio_Pendentes (data_hora, id_transacao, id_cripto, tipo, quantidade, preco_unitario)
+    SELECT data_hora, id_transacao, id_cripto, tipo, quantidade, preco_unitario
+    FROM Transações_Mercado
+    WHERE id_cripto IS NOT NULL;
+END;
+$$;
+
+CALL reconstruir_portfolio();
@@ -0,0 +1,49 @@
+-- Criptomoedas com cotações ainda não consideradas pelo motor de tendências.
+-- Uma fila preenchida por gatilho, e não o maior id_cotacao já visto, porque
+-- o id é reservado antes do commit: uma cotação de uma transação que
+-- confirma depois de outra com id maior nunca seria vista. Sem chave
+-- primária, para inserções concorrentes da mesma criptomoeda não esperarem
+-- umas pelas outras; o motor remove as repetições ao retirar.
+
+CREATE TABLE Tendencias_Pendentes (
+    id_cripto INT NOT NULL REFERENCES Criptomoedas (id_cripto) ON DELETE CASCADE -- Referência à criptomoeda
+);
+
+COMMENT ON TABLE Tendencias_Pendentes IS 'Tabela que enfileira as criptomoedas com cotações novas para o motor de tendências.';
+COMMENT ON COLUMN Tendencias_Pendentes.id_cripto IS 'Referência à criptomoeda';
+
+CREATE INDEX idx_tendencias_pendentes_cripto ON Tendencias_Pendentes (id_cripto);
+
+CREATE OR REPLACE FUNCTION enfileirar_tendencias ()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    INSERT INTO Tendencias_Pendentes (id_cripto)
+    SELECT DISTINCT id_cripto
+    FROM novas_cotacoes
+    WHERE id_cripto IS NOT NULL;
+    RETURN NULL;
+END;
+$$;
+
+-- Um gatilho com tabela de transição só pode ter um evento.
+CREATE TRIGGER cotacoes_tendencias
+AFTER INSERT ON Cotações
+REFERENCING NEW TABLE AS novas_cotacoes
+FOR EACH STATEMENT
+EXECUTE FUNCTION enfileirar_tendencias ();
+
+CREATE TRIGGER cotacoes_tendencias_atualizadas
+AFTER UPDATE ON Cotações
+REFERENCING NEW TABLE AS novas_cotacoes
+FOR EACH STATEMENT
+EXECUTE FUNCTION enfileirar_tendencias ();
+
+ALTER TABLE Tendencias_Progresso DROP COLUMN ultima_cotacao;
+
+COMMENT ON TABLE Tendencias_Progresso IS 'Tabela que registra a última execução do motor de tendências.';
+
+-- O progresso antigo não diz quais cotações ficaram para trás: recalcula tudo.
+INSERT INTO Tendencias_Pendentes (id_cripto)
+SELECT id_cripto FROM Criptomoedas;
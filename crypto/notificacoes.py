@@ -0,0 +1,79 @@
+import asyncio
+import logging
+import os
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+
+import dotenv
+from psycopg import AsyncConnection, sql
+
+logger = logging.getLogger(__name__)
+
+# Recebe o payload da notificação, ou None depois de uma reconexão, quando
+# mensagens podem ter sido perdidas.
+Callback = Callable[[Optional[str]], None]
+
+
+class Ouvinte:
+    """
+    A single ``LISTEN`` connection per process that dispatches ``NOTIFY``
+    payloads to the callbacks registered for each channel.
+
+    The connection is reopened with backoff when it drops. Notifications sent
+    while it was down are lost, so every callback is then called with None
+    and must assume anything may have changed.
+    """
+
+    def __init__(self, database_url: str, espera_maxima: float = 30.0):
+        self.database_url = database_url
+        self.espera_maxima = espera_maxima
+        self._callbacks: Dict[str, List[Callback]] = defaultdict(list)
+        self.conectado = asyncio.Event()
+
+    def registrar(self, canal: str, callback: Callback):
+        self._callbacks[canal].append(callback)
+
+    def _despachar(self, canal: str, payload: Optional[str]):
+        for callback in self._callbacks.get(canal, ()):
+            try:
+                callback(payload)
+            except Exception:
+                logger.exception("Notification callback failed on %s", canal)
+
+    async def executar(self):
+        """Listen forever; meant to run as a background task."""
+        espera = 1.0
+        primeira = True
+        while True:
+            try:
+                async with await AsyncConnection.connect(
+                    self.database_url, autocommit=True
+                ) as conn:
+                    for canal in self._callbacks:
+                        await conn.execute(
+                            sql.SQL("LISTEN {}").format(sql.Identifier(canal))
+                        )
+                    if not primeira:
+                        for canal in self._callbacks:
+                            self._despachar(canal, None)
+                    primeira = False
+                    espera = 1.0
+                    self.conectado.set()
+                    async for notificacao in conn.notifies():
+                        self._despachar(notificacao.channel, notificacao.payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("LISTEN connection lost, retrying in %.0fs", espera)
+            self.conectado.clear()
+            await asyncio.sleep(espera)
+            espera = min(espera * 2, self.espera_maxima)
+
+    @staticmethod
+    def load(database_url: Optional[str] = None) -> "Ouvinte":
+        dotenv.load_dotenv()
+        if database_url is None:
+            database_url = os.environ.get("DB_URL")
+        if database_url is None:
+            raise ValueError("Could not load listener: DB_URL not found.")
+        return Ouvinte(database_url)
@@ -0,0 +1,107 @@
+import base64
+import datetime
+import json
+from dataclasses import dataclass
+from typing import List, Optional, Tuple, Union
+
+Instante = Union[datetime.datetime, datetime.date]
+
+
+def _encode(valores: list) -> str:
+    payload = json.dumps(valores, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def _decode(cursor: str) -> list:
+    padding = "=" * (-len(cursor) % 4)
+    return json.loads(base64.urlsafe_b64decode(cursor + padding))
+
+
+def encode_cursor(instante: Instante, id_: int) -> str:
+    return _encode([instante.isoformat(), id_])
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime.datetime, int]:
+    try:
+        instante, id_ = _decode(cursor)
+        return datetime.datetime.fromisoformat(instante), int(id_)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+def encode_rank_cursor(rank: float, id_: int) -> str:
+    """Cursor of a listing ordered by ``(rank DESC, id DESC)``, such as a search."""
+    return _encode([rank, id_])
+
+
+def decode_rank_cursor(cursor: str) -> Tuple[float, int]:
+    try:
+        rank, id_ = _decode(cursor)
+        return float(rank), int(id_)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+@dataclass
+class Pagina:
+    """
+    Time window and keyset position of a listing ordered by
+    ``(coluna_tempo DESC, coluna_id DESC)``.
+
+    ``inicio`` is inclusive and ``fim`` exclusive. ``cursor`` is the opaque
+    value returned with the previous page; the next page starts right after
+    the row it points to, so every page costs one index range scan no matter
+    how deep it is.
+    """
+
+    inicio: Optional[Instante] = None
+    fim: Optional[Instante] = None
+    limite: Optional[int] = None
+    cursor: Optional[str] = None
+
+    def condicoes(self, coluna_tempo: str, coluna_id: str) -> Tuple[List[str], list]:
+        condicoes, args = [], []
+        if self.inicio is not None:
+            condicoes.append(f"{coluna_tempo} >= %s")
+            args.append(self.inicio)
+        if self.fim is not None:
+            condicoes.append(f"{coluna_tempo} < %s")
+            args.append(self.fim)
+        if self.cursor is not None:
+            instante, id_ = decode_cursor(self.cursor)
+            # A comparação de linhas não poda partições; a condição redundante
+            # só na coluna de tempo deixa o Postgres ignorar os meses seguintes.
+            condicoes.append(f"{coluna_tempo} <= %s")
+            condicoes.append(f"({coluna_tempo}, {coluna_id}) < (%s, %s)")
+            args.extend((instante, instante, id_))
+        return condicoes, args
+
+    def sql(
+        self, coluna_tempo: str, coluna_id: str, condicoes: List[str] = (), args=()
+    ) -> Tuple[str, tuple]:
+        """
+        Build the ``WHERE ... ORDER BY ... LIMIT`` tail of the listing query,
+        prefixed by the caller's own ``condicoes``.
+        """
+        proprias, proprios_args = self.condicoes(coluna_tempo, coluna_id)
+        condicoes = list(condicoes) + proprias
+        args = list(args) + proprios_args
+        sql = ""
+        if condicoes:
+            sql += "WHERE " + " AND ".join(condicoes) + "\n"
+        sql += f"ORDER BY {coluna_tempo} DESC, {coluna_id} DESC"
+        if self.limite is not None:
+            sql += "\nLIMIT %s"
+            args.append(self.limite)
+        return sql, tuple(args)
+
+    def proximo_cursor(
+        self, rows: List[dict], coluna_tempo: str, coluna_id: str
+    ) -> Optional[str]:
+        """
+        Cursor for the page after ``rows``, or None when this was the last one.
+        """
+        if self.limite is None or len(rows) < self.limite:
+            return None
+        ultima = rows[-1]
+        return encode_cursor(ultima[coluna_tempo], ultima[coluna_id])
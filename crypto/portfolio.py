@@ -0,0 +1,227 @@
+import asyncio
+import datetime
+import decimal
+from collections import defaultdict
+from dataclasses import astuple, dataclass
+from decimal import Decimal
+from typing import Dict, List, Optional, Sequence
+
+from .async_database import AsyncDatabase
+from .database import Database
+
+COMPRA = "Compra"
+VENDA = "Venda"
+# Produtos de DECIMAL(18, 8) por DECIMAL(28, 8) cabem sem arredondar.
+PRECISAO = 60
+
+
+@dataclass
+class Lote:
+    """
+    Open lot of a position. ``inicio`` is the queue quantity opened before
+    it, so the lot covers [inicio, inicio + quantidade) of the queue.
+    """
+
+    inicio: Decimal
+    quantidade: Decimal
+    preco: Decimal
+    data_hora: datetime.datetime
+
+
+@dataclass
+class Posicao:
+    id_cripto: int
+    quantidade: Decimal = Decimal(0)
+    custo: Decimal = Decimal(0)
+    pnl_realizado: Decimal = Decimal(0)
+    empilhado: Decimal = Decimal(0)
+    consumido: Decimal = Decimal(0)
+    transacoes: int = 0
+    atualizada_em: Optional[datetime.datetime] = None
+
+
+def sinal(tipo: str) -> int:
+    """+1 for a buy, -1 for a sell, 0 for any other type (ignored)."""
+    tipo = tipo.strip().capitalize()
+    return 1 if tipo == COMPRA else -1 if tipo == VENDA else 0
+
+
+def volume_oposto(posicao: Posicao, transacoes: Sequence[tuple]) -> Decimal:
+    """
+    Upper bound of how much of the open lots ``transacoes`` can close: only
+    trades against the position close lots, and never more than it holds.
+    Lots past ``consumido`` plus this are left alone, so they are not read.
+    """
+    lado = (posicao.quantidade > 0) - (posicao.quantidade < 0)
+    volume = sum((t[4] for t in transacoes if sinal(t[3]) == -lado), start=Decimal(0))
+    return min(volume, abs(posicao.quantidade))
+
+
+def aplicar(
+    posicao: Posicao, lotes: List[Lote], transacoes: Sequence[tuple]
+) -> List[Lote]:
+    """
+    Apply (data_hora, id_transacao, id_cripto, tipo, quantidade,
+    preco_unitario) rows, in order, to ``posicao`` with FIFO lot matching.
+
+    ``lotes`` holds the head of the open lots, at least as far as
+    ``volume_oposto`` reaches. A trade against the position closes lots from
+    the head and realizes their P&L; what is left of it opens a new lot at
+    the tail, on the other side if the position flipped. Returns the lots
+    opened here that are still open.
+    """
+    fila = list(lotes)
+    primeiro = 0
+    novos = []
+    with decimal.localcontext() as contexto:
+        contexto.prec = PRECISAO
+        for data_hora, _, _, tipo, quantidade, preco in transacoes:
+            s = sinal(tipo)
+            if s == 0 or quantidade <= 0:
+                continue
+            restante = quantidade
+            while restante > 0 and posicao.quantidade * s < 0:
+                lote = fila[primeiro]
+                aberta = lote.inicio + lote.quantidade - posicao.consumido
+                fechada = min(restante, aberta)
+                posicao.pnl_realizado += (preco - lote.preco) * fechada * -s
+                posicao.custo -= lote.preco * fechada
+                posicao.consumido += fechada
+                posicao.quantidade += s * fechada
+                restante -= fechada
+                if fechada == aberta:
+                    primeiro += 1
+            if restante > 0:
+                lote = Lote(posicao.empilhado, restante, preco, data_hora)
+                fila.append(lote)
+                novos.append(lote)
+                posicao.empilhado += restante
+                posicao.custo += preco * restante
+                posicao.quantidade += s * restante
+            posicao.transacoes += 1
+            posicao.atualizada_em = data_hora
+    return [lote for lote in novos if lote.inicio + lote.quantidade > posicao.consumido]
+
+
+def agrupar(transacoes: Sequence[tuple]) -> Dict[int, List[tuple]]:
+    """Pending rows by id_cripto, keeping their order."""
+    grupos = defaultdict(list)
+    for transacao in transacoes:
+        grupos[transacao[2]].append(transacao)
+    return grupos
+
+
+class MotorPortfolio:
+    """
+    Keeps Portfolio_Posicoes and Portfolio_Lotes up to date with
+    Transações_Mercado. New transactions are queued in Portfolio_Pendentes by
+    a trigger; each run drains the queue in (data_hora, id_transacao) order,
+    ``lote`` rows per transaction, reading only the positions involved and
+    the head lots they can close. A criptomoeda that gets a transaction older
+    than its position is rebuilt from its history instead.
+    """
+
+    def __init__(self, lote: int = 10_000):
+        self.lote = lote
+        # Um processo não disputa a trava do banco consigo mesmo.
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def _atrasadas(posicoes: List[dict], grupos: Dict[int, List[tuple]]) -> List[int]:
+        """
+        Criptomoedas with a queued transaction older than the last one applied
+        to their position, such as a backdated sell. FIFO matching depends on
+        the order, so these are rebuilt from their whole history.
+        """
+        return [
+            posicao["id_cripto"]
+            for posicao in posicoes
+            if posicao["atualizada_em"] is not None
+            and grupos[posicao["id_cripto"]][0][0] < posicao["atualizada_em"]
+        ]
+
+    @staticmethod
+    def _refazer(
+        posicoes: List[dict],
+        grupos: Dict[int, List[tuple]],
+        atrasadas: List[int],
+        historico: List[tuple],
+    ) -> List[dict]:
+        """
+        Swap in the history of the ``atrasadas`` criptomoedas and drop their
+        saved positions, so they are rebuilt from empty ones.
+        """
+        refeitas = agrupar(historico)
+        for i in atrasadas:
+            grupos[i] = refeitas[i]
+        return [p for p in posicoes if p["id_cripto"] not in atrasadas]
+
+    def _preparar(self, posicoes: List[dict], grupos: Dict[int, List[tuple]]):
+        lidas = {posicao["id_cripto"]: Posicao(**posicao) for posicao in posicoes}
+        posicoes = {i: lidas.get(i) or Posicao(i) for i in grupos}
+        limites = {}
+        for i, posicao in posicoes.items():
+            volume = volume_oposto(posicao, grupos[i])
+            if volume > 0:
+                limites[i] = posicao.consumido + volume
+        return posicoes, limites
+
+    @staticmethod
+    def _aplicar(
+        posicoes: Dict[int, Posicao],
+        lotes: List[dict],
+        grupos: Dict[int, List[tuple]],
+    ):
+        abertos = defaultdict(list)
+        for linha in lotes:
+            id_cripto = linha.pop("id_cripto")
+            abertos[id_cripto].append(Lote(**linha))
+        novos = []
+        for i, posicao in posicoes.items():
+            for lote in aplicar(posicao, abertos[i], grupos[i]):
+                novos.append((i, *astuple(lote)))
+        return [astuple(posicao) for posicao in posicoes.values()], novos
+
+    def executar(self, db: Database) -> int:
+        """Drain the queue and return the number of transactions applied."""
+        aplicadas = 0
+        while True:
+            with db.transacao() as tx:
+                tx.travar_portfolio()
+                transacoes = tx.retirar_transacoes_pendentes(self.lote)
+                if not transacoes:
+                    return aplicadas
+                grupos = agrupar(transacoes)
+                lidas = tx.ler_posicoes(list(grupos))
+                atrasadas = self._atrasadas(lidas, grupos)
+                if atrasadas:
+                    historico = tx.refazer_historico_portfolio(atrasadas)
+                    lidas = self._refazer(lidas, grupos, atrasadas, historico)
+                posicoes, limites = self._preparar(lidas, grupos)
+                lotes = tx.ler_lotes_abertos(limites)
+                tx.salvar_portfolio(*self._aplicar(posicoes, lotes, grupos))
+            aplicadas += len(transacoes)
+            if len(transacoes) < self.lote:
+                return aplicadas
+
+    async def executar_async(self, db: AsyncDatabase) -> int:
+        aplicadas = 0
+        async with self._lock:
+            while True:
+                async with db.transacao() as tx:
+                    await tx.travar_portfolio()
+                    transacoes = await tx.retirar_transacoes_pendentes(self.lote)
+                    if not transacoes:
+                        return aplicadas
+                    grupos = agrupar(transacoes)
+                    lidas = await tx.ler_posicoes(list(grupos))
+                    atrasadas = self._atrasadas(lidas, grupos)
+                    if atrasadas:
+                        historico = await tx.refazer_historico_portfolio(atrasadas)
+                        lidas = self._refazer(lidas, grupos, atrasadas, historico)
+                    posicoes, limites = self._preparar(lidas, grupos)
+                    lotes = await tx.ler_lotes_abertos(limites)
+                    await tx.salvar_portfolio(*self._aplicar(posicoes, lotes, grupos))
+                aplicadas += len(transacoes)
+                if len(transacoes) < self.lote:
+                    return aplicadas
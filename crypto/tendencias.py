@@ -0,0 +1,151 @@
+import asyncio
+import datetime
+import logging
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from .async_database import AsyncDatabase
+from .database import Database
+
+logger = logging.getLogger(__name__)
+
+PERIODOS = {
+    "24h": datetime.timedelta(hours=24),
+    "7d": datetime.timedelta(days=7),
+    "30d": datetime.timedelta(days=30),
+}
+# Variação percentual, em módulo, abaixo da qual a tendência é estável.
+LIMIAR_ESTAVEL = 1.0
+# Limite de DECIMAL(5, 2) em Tendências_Preço.variacao_preco.
+VARIACAO_MAXIMA = 999.99
+
+
+def calcular(
+    series: Sequence[tuple],
+    periodos: Dict[str, datetime.timedelta] = PERIODOS,
+    limiar: float = LIMIAR_ESTAVEL,
+) -> List[tuple]:
+    """
+    Price variation and trend of every criptomoeda in ``series`` over each
+    period, as (id_cripto, periodo, variacao_preco, tendencia) rows.
+
+    ``series`` holds (id_cripto, epoch seconds, preco) rows ordered by
+    criptomoeda and time. The variation of a period compares the last quote
+    with the first one at or after ``last - period``; all criptomoedas are
+    handled at once with a single binary search per period. A period the
+    series does not cover, because its first quote is newer than
+    ``last - period``, gets NULL variation and trend.
+    """
+    if not series:
+        return []
+    ids, instantes, precos = (np.asarray(coluna) for coluna in zip(*series))
+    instantes = instantes.astype(np.int64)
+    precos = precos.astype(np.float64)
+
+    fins = np.append(np.flatnonzero(np.diff(ids)) + 1, len(ids))
+    inicios = np.append(0, fins[:-1])
+    grupos = np.repeat(np.arange(len(fins)), fins - inicios)
+
+    # Desloca cada série para uma faixa própria, assim uma única chave
+    # ordenada cobre todas as criptomoedas.
+    base = instantes.min()
+    extensao = instantes.max() - base + 1
+    chaves = grupos * extensao + (instantes - base)
+    ultimos = fins - 1
+
+    tendencias = []
+    for periodo, duracao in periodos.items():
+        inicio = instantes[ultimos] - int(duracao.total_seconds())
+        cobertos = instantes[inicios] <= inicio
+        alvos = np.maximum(inicio - base, 0)
+        referencias = np.searchsorted(chaves, np.arange(len(fins)) * extensao + alvos)
+        anteriores = precos[referencias]
+        validos = cobertos & (referencias < ultimos) & (anteriores > 0)
+        variacoes = np.zeros(len(fins))
+        np.divide(
+            precos[ultimos] - anteriores, anteriores, out=variacoes, where=validos
+        )
+        variacoes = np.clip(
+            np.round(variacoes * 100, 2), -VARIACAO_MAXIMA, VARIACAO_MAXIMA
+        )
+        classes = np.where(
+            variacoes > limiar,
+            "Alta",
+            np.where(variacoes < -limiar, "Baixa", "Estável"),
+        )
+        for i in np.flatnonzero(validos):
+            tendencias.append(
+                (int(ids[inicios[i]]), periodo, float(variacoes[i]), str(classes[i]))
+            )
+        # Sem cotação do início do período a variação seria de um intervalo
+        # menor; a linha antiga também não vale mais.
+        for i in np.flatnonzero(~cobertos):
+            tendencias.append((int(ids[inicios[i]]), periodo, None, None))
+    return tendencias
+
+
+class MotorTendencias:
+    """
+    Computes Tendências_Preço from Cotações. New quotes queue their
+    criptomoeda in Tendencias_Pendentes by trigger; each run drains the
+    queue, ``lote`` criptomoedas per transaction, and upserts one row per
+    criptomoeda and period.
+    """
+
+    def __init__(
+        self,
+        periodos: Dict[str, datetime.timedelta] = PERIODOS,
+        limiar: float = LIMIAR_ESTAVEL,
+        lote: int = 50,
+    ):
+        self.periodos = periodos
+        self.limiar = limiar
+        self.lote = lote
+        self.janela = max(periodos.values())
+
+    def executar(self, db: Database, completo: bool = False) -> int:
+        """Run once and return the number of trends written."""
+        if completo:
+            db.enfileirar_tendencias()
+        escritas = 0
+        while True:
+            # Retirada e gravação na mesma transação: uma falha devolve as
+            # criptomoedas à fila.
+            with db.transacao() as tx:
+                ids = tx.retirar_tendencias_pendentes(self.lote)
+                series = tx.series_cotacoes(ids, self.janela) if ids else []
+                tendencias = calcular(series, self.periodos, self.limiar)
+                escritas += tx.salvar_tendencias(tendencias)
+            if len(ids) < self.lote:
+                return escritas
+
+    async def executar_async(self, db: AsyncDatabase) -> int:
+        escritas = 0
+        while True:
+            async with db.transacao() as tx:
+                ids = await tx.retirar_tendencias_pendentes(self.lote)
+                series = await tx.series_cotacoes(ids, self.janela) if ids else []
+                tendencias = await asyncio.to_thread(
+                    calcular, series, self.periodos, self.limiar
+                )
+                escritas += await tx.salvar_tendencias(tendencias)
+            if len(ids) < self.lote:
+                return escritas
+
+    async def agendar(self, db: AsyncDatabase, intervalo: float, novas: asyncio.Event):
+        """
+        Run forever, every ``intervalo`` seconds or as soon as ``novas`` is
+        set by an ingest, whichever comes first.
+        """
+        while True:
+            try:
+                await asyncio.wait_for(novas.wait(), intervalo)
+            except asyncio.TimeoutError:
+                pass
+            novas.clear()
+            try:
+                await self.executar_async(db)
+            except Exception:
+                # Um erro de banco não pode derrubar o agendamento.
+                logger.exception("Trend engine run failed")
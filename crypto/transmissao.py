@@ -0,0 +1,104 @@
+import asyncio
+import json
+import logging
+from collections import OrderedDict, defaultdict
+from typing import Dict, Iterable, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class Assinatura:
+    """
+    Pending quotes of one subscriber, at most ``limite`` of them.
+
+    A quote for a criptomoeda that already has one waiting replaces it, since
+    only the latest price matters to a dashboard. When the subscriber falls
+    behind on more criptomoedas than ``limite``, the oldest one is dropped.
+    """
+
+    def __init__(self, ids: Optional[Set[int]], limite: int):
+        # None assina todas as criptomoedas.
+        self.ids = ids
+        self.limite = limite
+        self._pendentes: "OrderedDict[int, str]" = OrderedDict()
+        self._evento = asyncio.Event()
+        self.agrupadas = 0
+        self.descartadas = 0
+
+    def enfileirar(self, id_cripto: int, mensagem: str):
+        if id_cripto in self._pendentes:
+            self._pendentes[id_cripto] = mensagem
+            self.agrupadas += 1
+            return
+        if len(self._pendentes) >= self.limite:
+            self._pendentes.popitem(last=False)
+            self.descartadas += 1
+        self._pendentes[id_cripto] = mensagem
+        self._evento.set()
+
+    async def proxima(self) -> str:
+        while not self._pendentes:
+            self._evento.clear()
+            await self._evento.wait()
+        _, mensagem = self._pendentes.popitem(last=False)
+        return mensagem
+
+
+class Difusor:
+    """
+    Fans out the quotes published on the ``cotacoes`` channel to the
+    subscribers of each criptomoeda. Fed by the process's single LISTEN
+    connection, so the number of subscribers adds no database load; each
+    payload is parsed once and forwarded as the same JSON text to everyone.
+    """
+
+    def __init__(self, limite: int = 100):
+        self.limite = limite
+        self._por_cripto: Dict[int, Set[Assinatura]] = defaultdict(set)
+        self._todas: Set[Assinatura] = set()
+        self.publicadas = 0
+
+    def assinar(self, ids: Optional[Iterable[int]] = None) -> Assinatura:
+        assinatura = Assinatura(set(ids) if ids else None, self.limite)
+        if assinatura.ids is None:
+            self._todas.add(assinatura)
+        else:
+            for id_cripto in assinatura.ids:
+                self._por_cripto[id_cripto].add(assinatura)
+        return assinatura
+
+    def cancelar(self, assinatura: Assinatura):
+        if assinatura.ids is None:
+            self._todas.discard(assinatura)
+            return
+        for id_cripto in assinatura.ids:
+            assinantes = self._por_cripto.get(id_cripto)
+            if assinantes is not None:
+                assinantes.discard(assinatura)
+                if not assinantes:
+                    del self._por_cripto[id_cripto]
+
+    def publicar(self, payload: Optional[str]):
+        """Callback of the ``cotacoes`` channel in ``Ouvinte``."""
+        if payload is None:
+            # Reconexão: cotações perdidas chegam na próxima inserção.
+            return
+        try:
+            id_cripto = int(json.loads(payload)["id_cripto"])
+        except (ValueError, KeyError, TypeError):
+            logger.warning("Ignoring malformed quote notification: %r", payload)
+            return
+        self.publicadas += 1
+        for assinatura in self._por_cripto.get(id_cripto, ()):
+            assinatura.enfileirar(id_cripto, payload)
+        for assinatura in self._todas:
+            assinatura.enfileirar(id_cripto, payload)
+
+    def stats(self) -> dict:
+        assinaturas = self._todas.union(*self._por_cripto.values())
+        return {
+            "assinantes": len(assinaturas),
+            "publicadas": self.publicadas,
+            "agrupadas": sum(a.agrupadas for a in assinaturas),
+            "descartadas": sum(a.descartadas for a in assinaturas),
+        }
@@ -1,10 +1,96 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+import asyncio
+import csv
+import io
+import json
+import logging
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Literal, Optional, Type, Union
+from fastapi import (
+    BackgroundTasks,
+    FastAPI,
+    UploadFile,
+    File,
+    HTTPException,
+    Depends,
+    Query,
+    Request,
+    Response,
+    WebSocket,
+)
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
 from datetime import datetime, date
-from crypto import Database  # Assumes the updated Database class is in crypto.py
+from psycopg import DataError, IntegrityError
+from psycopg_pool import PoolTimeout
+from crypto import AsyncDatabase, exportacao, metricas
+from crypto.cache import LRUCache, TTLCache
+from crypto.imagens import gerar_variantes, tipo_mime
+from crypto.livro_ofertas import MotorNegociacao
+from crypto.notificacoes import Ouvinte
+from crypto.portfolio import MotorPortfolio
+from crypto.transmissao import Difusor
+from crypto.paginacao import (
+    Pagina,
+    decode_cursor,
+    decode_rank_cursor,
+    encode_rank_cursor,
+)
+from crypto.tendencias import MotorTendencias
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    referencias = TTLCache(float(os.environ.get("REFERENCIAS_CACHE_TTL", 60)))
+    app.state.db = await AsyncDatabase.load(cache=referencias)
+    app.state.ouvinte = Ouvinte.load()
+    app.state.ouvinte.registrar("invalidacao_cache", referencias.invalidar)
+    app.state.difusor = Difusor(int(os.environ.get("STREAM_FILA", 100)))
+    app.state.busca_candidatos = int(os.environ.get("BUSCA_CANDIDATOS", 1000))
+    app.state.ouvinte.registrar("cotacoes", app.state.difusor.publicar)
+    app.state.logos = LRUCache(int(os.environ.get("LOGO_CACHE_BYTES", 32 * 2**20)))
+    app.state.imagens = ProcessPoolExecutor(int(os.environ.get("IMAGE_WORKERS", 2)))
+    app.state.motor = MotorNegociacao()
+    await app.state.motor.carregar(app.state.db)
+    app.state.portfolio = MotorPortfolio()
+    app.state.cotacoes_novas = asyncio.Event()
+    intervalo = float(os.environ.get("TENDENCIAS_INTERVALO", 60))
+    tendencias = None
+    if intervalo > 0:
+        tendencias = asyncio.create_task(
+            MotorTendencias().agendar(app.state.db, intervalo, app.state.cotacoes_novas)
+        )
+    ouvinte = asyncio.create_task(app.state.ouvinte.executar())
+    try:
+        yield
+    finally:
+        ouvinte.cancel()
+        if tendencias is not None:
+            tendencias.cancel()
+        app.state.imagens.shutdown(cancel_futures=True)
+        await app.state.db.close()
+
 
-app = FastAPI(title="Crypto Wallet/Watcher API")
+class RespostaJSON(JSONResponse):
+    """
+    JSON response encoded by orjson, which writes the Decimal, datetime and
+    date values of database rows directly.
+    """
+
+    def render(self, content) -> bytes:
+        return exportacao.json_(content)
+
+
+app = FastAPI(
+    title="Crypto Wallet/Watcher API",
+    lifespan=lifespan,
+    default_response_class=RespostaJSON,
+)
+logger = logging.getLogger(__name__)
 
 origins = ["http://localhost", "http://localhost:8000", "http://localhost:3000"]
 
@@ -14,8 +100,69 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+
+def rota(request: Request) -> str:
+    """
+    Path template of the route that served the request, so that ids in the
+    URL do not each become a separate label. The router records the matched
+    route in the scope, so this only reads it once ``call_next`` returns.
+    """
+    route = request.scope.get("route")
+    return route.path if route is not None else "desconhecida"
+
+
+@app.middleware("http")
+async def medir_requisicao(request: Request, call_next):
+    inicio = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        metricas.HTTP_DURACAO.observar(
+            time.perf_counter() - inicio,
+            metodo=request.method,
+            rota=rota(request),
+            status=status,
+        )
+
+
+@app.exception_handler(PoolTimeout)
+async def pool_timeout_handler(request: Request, exc: PoolTimeout):
+    return JSONResponse(status_code=503, content={"detail": str(exc)})
+
+
+async def get_db(request: Request) -> AsyncDatabase:
+    return request.app.state.db
+
+
+def get_pagina(
+    inicio: Optional[datetime] = Query(None, alias="from"),
+    fim: Optional[datetime] = Query(None, alias="to"),
+    limite: int = Query(100, alias="limit", ge=1, le=1000),
+    cursor: Optional[str] = None,
+) -> Pagina:
+    if cursor is not None:
+        try:
+            decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    return Pagina(inicio, fim, limite, cursor)
+
+
+def listagem(linhas: List[dict], cursor: Optional[str] = None) -> RespostaJSON:
+    """
+    Rows from the database as a response, skipping the jsonable_encoder pass
+    FastAPI runs over returned values; ``cursor`` goes in X-Next-Cursor.
+    """
+    headers = {"X-Next-Cursor": cursor} if cursor is not None else None
+    return RespostaJSON(linhas, headers=headers)
+
+
 # --- Pydantic models for incoming request bodies ---
 
 
@@ -92,328 +239,537 @@ class UsuarioIn(BaseModel):
     admin_flag: bool = False
 
 
-# --- Endpoints for Notícias and Sentimentos ---
+class OperacaoLote(BaseModel):
+    acao: Literal["inserir", "atualizar", "excluir"]
+    recurso: Literal["noticia", "sentimento", "cotacao", "ordem"]
+    # Registro alvo de atualizar/excluir. {"ref": i}, aqui ou em qualquer campo
+    # de dados, vale o id gerado pela operação i do mesmo lote.
+    id: Optional[Union[int, Dict[str, int]]] = None
+    dados: Dict[str, Any] = {}
 
 
-@app.post("/noticias/", summary="Create a new notícia")
-def create_noticia(noticia: NoticiaIn):
-    db = Database.load()
+class LoteIn(BaseModel):
+    operacoes: List[OperacaoLote] = Field(..., min_length=1, max_length=1000)
+
+
+async def read_batch(request: Request, model: Type[BaseModel]) -> list:
+    """
+    Parse a request body holding a batch of ``model`` records, sent either as
+    a JSON array, as NDJSON (one object per line) or as CSV with a header row.
+    """
+    content_type = request.headers.get("content-type", "application/json")
+    content_type = content_type.split(";")[0].strip().lower()
+    body = (await request.body()).decode("utf-8")
     try:
-        id_noticia = db.insert_noticia(
-            noticia.id_cripto,
-            noticia.data_publicacao,
-            noticia.tema,
-            noticia.noticia,
-            noticia.fonte,
+        if content_type in ("application/x-ndjson", "application/jsonl"):
+            records = [json.loads(line) for line in body.splitlines() if line.strip()]
+        elif content_type == "text/csv":
+            records = list(csv.DictReader(io.StringIO(body)))
+        elif content_type == "application/json":
+            records = json.loads(body)
+        else:
+            raise HTTPException(
+                status_code=415, detail=f"Unsupported batch format: {content_type}"
+            )
+        return TypeAdapter(List[model]).validate_python(records)
+    except ValidationError as e:
+        raise HTTPException(
+            status_code=422, detail=json.loads(e.json(include_url=False))
         )
-        return {"id": id_noticia}
-    finally:
-        db.close()
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+# --- Endpoints for Notícias and Sentimentos ---
+
+
+@app.post("/noticias/", summary="Create a new notícia")
+async def create_noticia(noticia: NoticiaIn, db: AsyncDatabase = Depends(get_db)):
+    id_noticia = await db.insert_noticia(
+        noticia.id_cripto,
+        noticia.data_publicacao,
+        noticia.tema,
+        noticia.noticia,
+        noticia.fonte,
+    )
+    return {"id": id_noticia}
 
 
 @app.put("/noticias/{id_noticia}", summary="Update a notícia")
-def update_noticia(id_noticia: int, noticia: NoticiaIn):
-    db = Database.load()
-    try:
-        db.atualizar_noticia(
-            id_noticia,
-            noticia.id_cripto,
-            noticia.data_publicacao,
-            noticia.tema,
-            noticia.noticia,
-            noticia.fonte,
-        )
-        return {"message": "Notícia updated successfully"}
-    finally:
-        db.close()
+async def update_noticia(
+    id_noticia: int, noticia: NoticiaIn, db: AsyncDatabase = Depends(get_db)
+):
+    await db.atualizar_noticia(
+        id_noticia,
+        noticia.id_cripto,
+        noticia.data_publicacao,
+        noticia.tema,
+        noticia.noticia,
+        noticia.fonte,
+    )
+    return {"message": "Notícia updated successfully"}
 
 
 @app.post("/sentimentos/", summary="Create a new sentimento for a notícia")
-def create_sentimento(sentimento: SentimentoIn):
-    db = Database.load()
-    try:
-        id_sentimento = db.inserir_sentimento(
-            sentimento.id_noticia,
-            sentimento.id_usuario,
-            sentimento.sentimento,
-            sentimento.score_sentimento,
-        )
-        return {"id": id_sentimento}
-    finally:
-        db.close()
+async def create_sentimento(
+    sentimento: SentimentoIn, db: AsyncDatabase = Depends(get_db)
+):
+    id_sentimento = await db.inserir_sentimento(
+        sentimento.id_noticia,
+        sentimento.id_usuario,
+        sentimento.sentimento,
+        sentimento.score_sentimento,
+    )
+    return {"id": id_sentimento}
 
 
 @app.put("/sentimentos/", summary="Update a sentimento for a notícia")
-def update_sentimento(sent_update: SentimentoUpdate):
-    db = Database.load()
-    try:
-        db.atualizar_sentimento(
-            sent_update.id_sentimento,
-            sent_update.id_usuario,
-            sent_update.novo_sentimento,
-            sent_update.novo_score,
-        )
-        return {"message": "Sentimento updated successfully"}
-    finally:
-        db.close()
+async def update_sentimento(
+    sent_update: SentimentoUpdate, db: AsyncDatabase = Depends(get_db)
+):
+    await db.atualizar_sentimento(
+        sent_update.id_sentimento,
+        sent_update.id_usuario,
+        sent_update.novo_sentimento,
+        sent_update.novo_score,
+    )
+    return {"message": "Sentimento updated successfully"}
 
 
 @app.delete(
     "/sentimentos/{id_noticia}/{id_sentimento}",
     summary="Delete a sentimento for a notícia",
 )
-def delete_sentimento(id_noticia: int, id_sentimento: int):
-    db = Database.load()
-    try:
-        # Make sure you implement this method in your Database class (crypto.py)
-        db.excluir_sentimento(id_sentimento)
-        return {"message": "Sentimento deleted successfully"}
-    finally:
-        db.close()
+async def delete_sentimento(
+    id_noticia: int, id_sentimento: int, db: AsyncDatabase = Depends(get_db)
+):
+    # Make sure you implement this method in your Database class (crypto.py)
+    await db.excluir_sentimento(id_sentimento)
+    return {"message": "Sentimento deleted successfully"}
 
 
 @app.get("/noticias/criptomoeda/{id_cripto}", summary="List notícias for a criptomoeda")
-def list_noticias_por_criptomoeda(id_cripto: int):
-    db = Database.load()
-    try:
-        noticias = db.listar_noticias_por_criptomoeda(id_cripto)
-        return noticias
-    finally:
-        db.close()
+async def list_noticias_por_criptomoeda(
+    id_cripto: int, db: AsyncDatabase = Depends(get_db)
+):
+    noticias = await db.listar_noticias_por_criptomoeda(id_cripto)
+    return listagem(noticias)
 
 
 @app.get("/noticias/", summary="List all notícias with aggregated sentiments")
-def list_all_noticias():
-    db = Database.load()
-    try:
-        noticias = db.listar_noticias()
-        return noticias
-    finally:
-        db.close()
+async def list_all_noticias(
+    pagina: Pagina = Depends(get_pagina),
+    db: AsyncDatabase = Depends(get_db),
+):
+    noticias = await db.listar_noticias(pagina)
+    return listagem(
+        noticias, pagina.proximo_cursor(noticias, "data_publicacao", "id_noticia")
+    )
+
+
+@app.get("/noticias/search", summary="Full-text search over notícias")
+async def search_noticias(
+    request: Request,
+    termos: str = Query(..., alias="q", min_length=1),
+    id_cripto: Optional[int] = None,
+    limite: int = Query(20, alias="limit", ge=1, le=100),
+    cursor: Optional[str] = None,
+    db: AsyncDatabase = Depends(get_db),
+):
+    if cursor is not None:
+        try:
+            decode_rank_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    noticias = await db.buscar_noticias(
+        termos, id_cripto, limite, cursor, request.app.state.busca_candidatos
+    )
+    proximo = None
+    if len(noticias) == limite:
+        ultima = noticias[-1]
+        proximo = encode_rank_cursor(ultima["rank"], ultima["id_noticia"])
+    return listagem(noticias, proximo)
 
 
 @app.get(
     "/noticias/{id_noticia}/sentimentos", summary="List all sentimentos for a notícia"
 )
-def list_sentimentos_for_noticia(id_noticia: int):
-    db = Database.load()
-    try:
-        sentimentos = db.listar_sentimentos_por_noticia(id_noticia)
-        return sentimentos
-    finally:
-        db.close()
+async def list_sentimentos_for_noticia(
+    id_noticia: int, db: AsyncDatabase = Depends(get_db)
+):
+    sentimentos = await db.listar_sentimentos_por_noticia(id_noticia)
+    return listagem(sentimentos)
 
 
 @app.delete("/noticias/{id_noticia}", summary="Delete a notícia")
-def delete_noticia(id_noticia: int):
-    db = Database.load()
-    try:
-        db.excluir_noticia(id_noticia)
-        return {"message": "Notícia excluída com sucesso"}
-    finally:
-        db.close()
+async def delete_noticia(id_noticia: int, db: AsyncDatabase = Depends(get_db)):
+    await db.excluir_noticia(id_noticia)
+    return {"message": "Notícia excluída com sucesso"}
 
 
 # --- Endpoints for Criptomoedas ---
 
 
 @app.post("/criptomoedas/", summary="Create a new criptomoeda")
-def create_criptomoeda(cripto: CriptomoedaIn):
-    db = Database.load()
-    try:
-        id_cripto = db.inserir_criptomoeda(
-            cripto.nome, cripto.simbolo, cripto.descricao, cripto.mercado
-        )
-        return {"id": id_cripto}
-    finally:
-        db.close()
+async def create_criptomoeda(
+    cripto: CriptomoedaIn, db: AsyncDatabase = Depends(get_db)
+):
+    id_cripto = await db.inserir_criptomoeda(
+        cripto.nome, cripto.simbolo, cripto.descricao, cripto.mercado
+    )
+    return {"id": id_cripto}
 
 
 @app.get("/criptomoedas/", summary="List all criptomoedas")
-def list_criptomoedas():
-    db = Database.load()
-    try:
-        cryptos = db.listar_criptomoedas()
-        return cryptos
-    finally:
-        db.close()
+async def list_criptomoedas(db: AsyncDatabase = Depends(get_db)):
+    cryptos = await db.listar_criptomoedas()
+    return listagem(cryptos)
 
 
 @app.put("/criptomoedas/{id_cripto}", summary="Update a criptomoeda")
-def update_criptomoeda(id_cripto: int, cripto: CriptomoedaIn):
-    db = Database.load()
-    try:
-        db.atualizar_criptomoeda(
-            id_cripto, cripto.nome, cripto.simbolo, cripto.descricao, cripto.mercado
-        )
-        return {"message": "Criptomoeda updated successfully"}
-    finally:
-        db.close()
+async def update_criptomoeda(
+    id_cripto: int, cripto: CriptomoedaIn, db: AsyncDatabase = Depends(get_db)
+):
+    await db.atualizar_criptomoeda(
+        id_cripto, cripto.nome, cripto.simbolo, cripto.descricao, cripto.mercado
+    )
+    return {"message": "Criptomoeda updated successfully"}
 
 
 @app.delete("/criptomoedas/{id_cripto}", summary="Delete a criptomoeda")
-def delete_criptomoeda(id_cripto: int):
-    db = Database.load()
-    try:
-        db.excluir_criptomoeda(id_cripto)
-        return {"message": "Criptomoeda deleted successfully"}
-    finally:
-        db.close()
+async def delete_criptomoeda(id_cripto: int, db: AsyncDatabase = Depends(get_db)):
+    await db.excluir_criptomoeda(id_cripto)
+    return {"message": "Criptomoeda deleted successfully"}
 
 
 # --- Endpoints for Cotações ---
 
 
 @app.post("/cotacoes/", summary="Create a new cotação")
-def create_cotacao(cotacao: CotacaoIn):
-    db = Database.load()
+async def create_cotacao(
+    cotacao: CotacaoIn, request: Request, db: AsyncDatabase = Depends(get_db)
+):
+    id_cotacao = await db.inserir_cotacao(
+        cotacao.id_cripto,
+        cotacao.data_hora,
+        cotacao.preco,
+        cotacao.volume,
+        cotacao.market_cap,
+        cotacao.variacao,
+    )
+    request.app.state.cotacoes_novas.set()
+    return {"id": id_cotacao}
+
+
+@app.post("/cotacoes/bulk", summary="Create many cotações in one transaction")
+async def create_cotacoes_bulk(request: Request, db: AsyncDatabase = Depends(get_db)):
+    cotacoes = await read_batch(request, CotacaoIn)
+    inseridos = await db.inserir_cotacoes(
+        (c.id_cripto, c.data_hora, c.preco, c.volume, c.market_cap, c.variacao)
+        for c in cotacoes
+    )
+    request.app.state.cotacoes_novas.set()
+    return {
+        "inseridos": inseridos,
+        "por_criptomoeda": Counter(c.id_cripto for c in cotacoes),
+    }
+
+
+@app.get("/cotacoes/criptomoeda/{id_cripto}", summary="List cotacoes for a criptomoeda")
+async def list_cotacoes(
+    id_cripto: int,
+    pagina: Pagina = Depends(get_pagina),
+    db: AsyncDatabase = Depends(get_db),
+):
+    cotacoes = await db.listar_cotacoes(id_cripto, pagina)
+    return listagem(
+        cotacoes, pagina.proximo_cursor(cotacoes, "data_hora", "id_cotacao")
+    )
+
+
+@app.get(
+    "/cotacoes/criptomoeda/{id_cripto}/candles",
+    summary="OHLCV candles for a criptomoeda",
+)
+async def list_candles(
+    id_cripto: int,
+    intervalo: Literal["1m", "5m", "1h", "1d"] = Query(..., alias="interval"),
+    inicio: Optional[datetime] = Query(None, alias="from"),
+    fim: Optional[datetime] = Query(None, alias="to"),
+    limite: int = Query(1000, alias="limit", ge=1, le=10000),
+    db: AsyncDatabase = Depends(get_db),
+):
+    candles = await db.listar_candles(id_cripto, intervalo, inicio, fim, limite)
+    return listagem(candles)
+
+
+@app.get(
+    "/cotacoes/criptomoeda/{id_cripto}/export",
+    summary="Stream the full cotação history of a criptomoeda",
+)
+async def export_cotacoes(
+    id_cripto: int,
+    formato: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+    inicio: Optional[datetime] = Query(None, alias="from"),
+    fim: Optional[datetime] = Query(None, alias="to"),
+    db: AsyncDatabase = Depends(get_db),
+):
+    lotes = db.exportar_cotacoes(id_cripto, Pagina(inicio, fim))
+    return StreamingResponse(
+        exportacao.formatar(lotes, formato), media_type=exportacao.FORMATOS[formato]
+    )
+
+
+async def eventos_cotacoes(difusor: Difusor, id_cripto: List[int]):
+    # Assinada aqui, e não no endpoint: se o cliente sair antes de a resposta
+    # começar, o gerador nunca roda e não há assinatura para cancelar.
+    assinatura = difusor.assinar(id_cripto)
     try:
-        id_cotacao = db.inserir_cotacao(
-            cotacao.id_cripto,
-            cotacao.data_hora,
-            cotacao.preco,
-            cotacao.volume,
-            cotacao.market_cap,
-            cotacao.variacao,
-        )
-        return {"id": id_cotacao}
+        while True:
+            try:
+                mensagem = await asyncio.wait_for(assinatura.proxima(), 15)
+            except asyncio.TimeoutError:
+                # Comentário SSE que mantém a conexão aberta em proxies.
+                yield ": keepalive\n\n"
+                continue
+            yield f"event: cotacao\ndata: {mensagem}\n\n"
     finally:
-        db.close()
+        difusor.cancelar(assinatura)
 
 
-@app.get("/cotacoes/criptomoeda/{id_cripto}", summary="List cotacoes for a criptomoeda")
-def list_cotacoes(id_cripto: int):
-    db = Database.load()
+@app.get("/cotacoes/stream", summary="Server-sent events with new cotações")
+async def stream_cotacoes(request: Request, id_cripto: List[int] = Query([])):
+    return StreamingResponse(
+        eventos_cotacoes(request.app.state.difusor, id_cripto),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.websocket("/ws/cotacoes")
+async def websocket_cotacoes(websocket: WebSocket, id_cripto: List[int] = Query([])):
+    difusor = websocket.app.state.difusor
+    await websocket.accept()
+    assinatura = difusor.assinar(id_cripto)
+
+    async def enviar():
+        while True:
+            await websocket.send_text(await assinatura.proxima())
+
+    async def receber():
+        # Nada é esperado do cliente; ler só detecta o fechamento.
+        while True:
+            mensagem = await websocket.receive()
+            if mensagem["type"] == "websocket.disconnect":
+                return
+
+    tarefas = [asyncio.create_task(enviar()), asyncio.create_task(receber())]
     try:
-        cotacoes = db.listar_cotacoes(id_cripto)
-        return cotacoes
+        await asyncio.wait(tarefas, return_when=asyncio.FIRST_COMPLETED)
     finally:
-        db.close()
+        for tarefa in tarefas:
+            tarefa.cancel()
+        difusor.cancelar(assinatura)
 
 
 # --- Endpoints for Transações de Mercado ---
 
 
 @app.post("/transacoes/", summary="Create a new transação")
-def create_transacao(transacao: TransacaoIn):
-    db = Database.load()
-    try:
-        id_transacao = db.inserir_transacao(
-            transacao.id_cripto,
-            transacao.data_hora,
-            transacao.tipo,
-            transacao.quantidade,
-            transacao.preco_unitario,
-        )
-        return {"id": id_transacao}
-    finally:
-        db.close()
+async def create_transacao(transacao: TransacaoIn, db: AsyncDatabase = Depends(get_db)):
+    id_transacao = await db.inserir_transacao(
+        transacao.id_cripto,
+        transacao.data_hora,
+        transacao.tipo,
+        transacao.quantidade,
+        transacao.preco_unitario,
+    )
+    return {"id": id_transacao}
+
+
+@app.post("/transacoes/bulk", summary="Create many transações in one transaction")
+async def create_transacoes_bulk(request: Request, db: AsyncDatabase = Depends(get_db)):
+    transacoes = await read_batch(request, TransacaoIn)
+    inseridos = await db.inserir_transacoes(
+        (t.id_cripto, t.data_hora, t.tipo, t.quantidade, t.preco_unitario)
+        for t in transacoes
+    )
+    return {
+        "inseridos": inseridos,
+        "por_criptomoeda": Counter(t.id_cripto for t in transacoes),
+    }
 
 
 @app.get(
     "/transacoes/criptomoeda/{id_cripto}", summary="List transações for a criptomoeda"
 )
-def list_transacoes(id_cripto: int):
-    db = Database.load()
-    try:
-        transacoes = db.listar_transacoes(id_cripto)
-        return transacoes
-    finally:
-        db.close()
+async def list_transacoes(
+    id_cripto: int,
+    pagina: Pagina = Depends(get_pagina),
+    db: AsyncDatabase = Depends(get_db),
+):
+    transacoes = await db.listar_transacoes(id_cripto, pagina)
+    return listagem(
+        transacoes, pagina.proximo_cursor(transacoes, "data_hora", "id_transacao")
+    )
+
+
+@app.get(
+    "/transacoes/criptomoeda/{id_cripto}/export",
+    summary="Stream the full transação history of a criptomoeda",
+)
+async def export_transacoes(
+    id_cripto: int,
+    formato: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+    inicio: Optional[datetime] = Query(None, alias="from"),
+    fim: Optional[datetime] = Query(None, alias="to"),
+    db: AsyncDatabase = Depends(get_db),
+):
+    lotes = db.exportar_transacoes(id_cripto, Pagina(inicio, fim))
+    return StreamingResponse(
+        exportacao.formatar(lotes, formato), media_type=exportacao.FORMATOS[formato]
+    )
+
+
+# --- Endpoint for the Portfólio ---
+
+
+@app.get(
+    "/portfolio",
+    summary="Position, average cost and realized/unrealized P&L per criptomoeda",
+)
+async def read_portfolio(
+    request: Request,
+    id_cripto: Optional[int] = None,
+    db: AsyncDatabase = Depends(get_db),
+):
+    # Aplica antes as transações ainda na fila, só elas são processadas.
+    await request.app.state.portfolio.executar_async(db)
+    return listagem(await db.listar_portfolio(id_cripto))
 
 
 # --- Endpoints for Ordens ---
 
 
-@app.post("/ordens/", summary="Create a new ordem")
-def create_ordem(ordem: OrdemIn):
-    db = Database.load()
+@app.post("/ordens/", summary="Create a new ordem and match it against the book")
+async def create_ordem(
+    ordem: OrdemIn, request: Request, db: AsyncDatabase = Depends(get_db)
+):
     try:
-        id_ordem = db.inserir_ordem(
-            ordem.id_cripto, ordem.tipo, ordem.quantidade, ordem.preco_limite
+        return await request.app.state.motor.submeter(
+            db, ordem.id_cripto, ordem.tipo, ordem.quantidade, ordem.preco_limite
         )
-        return {"id": id_ordem}
-    finally:
-        db.close()
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+@app.delete("/ordens/{id_ordem}", summary="Cancel an ordem")
+async def delete_ordem(
+    id_ordem: int, request: Request, db: AsyncDatabase = Depends(get_db)
+):
+    if not await request.app.state.motor.cancelar(db, id_ordem):
+        raise HTTPException(status_code=404, detail="Ordem não existe.")
+    return {"message": "Ordem cancelled successfully"}
 
 
 @app.get("/ordens/criptomoeda/{id_cripto}", summary="List ordens for a criptomoeda")
-def list_ordens(id_cripto: int):
-    db = Database.load()
-    try:
-        ordens = db.listar_ordens(id_cripto)
-        return ordens
-    finally:
-        db.close()
+async def list_ordens(id_cripto: int, db: AsyncDatabase = Depends(get_db)):
+    ordens = await db.listar_ordens(id_cripto)
+    return listagem(ordens)
+
+
+@app.get(
+    "/ordens/criptomoeda/{id_cripto}/depth",
+    summary="Aggregated order book depth for a criptomoeda",
+)
+async def read_depth(
+    id_cripto: int,
+    request: Request,
+    niveis: int = Query(20, alias="levels", ge=1, le=1000),
+    db: AsyncDatabase = Depends(get_db),
+):
+    return await request.app.state.motor.profundidade(db, id_cripto, niveis)
 
 
 # --- Endpoints for Tendências de Preço ---
 
 
 @app.post("/tendencias/", summary="Create a new tendência")
-def create_tendencia(tendencia: TendenciaIn):
-    db = Database.load()
-    try:
-        id_tendencia = db.inserir_tendencia(
-            tendencia.id_cripto,
-            tendencia.periodo,
-            tendencia.variacao_preco,
-            tendencia.tendencia,
-        )
-        return {"id": id_tendencia}
-    finally:
-        db.close()
+async def create_tendencia(tendencia: TendenciaIn, db: AsyncDatabase = Depends(get_db)):
+    id_tendencia = await db.inserir_tendencia(
+        tendencia.id_cripto,
+        tendencia.periodo,
+        tendencia.variacao_preco,
+        tendencia.tendencia,
+    )
+    return {"id": id_tendencia}
 
 
 @app.get(
     "/tendencias/criptomoeda/{id_cripto}", summary="List tendências for a criptomoeda"
 )
-def list_tendencias(id_cripto: int):
-    db = Database.load()
-    try:
-        tendencias = db.listar_tendencias(id_cripto)
-        return tendencias
-    finally:
-        db.close()
+async def list_tendencias(
+    id_cripto: int,
+    pagina: Pagina = Depends(get_pagina),
+    db: AsyncDatabase = Depends(get_db),
+):
+    tendencias = await db.listar_tendencias(id_cripto, pagina)
+    return listagem(
+        tendencias, pagina.proximo_cursor(tendencias, "data_hora", "id_tendencia")
+    )
 
 
 # --- Endpoints for Dados Externos ---
 
 
 @app.post("/dados_externos/", summary="Create a new dado externo")
-def create_dado_externo(dado: DadoExternoIn):
-    db = Database.load()
-    try:
-        id_dado = db.inserir_dado_externo(dado.descricao, dado.data_hora, dado.valor)
-        return {"id": id_dado}
-    finally:
-        db.close()
+async def create_dado_externo(dado: DadoExternoIn, db: AsyncDatabase = Depends(get_db)):
+    id_dado = await db.inserir_dado_externo(dado.descricao, dado.data_hora, dado.valor)
+    return {"id": id_dado}
 
 
 @app.get("/dados_externos/", summary="List all dados externos")
-def list_dados_externos():
-    db = Database.load()
-    try:
-        dados = db.listar_dados_externos()
-        return dados
-    finally:
-        db.close()
+async def list_dados_externos(
+    pagina: Pagina = Depends(get_pagina),
+    db: AsyncDatabase = Depends(get_db),
+):
+    dados = await db.listar_dados_externos(pagina)
+    return listagem(dados, pagina.proximo_cursor(dados, "data_hora", "id_dado"))
 
 
 # --- Endpoints for Imagens de Criptomoedas ---
 
 
+async def salvar_variantes(app: FastAPI, id_imagem: int, conteudo: bytes):
+    loop = asyncio.get_running_loop()
+    try:
+        variantes = await loop.run_in_executor(
+            app.state.imagens, gerar_variantes, conteudo
+        )
+        await app.state.db.inserir_variantes_imagem(id_imagem, variantes)
+    except Exception:
+        logger.exception("Could not generate renditions for image %s", id_imagem)
+
+
 @app.post("/imagens/criptomoedas/", summary="Upload an image for a criptomoeda")
 async def upload_imagem(
-    id_cripto: int, tipo: str, data_upload: datetime, file: UploadFile = File(...)
+    request: Request,
+    background_tasks: BackgroundTasks,
+    id_cripto: int,
+    tipo: str,
+    data_upload: datetime,
+    file: UploadFile = File(...),
+    db: AsyncDatabase = Depends(get_db),
 ):
     content = await file.read()
-    db = Database.load()
-    try:
-        id_imagem = db.inserir_imagem_criptomoeda(id_cripto, tipo, content, data_upload)
-        return {"id": id_imagem}
-    finally:
-        db.close()
+    id_imagem = await db.inserir_imagem_criptomoeda(
+        id_cripto, tipo, content, data_upload
+    )
+    request.app.state.logos.descartar(lambda chave: chave[0] == id_cripto)
+    # As variantes redimensionadas são geradas depois da resposta, em outro
+    # processo; até lá a imagem original é servida.
+    background_tasks.add_task(salvar_variantes, request.app, id_imagem, content)
+    return {"id": id_imagem}
 
 
 # @app.get("/imagens/criptomoedas/{id_cripto}", summary="List images for a criptomoeda")
@@ -427,60 +783,249 @@ async def upload_imagem(
 
 
 @app.get("/imagens/criptomoedas/{id_cripto}", summary="A imagem da criptomoeda")
-def read_criptomoeda_image(id_cripto: int):
-    db = Database.load()
-    try:
-        crypto = db.read_logo_criptomoeda(id_cripto)
-        if crypto is None:
+async def read_criptomoeda_image(
+    id_cripto: int,
+    request: Request,
+    tamanho: Optional[int] = Query(None, alias="size", ge=1),
+    db: AsyncDatabase = Depends(get_db),
+):
+    formatos = ["png"]
+    if "image/webp" in request.headers.get("accept", ""):
+        formatos.insert(0, "webp")
+    logo = await db.ler_logo(id_cripto, tamanho, formatos)
+    if logo is None:
+        raise HTTPException(status_code=404, detail="Criptomoeda não existe.")
+    id_imagem, largura, formato = logo["id_imagem"], logo["largura"], logo["formato"]
+
+    # Imagens nunca são alteradas, só substituídas por uma nova linha, então
+    # o id da imagem e da variante bastam como validador forte.
+    etag = f'"{id_cripto}-{id_imagem}"'
+    if largura is not None:
+        etag = f'"{id_cripto}-{id_imagem}-{largura}-{formato}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "public, max-age=86400",
+        "Vary": "Accept",
+    }
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match.strip() == "*" or etag in (
+        tag.strip() for tag in if_none_match.split(",")
+    ):
+        return Response(status_code=304, headers=headers)
+
+    logos = request.app.state.logos
+    chave = (id_cripto, id_imagem, largura, formato)
+    conteudo = logos.get(chave)
+    if conteudo is None:
+        if largura is None:
+            conteudo = await db.ler_imagem(id_imagem)
+        else:
+            conteudo = await db.ler_variante(id_imagem, largura, formato)
+        if conteudo is None:
             raise HTTPException(status_code=404, detail="Criptomoeda não existe.")
-
-        return {"image": crypto}
-    finally:
-        db.close()
+        logos.put(chave, conteudo)
+    return Response(conteudo, media_type=tipo_mime(conteudo), headers=headers)
 
 
 # --- Endpoints for Usuários ---
 
 
 @app.post("/usuarios/", summary="Create a new usuário")
-def create_usuario(usuario: UsuarioIn):
-    db = Database.load()
-    try:
-        id_usuario = db.inserir_usuario(
-            usuario.nome, usuario.email, usuario.senha, usuario.admin_flag
-        )
-        return {"id": id_usuario}
-    finally:
-        db.close()
+async def create_usuario(usuario: UsuarioIn, db: AsyncDatabase = Depends(get_db)):
+    id_usuario = await db.inserir_usuario(
+        usuario.nome, usuario.email, usuario.senha, usuario.admin_flag
+    )
+    return {"id": id_usuario}
 
 
 @app.get("/usuarios/", summary="List all usuários")
-def list_usuarios():
-    db = Database.load()
-    try:
-        usuarios = db.listar_usuarios()
-        return usuarios
-    finally:
-        db.close()
+async def list_usuarios(db: AsyncDatabase = Depends(get_db)):
+    usuarios = await db.listar_usuarios()
+    return listagem(usuarios)
 
 
 @app.put("/usuarios/{id_usuario}", summary="Update a usuário")
-def update_usuario(id_usuario: int, usuario: UsuarioIn):
-    db = Database.load()
-    try:
-        db.atualizar_usuario(
-            id_usuario, usuario.nome, usuario.email, usuario.senha, usuario.admin_flag
-        )
-        return {"message": "Usuário updated successfully"}
-    finally:
-        db.close()
+async def update_usuario(
+    id_usuario: int, usuario: UsuarioIn, db: AsyncDatabase = Depends(get_db)
+):
+    await db.atualizar_usuario(
+        id_usuario, usuario.nome, usuario.email, usuario.senha, usuario.admin_flag
+    )
+    return {"message": "Usuário updated successfully"}
 
 
 @app.delete("/usuarios/{id_usuario}", summary="Delete a usuário")
-def delete_usuario(id_usuario: int):
-    db = Database.load()
-    try:
-        db.excluir_usuario(id_usuario)
-        return {"message": "Usuário deleted successfully"}
-    finally:
-        db.close()
+async def delete_usuario(id_usuario: int, db: AsyncDatabase = Depends(get_db)):
+    await db.excluir_usuario(id_usuario)
+    return {"message": "Usuário deleted successfully"}
+
+
+# --- Endpoint for batches of operations ---
+
+# Each batch operation runs the endpoint it mirrors on the batch transaction:
+# (body model or None, call taking the transaction, request, id and body).
+OPERACOES_LOTE = {
+    ("inserir", "noticia"): (
+        NoticiaIn,
+        lambda tx, request, id_registro, corpo: create_noticia(corpo, tx),
+    ),
+    ("atualizar", "noticia"): (
+        NoticiaIn,
+        lambda tx, request, id_registro, corpo: update_noticia(id_registro, corpo, tx),
+    ),
+    ("excluir", "noticia"): (
+        None,
+        lambda tx, request, id_registro, corpo: delete_noticia(id_registro, tx),
+    ),
+    ("inserir", "sentimento"): (
+        SentimentoIn,
+        lambda tx, request, id_registro, corpo: create_sentimento(corpo, tx),
+    ),
+    ("atualizar", "sentimento"): (
+        SentimentoUpdate,
+        lambda tx, request, id_registro, corpo: update_sentimento(corpo, tx),
+    ),
+    ("excluir", "sentimento"): (
+        None,
+        # O id_noticia da rota não é usado para excluir.
+        lambda tx, request, id_registro, corpo: delete_sentimento(
+            None, id_registro, tx
+        ),
+    ),
+    ("inserir", "cotacao"): (
+        CotacaoIn,
+        lambda tx, request, id_registro, corpo: create_cotacao(corpo, request, tx),
+    ),
+    ("inserir", "ordem"): (
+        OrdemIn,
+        lambda tx, request, id_registro, corpo: create_ordem(corpo, request, tx),
+    ),
+    ("excluir", "ordem"): (
+        None,
+        lambda tx, request, id_registro, corpo: delete_ordem(id_registro, request, tx),
+    ),
+}
+
+
+def resolver_referencia(valor: Any, resultados: List[dict]) -> Any:
+    if not (isinstance(valor, dict) and set(valor) == {"ref"}):
+        return valor
+    ref = valor["ref"]
+    # bool é subclasse de int: {"ref": true} não pode valer a operação 1.
+    if not (
+        type(ref) is int and 0 <= ref < len(resultados) and "id" in resultados[ref]
+    ):
+        raise ValueError(
+            f"ref {ref!r} must point to an earlier operation that created a record."
+        )
+    return resultados[ref]["id"]
+
+
+@app.post("/batch", summary="Run many operations in one transaction")
+async def run_batch(
+    lote: LoteIn, request: Request, db: AsyncDatabase = Depends(get_db)
+):
+    """
+    Run the operations in order on a single connection and transaction, so a
+    job creating a notícia and its sentimentos needs one round trip and one
+    commit. Any failure rolls back the whole batch; the error names the index
+    of the operation that failed. Returns the result of each operation, with
+    the generated ``id`` of every insert.
+    """
+    for i, operacao in enumerate(lote.operacoes):
+        if (operacao.acao, operacao.recurso) not in OPERACOES_LOTE:
+            raise HTTPException(
+                status_code=422,
+                detail=f"Operation {i}: cannot {operacao.acao} a {operacao.recurso} "
+                "in a batch.",
+            )
+
+    resultados: List[dict] = []
+    async with db.transacao() as tx:
+        for i, operacao in enumerate(lote.operacoes):
+            modelo, chamada = OPERACOES_LOTE[(operacao.acao, operacao.recurso)]
+            try:
+                id_registro = resolver_referencia(operacao.id, resultados)
+                if operacao.acao != "inserir" and id_registro is None:
+                    raise ValueError(f"{operacao.acao} needs an id.")
+                corpo = None
+                if modelo is not None:
+                    corpo = modelo.model_validate(
+                        {
+                            campo: resolver_referencia(valor, resultados)
+                            for campo, valor in operacao.dados.items()
+                        }
+                    )
+                resultados.append(await chamada(tx, request, id_registro, corpo))
+            except ValidationError as e:
+                raise HTTPException(
+                    status_code=422,
+                    detail={
+                        "operacao": i,
+                        "erro": json.loads(e.json(include_url=False)),
+                    },
+                )
+            except ValueError as e:
+                raise HTTPException(
+                    status_code=422, detail={"operacao": i, "erro": str(e)}
+                )
+            except IntegrityError as e:
+                raise HTTPException(
+                    status_code=409, detail={"operacao": i, "erro": str(e)}
+                )
+            except DataError as e:
+                # Valor que o banco recusa (texto longo demais, número fora da
+                # faixa, caractere NUL): erro do cliente, como uma validação.
+                raise HTTPException(
+                    status_code=422, detail={"operacao": i, "erro": str(e)}
+                )
+            except HTTPException as e:
+                raise HTTPException(
+                    status_code=e.status_code,
+                    detail={"operacao": i, "erro": e.detail},
+                )
+    if any(operacao.recurso == "cotacao" for operacao in lote.operacoes):
+        # De novo após o commit: o sinal dado dentro da transação pode ter
+        # chegado antes de as cotações ficarem visíveis.
+        request.app.state.cotacoes_novas.set()
+    return {"resultados": resultados}
+
+
+# --- Endpoints for the connection pool ---
+
+
+@app.get("/pool/stats", summary="Connection pool statistics")
+async def read_pool_stats(db: AsyncDatabase = Depends(get_db)):
+    return db.stats()
+
+
+@app.get("/stream/stats", summary="Live cotação stream statistics")
+async def read_stream_stats(request: Request):
+    return request.app.state.difusor.stats()
+
+
+@app.get("/metrics", summary="Prometheus metrics", response_class=PlainTextResponse)
+async def read_metrics(request: Request, db: AsyncDatabase = Depends(get_db)):
+    fontes = {
+        metricas.POOL: [({}, db.stats())],
+        metricas.CACHE: [
+            ({"cache": "referencias"}, db.cache.stats()),
+            ({"cache": "logos"}, request.app.state.logos.stats()),
+        ],
+        metricas.STREAM: [({}, request.app.state.difusor.stats())],
+    }
+    for medidor, series in fontes.items():
+        for rotulos, valores in series:
+            for estatistica, valor in valores.items():
+                medidor.definir(valor, estatistica=estatistica, **rotulos)
+    return PlainTextResponse(
+        metricas.REGISTRO.exportar(), media_type="text/plain; version=0.0.4"
+    )
+
+
+@app.get("/cache/stats", summary="In-memory cache statistics")
+async def read_cache_stats(request: Request, db: AsyncDatabase = Depends(get_db)):
+    return {
+        "referencias": db.cache.stats(),
+        "logos": request.app.state.logos.stats(),
+    }
@@ -125,7 +125,8 @@ CREATE TABLE Tendências_Preço (
     id_cripto INT REFERENCES Criptomoedas (id_cripto), -- Referência à criptomoeda
     periodo VARCHAR(20), -- Período analisado (ex.: 24h, 7d)
     variacao_preco DECIMAL(5, 2), -- Variação percentual do preço
-    tendencia VARCHAR(20) -- Classificação da tendência (alta, baixa, estável)
+    tendencia VARCHAR(20), -- Classificação da tendência (alta, baixa, estável)
+    data_hora TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP -- Data e hora do cálculo da tendência
 );
 
 COMMENT ON TABLE Tendências_Preço IS 'Tabela que armazena informações sobre tendências de preços de criptomoedas.';
@@ -134,6 +135,7 @@ COMMENT ON COLUMN Tendências_Preço.id_cripto IS 'Referência à criptomoeda';
 COMMENT ON COLUMN Tendências_Preço.periodo IS 'Período analisado (ex.: 24h, 7d)';
 COMMENT ON COLUMN Tendências_Preço.variacao_preco IS 'Variação percentual do preço';
 COMMENT ON COLUMN Tendências_Preço.tendencia IS 'Classificação da tendência (alta, baixa, estável)';
+COMMENT ON COLUMN Tendências_Preço.data_hora IS 'Data e hora do cálculo da tendência';
 
 -- Tabela Dados Externos
 CREATE TABLE Dados_Externos (
@@ -0,0 +1,131 @@
+import asyncio
+import datetime
+from decimal import Decimal
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from crypto.arquivo import ESQUEMA, Arquivo, alcance, mesclar, mesclar_lotes
+from crypto.paginacao import Pagina, encode_cursor
+
+FEVEREIRO = datetime.date(2025, 2, 1)
+MARCO = datetime.datetime(2025, 3, 1)
+
+
+def cotacao(id_cotacao: int, data_hora: datetime.datetime) -> dict:
+    return {
+        "id_cotacao": id_cotacao,
+        "data_hora": data_hora,
+        "preco": Decimal("1.00000000"),
+        "volume": Decimal("0.00"),
+        "market_cap": Decimal("0.00"),
+        "variacao": Decimal("0.00"),
+    }
+
+
+def chaves(linhas):
+    return [(row["data_hora"], row["id_cotacao"]) for row in linhas]
+
+
+@pytest.fixture
+def arquivo(tmp_path):
+    """Fevereiro arquivado: ids 1..6 nos últimos dias do mês, grupos de 2 linhas."""
+    arquivo = Arquivo(str(tmp_path), linhas_por_grupo=2)
+    linhas = [cotacao(i, datetime.datetime(2025, 2, 22 + i)) for i in range(1, 7)]
+    caminho = arquivo.caminho(1, FEVEREIRO)
+    (tmp_path / caminho).parent.mkdir(parents=True)
+    pq.write_table(
+        pa.Table.from_pylist(linhas, schema=ESQUEMA),
+        str(tmp_path / caminho),
+        row_group_size=2,
+    )
+    return arquivo, [(FEVEREIRO, caminho)]
+
+
+def test_pagina_atravessa_a_fronteira_em_ordem(arquivo):
+    arquivo, meses = arquivo
+    vivas = [cotacao(8, MARCO + datetime.timedelta(days=1)), cotacao(7, MARCO)]
+    linhas = arquivo.completar(vivas, meses, Pagina(limite=4))
+    assert [row["id_cotacao"] for row in linhas] == [8, 7, 6, 5]
+
+
+def test_cursor_continua_no_arquivo_depois_da_linha_apontada(arquivo):
+    arquivo, meses = arquivo
+    cursor = encode_cursor(datetime.datetime(2025, 2, 27), 5)
+    linhas = arquivo.completar([], meses, Pagina(limite=3, cursor=cursor))
+    assert [row["id_cotacao"] for row in linhas] == [4, 3, 2]
+
+
+def test_empate_de_data_hora_entre_vivas_e_arquivo_segue_o_id(arquivo):
+    arquivo, meses = arquivo
+    # Cotação viva com a mesma data_hora da id 6 arquivada.
+    vivas = [cotacao(9, datetime.datetime(2025, 2, 28))]
+    linhas = arquivo.completar(vivas, meses, Pagina(limite=3))
+    assert chaves(linhas) == [
+        (datetime.datetime(2025, 2, 28), 9),
+        (datetime.datetime(2025, 2, 28), 6),
+        (datetime.datetime(2025, 2, 27), 5),
+    ]
+    cursor = encode_cursor(datetime.datetime(2025, 2, 28), 9)
+    linhas = arquivo.completar([], meses, Pagina(limite=1, cursor=cursor))
+    assert [row["id_cotacao"] for row in linhas] == [6]
+
+
+def test_linha_nos_dois_lugares_aparece_uma_vez(arquivo):
+    arquivo, meses = arquivo
+    vivas = [cotacao(6, datetime.datetime(2025, 2, 28))]
+    linhas = arquivo.completar(vivas, meses, Pagina(limite=3))
+    assert [row["id_cotacao"] for row in linhas] == [6, 5, 4]
+
+
+def test_janela_fora_do_arquivo_nao_le_os_meses():
+    # O caminho não existe: ler o mês quebraria o teste.
+    arquivo, meses = Arquivo("/nao/existe"), [(FEVEREIRO, "ausente.parquet")]
+    vivas = [cotacao(8, MARCO + datetime.timedelta(days=1)), cotacao(7, MARCO)]
+    assert arquivo.completar(vivas, meses, Pagina(limite=2)) == vivas
+    assert arquivo.completar(vivas, meses, Pagina(inicio=MARCO)) == vivas
+    assert Arquivo.meses_da_pagina(meses, Pagina(limite=2), vivas) == []
+    assert Arquivo.meses_da_pagina(meses, Pagina(limite=3), vivas) == meses
+
+
+def test_alcance():
+    inicio, fim = datetime.datetime(2025, 1, 1), datetime.datetime(2025, 4, 1)
+    cursor = encode_cursor(MARCO, 7)
+    assert alcance(Pagina()) == (None, None)
+    assert alcance(Pagina(inicio, fim)) == (
+        inicio,
+        fim - datetime.timedelta(microseconds=1),
+    )
+    assert alcance(Pagina(inicio, fim, cursor=cursor)) == (inicio, MARCO)
+    vivas = [cotacao(7, MARCO), cotacao(6, datetime.datetime(2025, 2, 15))]
+    assert alcance(Pagina(inicio, limite=2), vivas)[0] == vivas[-1]["data_hora"]
+    assert alcance(Pagina(inicio, limite=3), vivas)[0] == inicio
+
+
+def test_exportacao_mescla_tudo_em_ordem(arquivo):
+    arquivo, meses = arquivo
+    vivas = [[cotacao(8, MARCO)], [cotacao(6, datetime.datetime(2025, 2, 28))]]
+    lotes = list(arquivo.completar_exportacao(iter(vivas), meses, Pagina(), lote=4))
+    assert [len(lote) for lote in lotes] == [4, 3]
+    ids = [row["id_cotacao"] for lote in lotes for row in lote]
+    assert ids == [8, 6, 5, 4, 3, 2, 1]
+
+
+def test_mesclar_lotes_equivale_a_mesclar():
+    vivas = [cotacao(i, MARCO + datetime.timedelta(hours=i)) for i in (9, 7, 4, 2)]
+    arquivadas = [cotacao(i, MARCO + datetime.timedelta(hours=i)) for i in (8, 7, 3)]
+
+    async def lotes(linhas, tamanho):
+        for i in range(0, len(linhas), tamanho):
+            yield linhas[i : i + tamanho]
+
+    async def coletar():
+        saida = []
+        async for lote in mesclar_lotes(lotes(vivas, 3), lotes(arquivadas, 1)):
+            saida.extend(lote)
+        return saida
+
+    esperado = list(mesclar(vivas, arquivadas))
+    assert [row["id_cotacao"] for row in esperado] == [9, 8, 7, 4, 3, 2]
+    assert asyncio.run(coletar()) == esperado
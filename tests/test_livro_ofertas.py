@@ -0,0 +1,157 @@
+import random
+from decimal import Decimal
+
+import pytest
+
+from crypto.livro_ofertas import (
+    COMPRA,
+    VENDA,
+    Execucao,
+    LivroOfertas,
+    Ordem,
+    normalizar_tipo,
+)
+
+
+def D(valor) -> Decimal:
+    return Decimal(str(valor))
+
+
+def ordem(id_ordem, tipo, quantidade, preco) -> Ordem:
+    return Ordem(id_ordem, tipo, D(quantidade), D(preco))
+
+
+def submeter(livro: LivroOfertas, nova: Ordem):
+    execucoes = livro.simular(nova)
+    livro.aplicar(nova, execucoes)
+    return execucoes
+
+
+def niveis(livro: LivroOfertas, chave: str):
+    return [(n["preco"], n["quantidade"]) for n in livro.profundidade(100)[chave]]
+
+
+def test_normalizar_tipo():
+    assert normalizar_tipo(" compra ") == COMPRA
+    with pytest.raises(ValueError):
+        normalizar_tipo("troca")
+
+
+def test_prioridade_por_preco_e_depois_por_chegada():
+    livro = LivroOfertas()
+    livro.adicionar(ordem(1, VENDA, 1, 101))
+    livro.adicionar(ordem(2, VENDA, 1, 100))
+    livro.adicionar(ordem(3, VENDA, 1, 100))
+    livro.adicionar(ordem(4, VENDA, 1, 102))
+    execucoes = submeter(livro, ordem(5, COMPRA, 3, 101))
+    assert execucoes == [
+        Execucao(2, D(1), D(100)),
+        Execucao(3, D(1), D(100)),
+        Execucao(1, D(1), D(101)),
+    ]
+    assert niveis(livro, "asks") == [(D(102), D(1))]
+    assert niveis(livro, "bids") == []
+
+
+def test_ordem_nao_cruza_alem_do_limite():
+    livro = LivroOfertas()
+    livro.adicionar(ordem(1, COMPRA, 2, 99))
+    execucoes = submeter(livro, ordem(2, VENDA, 1, 100))
+    assert execucoes == []
+    assert niveis(livro, "bids") == [(D(99), D(2))]
+    assert niveis(livro, "asks") == [(D(100), D(1))]
+
+
+def test_execucao_parcial_da_passiva():
+    livro = LivroOfertas()
+    livro.adicionar(ordem(1, COMPRA, 5, 100))
+    execucoes = submeter(livro, ordem(2, VENDA, 2, 100))
+    assert execucoes == [Execucao(1, D(2), D(100))]
+    assert livro.ordens[1].quantidade == D(3)
+    assert niveis(livro, "bids") == [(D(100), D(3))]
+
+
+def test_execucao_parcial_da_agressora_fica_no_livro():
+    livro = LivroOfertas()
+    livro.adicionar(ordem(1, VENDA, 1, 100))
+    execucoes = submeter(livro, ordem(2, COMPRA, 4, 100.5))
+    assert execucoes == [Execucao(1, D(1), D(100))]
+    assert livro.ordens[2].quantidade == D(3)
+    assert niveis(livro, "bids") == [(D("100.5"), D(3))]
+    assert niveis(livro, "asks") == []
+
+
+def test_cancelar_mantem_prioridade_das_demais():
+    livro = LivroOfertas()
+    for id_ordem in (1, 2, 3):
+        livro.adicionar(ordem(id_ordem, VENDA, 1, 100))
+    assert livro.cancelar(2).id_ordem == 2
+    assert livro.cancelar(2) is None
+    execucoes = submeter(livro, ordem(4, COMPRA, 2, 100))
+    assert [e.id_ordem for e in execucoes] == [1, 3]
+
+
+def test_copiar_mantem_prioridade_e_nao_altera_o_original():
+    livro = LivroOfertas()
+    for id_ordem in (1, 2, 3):
+        livro.adicionar(ordem(id_ordem, VENDA, 1, 100))
+    livro.adicionar(ordem(4, COMPRA, 1, 99))
+    copia = livro.copiar()
+    execucoes = submeter(copia, ordem(5, COMPRA, 2, 100))
+    assert [e.id_ordem for e in execucoes] == [1, 2]
+    copia.cancelar(4)
+    assert niveis(livro, "asks") == [(D(100), D(3))]
+    assert niveis(livro, "bids") == [(D(99), D(1))]
+    assert list(livro.ordens) == [1, 2, 3, 4]
+
+
+def test_nivel_vazio_sai_do_livro_e_pode_voltar():
+    livro = LivroOfertas()
+    livro.adicionar(ordem(1, COMPRA, 1, 100))
+    livro.adicionar(ordem(2, COMPRA, 1, 99))
+    livro.cancelar(1)
+    assert niveis(livro, "bids") == [(D(99), D(1))]
+    assert D(100) not in livro.lados[COMPRA].niveis
+    livro.adicionar(ordem(3, COMPRA, 2, 100))
+    assert niveis(livro, "bids") == [(D(100), D(2)), (D(99), D(1))]
+    assert livro.profundidade(1)["bids"][0]["ordens"] == 1
+
+
+def test_profundidade_acumulada():
+    livro = LivroOfertas()
+    livro.adicionar(ordem(1, COMPRA, 1, 98))
+    livro.adicionar(ordem(2, COMPRA, 2, 99))
+    livro.adicionar(ordem(3, COMPRA, 3, 99))
+    livro.adicionar(ordem(4, VENDA, 4, 101))
+    snapshot = livro.profundidade(2)
+    assert [(n["preco"], n["quantidade_acumulada"]) for n in snapshot["bids"]] == [
+        (D(99), D(5)),
+        (D(98), D(6)),
+    ]
+    assert snapshot["asks"][0]["quantidade_acumulada"] == D(4)
+
+
+def test_melhores_em_ordem_com_remocoes_preguicosas():
+    # Compara a ordem dos níveis com uma lista ordenada depois de muitas
+    # aberturas e remoções, que deixam entradas velhas no heap.
+    rng = random.Random(3)
+    livro = LivroOfertas()
+    abertas = {}
+    for id_ordem in range(1, 5000):
+        if abertas and rng.random() < 0.45:
+            livro.cancelar(rng.choice(list(abertas)))
+            abertas = {i: o for i, o in abertas.items() if i in livro.ordens}
+            continue
+        tipo = rng.choice([COMPRA, VENDA])
+        preco = D(rng.randint(1, 300)) if tipo == COMPRA else D(rng.randint(301, 600))
+        nova = Ordem(id_ordem, tipo, D(1), preco)
+        livro.adicionar(nova)
+        abertas[id_ordem] = nova
+    for tipo, reverso in ((COMPRA, True), (VENDA, False)):
+        lado = livro.lados[tipo]
+        esperados = sorted(
+            {o.preco_limite for o in abertas.values() if o.tipo == tipo},
+            reverse=reverso,
+        )
+        assert list(lado.melhores()) == esperados
+        assert len(lado.heap) <= 2 * len(lado.niveis) + 64
@@ -0,0 +1,92 @@
+from contextlib import asynccontextmanager
+
+import pytest
+from fastapi.testclient import TestClient
+from psycopg import DataError, IntegrityError
+
+from server import app, get_db, resolver_referencia
+
+RESULTADOS = [
+    {"id": 7},
+    {"message": "Notícia updated successfully"},
+    {"id": 9, "quantidade_restante": 1.0, "execucoes": []},
+]
+
+
+def test_referencia_vira_o_id_da_operacao():
+    assert resolver_referencia({"ref": 0}, RESULTADOS) == 7
+    assert resolver_referencia({"ref": 2}, RESULTADOS) == 9
+
+
+@pytest.mark.parametrize(
+    "valor", [None, 3, "texto", {"ref": 0, "outro": 1}, {"id": 0}, [{"ref": 0}]]
+)
+def test_valores_que_nao_sao_referencia_passam_intactos(valor):
+    assert resolver_referencia(valor, RESULTADOS) == valor
+
+
+@pytest.mark.parametrize("ref", [1, 3, -1, "0", 0.0, True, None])
+def test_referencia_invalida(ref):
+    # 1 não criou registro; 3 ainda não rodou; as demais não são índices.
+    with pytest.raises(ValueError, match="earlier operation"):
+        resolver_referencia({"ref": ref}, RESULTADOS)
+
+
+def test_referencia_sem_resultados_anteriores():
+    with pytest.raises(ValueError):
+        resolver_referencia({"ref": 0}, [])
+
+
+def test_booleano_nao_e_indice():
+    with pytest.raises(ValueError):
+        resolver_referencia({"ref": True}, [{"id": 1}, {"id": 2}])
+
+
+class BancoRecusa:
+    """Stand-in for AsyncDatabase whose second insert fails with ``erro``."""
+
+    def __init__(self, erro):
+        self.erro = erro
+        self.inseridas = 0
+
+    @asynccontextmanager
+    async def transacao(self):
+        yield self
+
+    async def insert_noticia(self, *args):
+        self.inseridas += 1
+        if self.inseridas == 2:
+            raise self.erro
+        return self.inseridas
+
+
+NOTICIA = {
+    "acao": "inserir",
+    "recurso": "noticia",
+    "dados": {
+        "id_cripto": 1,
+        "data_publicacao": "2026-01-01",
+        "tema": "t",
+        "noticia": "n",
+        "fonte": "f",
+    },
+}
+
+
+@pytest.mark.parametrize(
+    "erro, status",
+    [
+        (DataError("value too long for type character varying(50)"), 422),
+        (IntegrityError("duplicate key value"), 409),
+    ],
+)
+def test_erro_do_banco_nomeia_a_operacao(erro, status):
+    app.dependency_overrides[get_db] = lambda: BancoRecusa(erro)
+    try:
+        resposta = TestClient(app).post(
+            "/batch", json={"operacoes": [NOTICIA, NOTICIA]}
+        )
+    finally:
+        app.dependency_overrides.clear()
+    assert resposta.status_code == status
+    assert resposta.json()["detail"] == {"operacao": 1, "erro": str(erro)}
@@ -0,0 +1,166 @@
+import pytest
+
+from crypto import migrations
+from crypto.migrations import (
+    Migracao,
+    aplicar_migracao,
+    carregar_migracoes,
+    dividir_comandos,
+)
+
+
+class Cursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, args=None):
+        self.conn.comandos.append((query, args, self.conn.autocommit))
+
+    def fetchall(self):
+        return []
+
+
+class Conexao:
+    """Records the statements run and whether autocommit was on for each."""
+
+    def __init__(self):
+        self.autocommit = False
+        self.comandos = []
+        self.commits = 0
+
+    def cursor(self):
+        return Cursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+
+def migracao(tmp_path, nome, sql):
+    caminho = tmp_path / nome
+    caminho.write_text(sql, encoding="utf-8")
+    versao, resto = nome.split("_", 1)
+    return Migracao(int(versao), resto[: -len(".sql")], str(caminho))
+
+
+def test_dividir_comandos_simples():
+    assert dividir_comandos("SELECT 1; SELECT 2;\n") == ["SELECT 1", "SELECT 2"]
+
+
+def test_dividir_ignora_ponto_e_virgula_em_strings_e_comentarios():
+    sql = """
+        -- comentário; com ponto e vírgula
+        INSERT INTO T VALUES ('a;b', 'it''s; ok');
+        SELECT 2; -- fim; de linha
+    """
+    assert dividir_comandos(sql) == [
+        "-- comentário; com ponto e vírgula\n        "
+        "INSERT INTO T VALUES ('a;b', 'it''s; ok')",
+        "SELECT 2",
+    ]
+
+
+def test_dividir_respeita_dollar_quote():
+    sql = """
+        CREATE FUNCTION f () RETURNS INT LANGUAGE plpgsql AS $corpo$
+        BEGIN
+            PERFORM 1; RETURN 1;
+        END;
+        $corpo$;
+        DO $$ BEGIN PERFORM 2; END $$;
+    """
+    comandos = dividir_comandos(sql)
+    assert len(comandos) == 2
+    assert comandos[0].endswith("$corpo$")
+    assert "PERFORM 1; RETURN 1;" in comandos[0]
+    assert comandos[1] == "DO $$ BEGIN PERFORM 2; END $$"
+
+
+def test_dividir_descarta_trechos_so_com_comentarios():
+    assert dividir_comandos("-- nada\n;\n-- só comentário\n") == []
+
+
+def test_transacional(tmp_path):
+    assert migracao(tmp_path, "0001_a.sql", "SELECT 1;").transacional
+    sem = migracao(
+        tmp_path, "0002_b.sql", "\n-- migracao: sem-transacao\nCREATE INDEX ...;"
+    )
+    assert not sem.transacional
+
+
+def test_carregar_ordena_e_ignora_outros_arquivos(tmp_path):
+    for nome in ["0010_b.sql", "0002_a.sql", "leia-me.txt", "3_c.sql.bak"]:
+        (tmp_path / nome).write_text("SELECT 1;")
+    assert [(m.versao, m.nome) for m in carregar_migracoes(str(tmp_path))] == [
+        (2, "a"),
+        (10, "b"),
+    ]
+
+
+def test_carregar_rejeita_versao_duplicada(tmp_path):
+    (tmp_path / "0001_a.sql").write_text("SELECT 1;")
+    (tmp_path / "0001_b.sql").write_text("SELECT 1;")
+    with pytest.raises(ValueError):
+        carregar_migracoes(str(tmp_path))
+
+
+def test_versoes_do_repositorio():
+    versoes = [m.versao for m in carregar_migracoes()]
+    assert versoes == sorted(versoes)
+    # Os candles vêm antes da 0011, que recria o gatilho deles.
+    assert versoes[0] == 0
+
+
+def test_aplicar_transacional_em_um_comando(tmp_path):
+    conn = Conexao()
+    m = migracao(tmp_path, "0001_a.sql", "SELECT 1; SELECT 2;")
+    aplicar_migracao(conn, m)
+    assert [c[0] for c in conn.comandos] == [
+        "SELECT 1; SELECT 2;",
+        "INSERT INTO Migracoes (versao, nome) VALUES (%s, %s);",
+    ]
+    assert not any(autocommit for _, _, autocommit in conn.comandos)
+    assert conn.commits == 1
+
+
+def test_aplicar_sem_transacao_comando_a_comando(tmp_path):
+    conn = Conexao()
+    sql = (
+        "-- migracao: sem-transacao\n"
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_a ON T (a);\n"
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_b ON T (b);\n"
+    )
+    aplicar_migracao(conn, migracao(tmp_path, "0002_b.sql", sql))
+    executados = [c[0] for c in conn.comandos]
+    # Primeiro procura índices inválidos de uma tentativa interrompida.
+    assert "pg_index" in executados[0]
+    assert conn.comandos[0][1] == (["idx_a", "idx_b"],)
+    assert executados[1:] == [
+        "-- migracao: sem-transacao\n"
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_a ON T (a)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_b ON T (b)",
+        "INSERT INTO Migracoes (versao, nome) VALUES (%s, %s);",
+    ]
+    assert all(autocommit for _, _, autocommit in conn.comandos)
+    assert conn.autocommit is False
+
+
+def test_aplicar_sem_transacao_restaura_autocommit_no_erro(tmp_path, monkeypatch):
+    conn = Conexao()
+
+    def falhar(*args):
+        raise RuntimeError("falhou")
+
+    monkeypatch.setattr(migrations, "_remover_indices_invalidos", falhar)
+    m = migracao(tmp_path, "0003_c.sql", "-- migracao: sem-transacao\nSELECT 1;")
+    with pytest.raises(RuntimeError):
+        aplicar_migracao(conn, m)
+    assert conn.autocommit is False
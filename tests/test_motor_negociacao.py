@@ -0,0 +1,157 @@
+import asyncio
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from decimal import Decimal
+
+import pytest
+
+from crypto.async_database import AsyncDatabase
+from crypto.livro_ofertas import MotorNegociacao
+
+
+class Banco:
+    """Ordens e Ordens_Versoes em memória; a trava de linha dura até o commit."""
+
+    def __init__(self):
+        self.ordens = {}
+        self.proximo = 1
+        self.versoes = defaultdict(int)
+        self.travas = defaultdict(asyncio.Lock)
+        self.transacoes = []
+
+
+class Conexao:
+    def __init__(self, banco: Banco):
+        self.banco = banco
+        self.nivel = 0
+        self.travadas = []
+
+    @asynccontextmanager
+    async def transaction(self):
+        self.nivel += 1
+        try:
+            yield
+        finally:
+            self.nivel -= 1
+            if self.nivel == 0:
+                for trava in self.travadas:
+                    trava.release()
+                self.travadas.clear()
+
+
+class Pool:
+    def __init__(self, banco: Banco):
+        self.banco = banco
+
+    @asynccontextmanager
+    async def connection(self):
+        yield Conexao(self.banco)
+
+
+class BancoFalso(AsyncDatabase):
+    @property
+    def banco(self) -> Banco:
+        return self.pool.banco
+
+    async def travar_livro(self, id_cripto: int) -> int:
+        trava = self.banco.travas[id_cripto]
+        if trava not in self.conn.travadas:
+            await trava.acquire()
+            self.conn.travadas.append(trava)
+        return self.banco.versoes[id_cripto]
+
+    async def versao_livro(self, id_cripto: int) -> int:
+        return self.banco.versoes[id_cripto]
+
+    async def listar_ordens_abertas(self, id_cripto=None):
+        return [
+            dict(ordem)
+            for ordem in self.banco.ordens.values()
+            if id_cripto is None or ordem["id_cripto"] == id_cripto
+        ]
+
+    async def ler_ordem(self, id_ordem: int):
+        ordem = self.banco.ordens.get(id_ordem)
+        return dict(ordem) if ordem is not None else None
+
+    async def inserir_ordem(self, id_cripto, tipo, quantidade, preco_limite) -> int:
+        id_ordem, self.banco.proximo = self.banco.proximo, self.banco.proximo + 1
+        self.banco.ordens[id_ordem] = {
+            "id_ordem": id_ordem,
+            "id_cripto": id_cripto,
+            "tipo": tipo,
+            "quantidade": quantidade,
+            "preco_limite": preco_limite,
+        }
+        self.banco.versoes[id_cripto] += 1
+        return id_ordem
+
+    async def atualizar_quantidade_ordem(self, id_ordem: int, quantidade):
+        ordem = self.banco.ordens[id_ordem]
+        if quantidade == 0:
+            del self.banco.ordens[id_ordem]
+        else:
+            ordem["quantidade"] = quantidade
+        self.banco.versoes[ordem["id_cripto"]] += 1
+
+    async def excluir_ordem(self, id_ordem: int):
+        ordem = self.banco.ordens.pop(id_ordem)
+        self.banco.versoes[ordem["id_cripto"]] += 1
+
+    async def inserir_transacoes(self, transacoes) -> int:
+        transacoes = list(transacoes)
+        self.banco.transacoes.extend(transacoes)
+        return len(transacoes)
+
+
+def executar(coro):
+    # Um impasse vira falha do teste em vez de travar a suíte.
+    return asyncio.run(asyncio.wait_for(coro, 5))
+
+
+def test_lote_com_duas_ordens_e_submissao_concorrente():
+    async def cenario():
+        db, motor = BancoFalso(Pool(Banco())), MotorNegociacao()
+        primeira = asyncio.Event()
+
+        async def lote():
+            async with db.transacao() as tx:
+                await motor.submeter(tx, 1, "venda", 1, 100)
+                primeira.set()
+                # A submissão avulsa chega à trava do livro no meio do lote.
+                for _ in range(10):
+                    await asyncio.sleep(0)
+                await motor.submeter(tx, 1, "venda", 1, 101)
+                # Nada do lote chega ao livro publicado antes do commit.
+                assert motor.livros[1].profundidade(10)["asks"] == []
+
+        async def avulsa():
+            await primeira.wait()
+            return await motor.submeter(db, 1, "compra", 3, 101)
+
+        _, resposta = await asyncio.gather(lote(), avulsa())
+        return resposta, await motor.profundidade(db, 1, 10)
+
+    resposta, profundidade = executar(cenario())
+    assert [(e["quantidade"], e["preco"]) for e in resposta["execucoes"]] == [
+        (1, 100),
+        (1, 101),
+    ]
+    assert resposta["quantidade_restante"] == 1
+    assert profundidade["asks"] == []
+    assert [(n["preco"], n["quantidade"]) for n in profundidade["bids"]] == [
+        (Decimal(101), 1)
+    ]
+
+
+def test_lote_desfeito_solta_a_trava_do_livro():
+    async def cenario():
+        db, motor = BancoFalso(Pool(Banco())), MotorNegociacao()
+        with pytest.raises(RuntimeError):
+            async with db.transacao() as tx:
+                await motor.submeter(tx, 1, "venda", 1, 100)
+                raise RuntimeError("falha depois da ordem")
+        assert not motor._locks[1].locked()
+        return await motor.submeter(db, 1, "venda", 1, 102)
+
+    assert executar(cenario())["quantidade_restante"] == 1
@@ -0,0 +1,129 @@
+import datetime
+import sqlite3
+
+import pytest
+
+from crypto.paginacao import (
+    Pagina,
+    decode_cursor,
+    decode_rank_cursor,
+    encode_cursor,
+    encode_rank_cursor,
+)
+
+INSTANTE = datetime.datetime(2025, 3, 1, 12, 30, 15, 123456)
+
+
+def test_cursor_ida_e_volta():
+    cursor = encode_cursor(INSTANTE, 42)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (INSTANTE, 42)
+
+
+def test_cursor_de_data():
+    cursor = encode_cursor(datetime.date(2025, 3, 1), 7)
+    assert decode_cursor(cursor) == (datetime.datetime(2025, 3, 1), 7)
+
+
+def test_cursor_de_rank_ida_e_volta():
+    assert decode_rank_cursor(encode_rank_cursor(0.25, 9)) == (0.25, 9)
+
+
+@pytest.mark.parametrize("cursor", ["", "lixo", encode_rank_cursor(0.5, 1)])
+def test_cursor_invalido(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_sql_sem_filtros():
+    sql, args = Pagina().sql("data_hora", "id_cotacao")
+    assert sql == "ORDER BY data_hora DESC, id_cotacao DESC"
+    assert args == ()
+
+
+def test_sql_com_janela_e_limite():
+    inicio, fim = datetime.date(2025, 1, 1), datetime.date(2025, 2, 1)
+    sql, args = Pagina(inicio, fim, limite=10).sql(
+        "data_hora", "id_cotacao", ["id_cripto = %s"], [3]
+    )
+    assert sql == (
+        "WHERE id_cripto = %s AND data_hora >= %s AND data_hora < %s\n"
+        "ORDER BY data_hora DESC, id_cotacao DESC\n"
+        "LIMIT %s"
+    )
+    assert args == (3, inicio, fim, 10)
+
+
+def test_sql_com_cursor():
+    pagina = Pagina(limite=5, cursor=encode_cursor(INSTANTE, 42))
+    condicoes, args = pagina.condicoes("data_hora", "id_cotacao")
+    # A condição só no tempo é redundante com a de linha, mas poda partições.
+    assert condicoes == [
+        "data_hora <= %s",
+        "(data_hora, id_cotacao) < (%s, %s)",
+    ]
+    assert args == [INSTANTE, INSTANTE, 42]
+
+
+def paginar(pagina: Pagina, linhas: list) -> list:
+    """
+    Run the tail ``pagina.sql`` builds on SQLite, which also compares rows
+    with ``(a, b) < (c, d)``. Instants go in as ISO text, which sorts the same.
+    """
+    conexao = sqlite3.connect(":memory:")
+    conexao.execute("CREATE TABLE Cotacoes (id_cripto, data_hora, id_cotacao)")
+    conexao.executemany(
+        "INSERT INTO Cotacoes VALUES (?, ?, ?)",
+        [(1, instante.isoformat(), id_) for instante, id_ in linhas],
+    )
+    sql, args = pagina.sql("data_hora", "id_cotacao", ["id_cripto = %s"], [1])
+    args = [a.isoformat() if isinstance(a, datetime.date) else a for a in args]
+    query = "SELECT data_hora, id_cotacao FROM Cotacoes " + sql.replace("%s", "?")
+    return [
+        (datetime.datetime.fromisoformat(instante), id_)
+        for instante, id_ in conexao.execute(query, args)
+    ]
+
+
+def test_predicado_do_cursor_segue_a_ordem():
+    # Empates de data_hora são desfeitos pelo id, também entre páginas.
+    linhas = [
+        (INSTANTE + datetime.timedelta(seconds=s), i)
+        for i, s in enumerate([0, 0, 1, 1, 1, 2, 3], start=1)
+    ]
+    ordenadas = sorted(linhas, reverse=True)
+    pagina, lidas = Pagina(limite=2), []
+    while True:
+        linhas_pagina = paginar(pagina, linhas)
+        lidas.extend(linhas_pagina)
+        rows = [{"data_hora": t, "id_cotacao": i} for t, i in linhas_pagina]
+        cursor = pagina.proximo_cursor(rows, "data_hora", "id_cotacao")
+        if cursor is None:
+            break
+        pagina = Pagina(limite=2, cursor=cursor)
+    assert lidas == ordenadas
+
+    for posicao, (instante, id_) in enumerate(ordenadas):
+        cursor = encode_cursor(instante, id_)
+        assert paginar(Pagina(cursor=cursor), linhas) == ordenadas[posicao + 1 :]
+
+
+def test_predicado_do_cursor_dentro_da_janela():
+    linhas = [(INSTANTE + datetime.timedelta(minutes=m), m) for m in range(10)]
+    inicio = INSTANTE + datetime.timedelta(minutes=2)
+    fim = INSTANTE + datetime.timedelta(minutes=8)
+    cursor = encode_cursor(INSTANTE + datetime.timedelta(minutes=6), 6)
+    pagina = Pagina(inicio, fim, limite=3, cursor=cursor)
+    assert [id_ for _, id_ in paginar(pagina, linhas)] == [5, 4, 3]
+
+
+def test_proximo_cursor():
+    pagina = Pagina(limite=2)
+    linhas = [
+        {"data_hora": INSTANTE, "id_cotacao": 9},
+        {"data_hora": INSTANTE, "id_cotacao": 8},
+    ]
+    cursor = pagina.proximo_cursor(linhas, "data_hora", "id_cotacao")
+    assert decode_cursor(cursor) == (INSTANTE, 8)
+    assert pagina.proximo_cursor(linhas[:1], "data_hora", "id_cotacao") is None
+    assert Pagina().proximo_cursor(linhas, "data_hora", "id_cotacao") is None
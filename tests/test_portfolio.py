@@ -0,0 +1,128 @@
+import datetime
+from decimal import Decimal
+
+from crypto.portfolio import (
+    COMPRA,
+    VENDA,
+    MotorPortfolio,
+    Posicao,
+    agrupar,
+    aplicar,
+    sinal,
+    volume_oposto,
+)
+
+T0 = datetime.datetime(2025, 3, 1)
+
+
+def D(valor) -> Decimal:
+    return Decimal(str(valor))
+
+
+def transacao(minuto, id_transacao, tipo, quantidade, preco, id_cripto=1) -> tuple:
+    return (
+        T0 + datetime.timedelta(minutes=minuto),
+        id_transacao,
+        id_cripto,
+        tipo,
+        D(quantidade),
+        D(preco),
+    )
+
+
+def nao_realizado(posicao: Posicao, preco) -> Decimal:
+    # Mesma conta de listar_portfolio.
+    lado = (posicao.quantidade > 0) - (posicao.quantidade < 0)
+    return D(preco) * posicao.quantidade - lado * posicao.custo
+
+
+HISTORICO = [
+    transacao(1, 1, COMPRA, 10, 100),
+    transacao(2, 2, COMPRA, 5, 120),
+    transacao(3, 3, VENDA, 12, 130),
+    transacao(4, 4, VENDA, 5, 90),
+    transacao(5, 5, COMPRA, 1, 80),
+]
+
+
+def test_sinal():
+    assert sinal(" compra") == 1
+    assert sinal("VENDA") == -1
+    assert sinal("Troca") == 0
+
+
+def test_fifo_e_divisao_do_pnl_feitos_a_mao():
+    posicao = Posicao(1)
+    aplicar(posicao, [], HISTORICO[:3])
+    # A venda de 12 fecha o lote de 10 a 100 e 2 do de 5 a 120.
+    assert posicao.pnl_realizado == 30 * 10 + 10 * 2
+    assert (posicao.quantidade, posicao.custo) == (3, 360)
+    assert nao_realizado(posicao, 110) == -30
+
+    posicao = Posicao(1)
+    abertos = aplicar(posicao, [], HISTORICO[:4])
+    # 3 a 120 fecham com prejuízo de 30 cada; as outras 2 abrem vendido a 90.
+    assert posicao.pnl_realizado == 320 - 90
+    assert (posicao.quantidade, posicao.custo) == (-2, 180)
+    assert nao_realizado(posicao, 100) == -20
+    assert [(l.quantidade, l.preco) for l in abertos] == [(2, 90)]
+
+    posicao = Posicao(1)
+    abertos = aplicar(posicao, [], HISTORICO)
+    assert posicao.pnl_realizado == 240
+    assert (posicao.quantidade, posicao.custo) == (-1, 90)
+    assert posicao.transacoes == 5
+    assert posicao.atualizada_em == HISTORICO[-1][0]
+    assert [(l.inicio, l.quantidade, l.preco) for l in abertos] == [(15, 2, 90)]
+    assert posicao.consumido == 16
+
+
+def test_aplicar_em_partes_igual_a_aplicar_tudo():
+    inteira = Posicao(1)
+    aplicar(inteira, [], HISTORICO)
+
+    posicao, abertos = Posicao(1), []
+    for inicio, fim in ((0, 2), (2, 3), (3, 5)):
+        parte = HISTORICO[inicio:fim]
+        # Como o motor: só os lotes da cabeça que a parte pode fechar.
+        ate = posicao.consumido + volume_oposto(posicao, parte)
+        cabeca = [l for l in abertos if l.inicio < ate]
+        novos = aplicar(posicao, cabeca, parte)
+        abertos = [
+            l for l in abertos + novos if l.inicio + l.quantidade > posicao.consumido
+        ]
+    assert posicao == inteira
+    assert [(l.quantidade, l.preco) for l in abertos] == [(2, 90)]
+
+
+def test_tipos_desconhecidos_sao_ignorados():
+    posicao = Posicao(1)
+    aplicar(
+        posicao, [], [transacao(1, 1, "Troca", 1, 1), transacao(2, 2, COMPRA, 0, 1)]
+    )
+    assert posicao == Posicao(1)
+
+
+def test_transacao_retroativa_refaz_a_criptomoeda():
+    compra, venda = transacao(1, 1, COMPRA, 1, 100), transacao(3, 2, VENDA, 1, 150)
+    retroativa = transacao(2, 3, VENDA, 1, 130)
+    posicao = Posicao(1)
+    aplicar(posicao, [], [compra, venda])
+
+    lidas = [
+        {"id_cripto": 1, "atualizada_em": posicao.atualizada_em},
+        {"id_cripto": 2, "atualizada_em": T0},
+    ]
+    grupos = agrupar([retroativa, transacao(9, 4, COMPRA, 1, 1, id_cripto=2)])
+    assert MotorPortfolio._atrasadas(lidas, grupos) == [1]
+
+    # Na ordem das datas a venda retroativa fecha o lote de 100 e a de 150
+    # abre a posição vendida; na ordem de chegada seria o contrário.
+    historico = [compra, retroativa, venda]
+    restantes = MotorPortfolio._refazer(lidas, grupos, [1], historico)
+    assert restantes == [lidas[1]]
+    assert grupos[1] == historico
+    refeita = Posicao(1)
+    abertos = aplicar(refeita, [], grupos[1])
+    assert refeita.pnl_realizado == 30
+    assert [(l.quantidade, l.preco) for l in abertos] == [(1, 150)]
@@ -0,0 +1,58 @@
+import datetime
+
+from crypto.tendencias import VARIACAO_MAXIMA, calcular
+
+HORA = 3600
+DIA = 24 * HORA
+PERIODOS = {
+    "24h": datetime.timedelta(hours=24),
+    "7d": datetime.timedelta(days=7),
+}
+
+
+def por_periodo(tendencias):
+    return {(id_cripto, periodo): (v, t) for id_cripto, periodo, v, t in tendencias}
+
+
+def test_serie_vazia():
+    assert calcular([], PERIODOS) == []
+
+
+def test_variacao_compara_com_a_primeira_cotacao_do_periodo():
+    series = [
+        (1, 0, 50.0),
+        (1, 6 * DIA, 100.0),
+        (1, 7 * DIA + HORA, 104.0),
+        (1, 8 * DIA, 110.0),
+    ]
+    tendencias = por_periodo(calcular(series, PERIODOS, limiar=1.0))
+    assert tendencias[(1, "24h")] == (round(110 / 104 * 100 - 100, 2), "Alta")
+    assert tendencias[(1, "7d")] == (10.0, "Alta")
+
+
+def test_periodo_sem_historico_suficiente_fica_nulo():
+    series = [(1, 0, 50.0), (1, DIA + HORA, 100.0), (1, 2 * DIA, 98.0)]
+    tendencias = por_periodo(calcular(series, PERIODOS, limiar=1.0))
+    assert tendencias[(1, "24h")] == (-2.0, "Baixa")
+    assert tendencias[(1, "7d")] == (None, None)
+
+
+def test_primeira_cotacao_exatamente_no_inicio_cobre_o_periodo():
+    series = [(1, 0, 100.0), (1, DIA, 100.5)]
+    tendencias = por_periodo(calcular(series, PERIODOS, limiar=1.0))
+    assert tendencias[(1, "24h")] == (0.5, "Estável")
+    assert tendencias[(1, "7d")] == (None, None)
+
+
+def test_criptomoedas_independentes_e_variacao_limitada():
+    series = [
+        (1, 0, 1.0),
+        (1, 2 * DIA, 1.0),
+        (1, 8 * DIA, 1000.0),
+        (2, 5 * DIA, 10.0),
+        (2, 6 * DIA, 9.0),
+    ]
+    tendencias = por_periodo(calcular(series, PERIODOS, limiar=1.0))
+    assert tendencias[(1, "7d")] == (VARIACAO_MAXIMA, "Alta")
+    assert tendencias[(2, "24h")] == (-10.0, "Baixa")
+    assert tendencias[(2, "7d")] == (None, None)